@@ -0,0 +1,41 @@
+"""add archived_records index for monthly record archives
+
+Revision ID: add_archived_records
+Revises: add_content_blobs
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_archived_records'
+down_revision = 'add_content_blobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('archived_records',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('table_name', sa.String(50), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('month', sa.String(7), nullable=False),
+        sa.Column('record_created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)')),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_archived_records_id'), 'archived_records', ['id'], unique=False)
+    op.create_index('ix_archived_records_table_name_record_id', 'archived_records', ['table_name', 'record_id'], unique=True)
+    op.create_index('ix_archived_records_table_name_user_id_created_at', 'archived_records', ['table_name', 'user_id', 'record_created_at'], unique=False)
+
+
+def downgrade() -> None:
+    # 归档文件中的记录不会迁回主库
+    op.drop_index('ix_archived_records_table_name_user_id_created_at', table_name='archived_records')
+    op.drop_index('ix_archived_records_table_name_record_id', table_name='archived_records')
+    op.drop_index(op.f('ix_archived_records_id'), table_name='archived_records')
+    op.drop_table('archived_records')
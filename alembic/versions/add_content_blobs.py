@@ -0,0 +1,155 @@
+"""move prompt and response text into content-addressed blobs
+
+Revision ID: add_content_blobs
+Revises: compress_large_text_columns
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import hashlib
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import compress_text, decompress_text
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_blobs'
+down_revision = 'compress_large_text_columns'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 500
+
+# 表 -> [(原文本字段, 哈希字段, 是否非空)]
+CONTENT_COLUMNS = {
+    'test_records': [('prompt', 'prompt_hash', True), ('response', 'response_hash', True)],
+    'prompt_history': [('rendered_prompt', 'rendered_prompt_hash', False), ('response', 'response_hash', False)],
+    'prompts': [('content', 'content_hash', False)],
+}
+
+blobs = sa.table(
+    'content_blobs',
+    sa.column('hash', sa.String()),
+    sa.column('content', sa.LargeBinary()),
+    sa.column('size', sa.Integer()),
+    sa.column('ref_count', sa.Integer()),
+)
+
+
+def _store_blobs(conn, texts):
+    """保存一批内容并累加引用计数"""
+    counts, contents = Counter(), {}
+    for text in texts:
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        counts[key] += 1
+        contents[key] = text
+    if not counts:
+        return
+    existing = {
+        row[0] for row in conn.execute(sa.select(blobs.c.hash).where(blobs.c.hash.in_(list(counts))))
+    }
+    for key, count in counts.items():
+        if key in existing:
+            conn.execute(blobs.update().where(blobs.c.hash == key).values(ref_count=blobs.c.ref_count + count))
+        else:
+            text = contents[key]
+            conn.execute(blobs.insert().values(
+                hash=key, content=compress_text(text), size=len(text.encode('utf-8')), ref_count=count
+            ))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.create_table(
+        'content_blobs',
+        sa.Column('hash', sa.String(64), nullable=False),
+        sa.Column('content', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)')),
+        sa.PrimaryKeyConstraint('hash')
+    )
+
+    for table, columns in CONTENT_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for _, hash_column, _ in columns:
+                batch_op.add_column(sa.Column(hash_column, sa.String(64), nullable=True))
+
+        # 按ID分批把文本写入content_blobs并回填哈希
+        # 文本字段不指定类型，按数据库返回的原值读取（可能是文本或压缩后的二进制）
+        t = sa.table(table, sa.column('id', sa.Integer()), *[
+            c for text_column, hash_column, _ in columns
+            for c in (sa.column(text_column), sa.column(hash_column, sa.String()))
+        ])
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                sa.select(t.c.id, *[t.c[text_column] for text_column, _, _ in columns])
+                .where(t.c.id > last_id).order_by(t.c.id).limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            texts, updates = [], []
+            for row in rows:
+                values = {}
+                for i, (_, hash_column, _) in enumerate(columns):
+                    raw = row[i + 1]
+                    if raw is None:
+                        continue
+                    text = decompress_text(raw)
+                    texts.append(text)
+                    values[hash_column] = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                if values:
+                    updates.append((row[0], values))
+            _store_blobs(conn, texts)
+            for row_id, values in updates:
+                conn.execute(t.update().where(t.c.id == row_id).values(values))
+
+        with op.batch_alter_table(table) as batch_op:
+            for text_column, hash_column, not_null in columns:
+                batch_op.drop_column(text_column)
+                if not_null:
+                    batch_op.alter_column(hash_column, existing_type=sa.String(64), nullable=False)
+                batch_op.create_foreign_key(f'fk_{table}_{hash_column}', 'content_blobs', [hash_column], ['hash'])
+
+    op.create_index('ix_test_records_user_id_prompt_hash', 'test_records', ['user_id', 'prompt_hash'], unique=False)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    dialect = conn.dialect.name
+    op.drop_index('ix_test_records_user_id_prompt_hash', table_name='test_records')
+
+    for table, columns in CONTENT_COLUMNS.items():
+        # 文本字段按升级前的类型恢复：SQLite仍为TEXT，其他数据库为二进制（见compress_large_text_columns）
+        text_type = sa.Text() if dialect == 'sqlite' or table == 'prompts' else sa.LargeBinary()
+        with op.batch_alter_table(table) as batch_op:
+            for text_column, _, _ in columns:
+                batch_op.add_column(sa.Column(text_column, text_type, nullable=True))
+
+        t = sa.table(table, sa.column('id', sa.Integer()), *[
+            c for text_column, hash_column, _ in columns
+            for c in (sa.column(text_column), sa.column(hash_column, sa.String()))
+        ])
+        for text_column, hash_column, _ in columns:
+            if table == 'prompts':
+                # prompts.content原本是未压缩的文本，解压后写回
+                for row_id, key in conn.execute(sa.select(t.c.id, t.c[hash_column]).where(t.c[hash_column].isnot(None))).all():
+                    raw = conn.execute(sa.select(blobs.c.content).where(blobs.c.hash == key)).scalar()
+                    conn.execute(t.update().where(t.c.id == row_id).values({text_column: decompress_text(raw)}))
+            else:
+                content = sa.select(blobs.c.content).where(blobs.c.hash == t.c[hash_column]).scalar_subquery()
+                conn.execute(t.update().values({text_column: content}))
+
+        with op.batch_alter_table(table) as batch_op:
+            for text_column, hash_column, not_null in columns:
+                batch_op.drop_constraint(f'fk_{table}_{hash_column}', type_='foreignkey')
+                batch_op.drop_column(hash_column)
+                if not_null:
+                    batch_op.alter_column(text_column, existing_type=text_type, nullable=False)
+
+    op.drop_table('content_blobs')
@@ -0,0 +1,54 @@
+"""add uncompressed preview to content_blobs for list summaries
+
+Revision ID: add_content_preview
+Revises: add_search_index
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import decompress_text
+from app.config import CONTENT_PREVIEW_LENGTH
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_preview'
+down_revision = 'add_search_index'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    op.add_column('content_blobs', sa.Column('preview', sa.Text(), nullable=True))
+
+    # 按哈希分批解压已有内容，回填预览
+    conn = op.get_bind()
+    blobs = sa.table(
+        'content_blobs',
+        sa.column('hash', sa.String()),
+        sa.column('content'),
+        sa.column('preview', sa.Text()),
+    )
+    last_hash = ''
+    while True:
+        rows = conn.execute(
+            sa.select(blobs.c.hash, blobs.c.content)
+            .where(blobs.c.hash > last_hash).order_by(blobs.c.hash).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_hash = rows[-1][0]
+        for key, raw in rows:
+            conn.execute(
+                blobs.update().where(blobs.c.hash == key)
+                .values(preview=decompress_text(raw)[:CONTENT_PREVIEW_LENGTH])
+            )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('content_blobs') as batch_op:
+        batch_op.drop_column('preview')
@@ -0,0 +1,37 @@
+"""add composite indexes for per-user list queries
+
+Revision ID: add_list_query_indexes
+Revises: add_user_id_to_models
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_list_query_indexes'
+down_revision = 'add_user_id_to_models'
+branch_labels = None
+depends_on = None
+
+
+# 列表接口按user_id（和is_deleted）过滤后按(created_at, id)倒序分页，
+# 复合索引使过滤和排序都能在索引上完成，倒序时反向扫描即可。
+# is_deleted作为索引列而不是部分索引条件：查询以绑定参数传入is_deleted，SQLite无法据此使用部分索引
+LIST_INDEXES = [
+    ('ix_prompts_user_id_is_deleted_created_at', 'prompts', ['user_id', 'is_deleted', 'created_at', 'id']),
+    ('ix_responses_user_id_is_deleted_created_at', 'responses', ['user_id', 'is_deleted', 'created_at', 'id']),
+    ('ix_test_records_user_id_is_deleted_created_at', 'test_records', ['user_id', 'is_deleted', 'created_at', 'id']),
+    ('ix_prompt_history_user_id_created_at', 'prompt_history', ['user_id', 'created_at', 'id']),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in LIST_INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(LIST_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,51 @@
+"""add full-text search index for templates, prompts and test records
+
+Revision ID: add_search_index
+Revises: add_archived_records
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.services.search_index import search_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_search_index'
+down_revision = 'add_archived_records'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    dialect = conn.dialect.name
+    op.create_table('search_documents',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(20), nullable=False),
+        sa.Column('ref_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('tsv', postgresql.TSVECTOR() if dialect == 'postgresql' else sa.Text(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True
+    )
+    op.create_index('ix_search_documents_kind_ref_id', 'search_documents', ['kind', 'ref_id'], unique=True)
+    if dialect == 'postgresql':
+        op.create_index('ix_search_documents_tsv', 'search_documents', ['tsv'], postgresql_using='gin')
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, body)")
+
+    # 为已有数据建立索引
+    session = Session(bind=conn)
+    search_index.rebuild(session)
+    session.flush()
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS search_fts")
+    op.drop_table('search_documents')
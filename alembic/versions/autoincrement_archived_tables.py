@@ -0,0 +1,56 @@
+"""use AUTOINCREMENT for archived tables so deleted ids are never reused
+
+Revision ID: autoincrement_archived_tables
+Revises: add_content_preview
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'autoincrement_archived_tables'
+down_revision = 'add_content_preview'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ('test_records', 'prompt_history')
+
+
+def upgrade() -> None:
+    # 只有SQLite会复用已删除的最大ID，其他数据库的序列不会回退
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name, recreate='always', table_kwargs={'sqlite_autoincrement': True}):
+            pass
+
+        # 重建表时复制的数据已更新sqlite_sequence；已归档（已删除）记录的ID也要计入
+        high_water = conn.execute(
+            sa.text(
+                "SELECT MAX(id) FROM ("
+                " SELECT MAX(id) AS id FROM " + table_name +
+                " UNION ALL SELECT MAX(record_id) FROM archived_records WHERE table_name = :name)"
+            ),
+            {"name": table_name}
+        ).scalar()
+        if high_water:
+            conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table_name})
+            conn.execute(
+                sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                {"name": table_name, "seq": high_water}
+            )
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+
+    for table_name in TABLES:
+        with op.batch_alter_table(table_name, recreate='always', table_kwargs={'sqlite_autoincrement': False}):
+            pass
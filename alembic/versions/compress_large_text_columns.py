@@ -0,0 +1,60 @@
+"""store large text columns compressed
+
+Revision ID: compress_large_text_columns
+Revises: add_list_query_indexes
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import decompress_text, is_compressed
+
+
+# revision identifiers, used by Alembic.
+revision = 'compress_large_text_columns'
+down_revision = 'add_list_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    ('test_records', 'prompt'),
+    ('test_records', 'response'),
+    ('prompt_history', 'rendered_prompt'),
+    ('prompt_history', 'response'),
+    ('responses', 'content'),
+]
+
+
+def upgrade() -> None:
+    # 字段改为二进制类型。已有数据保持原样（读取时兼容未压缩的值），
+    # 由应用启动时的后台任务分批压缩（TEXT_COMPRESSION_BACKFILL=true），避免迁移长时间锁表。
+    # SQLite按值存储类型，TEXT列可以直接保存二进制，无需改表
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return
+    for table, column in COLUMNS:
+        if dialect == 'postgresql':
+            op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE BYTEA USING convert_to({column}, \'UTF8\')')
+        else:
+            op.alter_column(table, column, type_=sa.LargeBinary(), existing_type=sa.Text())
+
+
+def downgrade() -> None:
+    # 先把压缩过的值解压为文本，再改回文本类型
+    conn = op.get_bind()
+    dialect = conn.dialect.name
+    for table, column in COLUMNS:
+        t = sa.table(table, sa.column('id', sa.Integer()), sa.column(column, sa.LargeBinary()))
+        raw = sa.table(table, sa.column('id'), sa.column(column))  # 不做类型处理，按原值写入
+        for row_id, value in conn.execute(sa.select(t.c.id, t.c[column])).all():
+            if not is_compressed(value):
+                continue
+            text = decompress_text(value)
+            stored = text if dialect == 'sqlite' else text.encode('utf-8')
+            conn.execute(raw.update().where(raw.c.id == row_id).values({column: stored}))
+        if dialect == 'postgresql':
+            op.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE TEXT USING convert_from({column}, \'UTF8\')')
+        elif dialect != 'sqlite':
+            op.alter_column(table, column, type_=sa.Text(), existing_type=sa.LargeBinary())
@@ -0,0 +1,121 @@
+"""move response content into content-addressed blobs
+
+Revision ID: responses_content_blobs
+Revises: autoincrement_archived_tables
+Create Date: 2026-10-20 11:00:00.000000
+
+"""
+import hashlib
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.models.types import compress_text, decompress_text
+from app.config import CONTENT_PREVIEW_LENGTH
+
+
+# revision identifiers, used by Alembic.
+revision = 'responses_content_blobs'
+down_revision = 'autoincrement_archived_tables'
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 500
+
+blobs = sa.table(
+    'content_blobs',
+    sa.column('hash', sa.String()),
+    sa.column('content', sa.LargeBinary()),
+    sa.column('preview', sa.Text()),
+    sa.column('size', sa.Integer()),
+    sa.column('ref_count', sa.Integer()),
+)
+
+# content不指定类型，按数据库返回的原值读取（可能是文本或压缩后的二进制）
+responses = sa.table(
+    'responses',
+    sa.column('id', sa.Integer()),
+    sa.column('content'),
+    sa.column('content_hash', sa.String()),
+)
+
+
+def _store_blobs(conn, texts):
+    """保存一批内容并累加引用计数"""
+    counts, contents = Counter(), {}
+    for text in texts:
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        counts[key] += 1
+        contents[key] = text
+    if not counts:
+        return
+    existing = {
+        row[0] for row in conn.execute(sa.select(blobs.c.hash).where(blobs.c.hash.in_(list(counts))))
+    }
+    for key, count in counts.items():
+        if key in existing:
+            conn.execute(blobs.update().where(blobs.c.hash == key).values(ref_count=blobs.c.ref_count + count))
+        else:
+            text = contents[key]
+            conn.execute(blobs.insert().values(
+                hash=key, content=compress_text(text), preview=text[:CONTENT_PREVIEW_LENGTH],
+                size=len(text.encode('utf-8')), ref_count=count
+            ))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    with op.batch_alter_table('responses') as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(64), nullable=True))
+
+    # 按ID分批把内容写入content_blobs并回填哈希
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(responses.c.id, responses.c.content)
+            .where(responses.c.id > last_id).order_by(responses.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        texts, updates = [], []
+        for row_id, raw in rows:
+            if raw is None:
+                continue
+            text = decompress_text(raw)
+            texts.append(text)
+            updates.append((row_id, hashlib.sha256(text.encode('utf-8')).hexdigest()))
+        _store_blobs(conn, texts)
+        for row_id, key in updates:
+            conn.execute(responses.update().where(responses.c.id == row_id).values(content_hash=key))
+
+    with op.batch_alter_table('responses') as batch_op:
+        batch_op.drop_column('content')
+        batch_op.create_foreign_key('fk_responses_content_hash', 'content_blobs', ['content_hash'], ['hash'])
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    # 按升级前的类型恢复：SQLite为TEXT，其他数据库为二进制（见compress_large_text_columns）
+    text_type = sa.Text() if conn.dialect.name == 'sqlite' else sa.LargeBinary()
+    with op.batch_alter_table('responses') as batch_op:
+        batch_op.add_column(sa.Column('content', text_type, nullable=True))
+
+    # 存储格式相同，直接复制content_blobs中的原值
+    content = sa.select(blobs.c.content).where(blobs.c.hash == responses.c.content_hash).scalar_subquery()
+    conn.execute(responses.update().values(content=content))
+
+    # 释放引用，删除不再被引用的内容
+    counts = conn.execute(
+        sa.select(responses.c.content_hash, sa.func.count())
+        .where(responses.c.content_hash.isnot(None)).group_by(responses.c.content_hash)
+    ).all()
+    for key, count in counts:
+        conn.execute(blobs.update().where(blobs.c.hash == key).values(ref_count=blobs.c.ref_count - count))
+    conn.execute(blobs.delete().where(blobs.c.ref_count <= 0))
+
+    with op.batch_alter_table('responses') as batch_op:
+        batch_op.drop_constraint('fk_responses_content_hash', type_='foreignkey')
+        batch_op.drop_column('content_hash')
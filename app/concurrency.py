@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services.metrics import metrics
+from app.config import BLOCKING_POOL_SIZE, LOOP_LAG_CHECK_INTERVAL, LOOP_LAG_WARN_MS
+
+logger = logging.getLogger(__name__)
+
+# async def路由中无法避免的阻塞调用（同步的模型SDK请求等）统一放到这个有界线程池中执行，
+# 不与Starlette运行同步路由的线程池争抢线程
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """在有界线程池中执行阻塞调用，不占用事件循环"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+
+
+class LoopLagMonitor:
+    """
+    事件循环延迟监控：定期sleep并测量实际唤醒时间，超出部分即事件循环被阻塞的时长
+
+    超过阈值时记录警告和计数（event_loop.stalls），用于发现在async def中执行阻塞操作的代码
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_CHECK_INTERVAL, warn_ms: float = LOOP_LAG_WARN_MS):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self.max_lag_ms = 0.0
+        self.last_lag_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """在当前事件循环中启动监控任务，interval不大于0时不启动"""
+        if self.interval <= 0 or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record((loop.time() - started - self.interval) * 1000)
+
+    def record(self, lag_ms: float):
+        """记录一次测量结果"""
+        self.last_lag_ms = lag_ms
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms >= self.warn_ms:
+            metrics.incr("event_loop.stalls")
+            logger.warning(f"事件循环被阻塞约{lag_ms:.0f}ms，请检查async def路由中的同步调用")
+
+    def stats(self) -> Dict:
+        return {
+            "interval": self.interval,
+            "warn_ms": self.warn_ms,
+            "last_lag_ms": round(self.last_lag_ms, 1),
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "stalls": metrics.get("event_loop.stalls"),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor()
@@ -13,4 +13,69 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")  # OpenAI API密钥，仅作为
 # JWT配置
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
-JWT_EXPIRE_HOURS = int(os.getenv("JWT_EXPIRE_HOURS", "168"))  # 7天
\ No newline at end of file
+JWT_EXPIRE_HOURS = int(os.getenv("JWT_EXPIRE_HOURS", "168"))  # 7天
+
+# 评估级联配置：先用本地启发式规则评估，只有必要时才调用LLM评估模型
+EVAL_CASCADE_ENABLED = os.getenv("EVAL_CASCADE_ENABLED", "true").lower() == "true"
+# 启用后直接判定、不再调用LLM评估的启发式规则（逗号分隔：too_short,truncated,low_quality），
+# 这些规则可能误判JSON、代码、数字等简短的正确回答，默认只作为标记交给LLM评估
+EVAL_CASCADE_HEURISTIC_RULES = [r.strip() for r in os.getenv("EVAL_CASCADE_HEURISTIC_RULES", "").split(",") if r.strip()]
+EVAL_CASCADE_MIN_CHARS = int(os.getenv("EVAL_CASCADE_MIN_CHARS", "5"))  # too_short规则：有效字符数下限
+EVAL_CASCADE_LOW_SCORE = float(os.getenv("EVAL_CASCADE_LOW_SCORE", "0.2"))  # low_quality规则：启发式质量分(0-1)阈值
+
+# 异步评估配置
+ASYNC_EVAL_RESULT_TTL = int(os.getenv("ASYNC_EVAL_RESULT_TTL", "3600"))  # 异步评估结果保留时间（秒）
+
+# 事件循环配置
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))  # async路由中阻塞调用（如同步的模型请求）使用的线程数
+LOOP_LAG_CHECK_INTERVAL = float(os.getenv("LOOP_LAG_CHECK_INTERVAL", "0.5"))  # 事件循环延迟检测间隔（秒），0表示不检测
+LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "100"))  # 事件循环被阻塞超过该毫秒数时记录警告
+
+# WebSocket推送配置
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "100"))  # 每个连接待发送消息的上限，超出时断开该慢客户端
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))  # 单条消息发送超时（秒），超时断开该连接
+
+# 认证缓存配置
+AUTH_CACHE_ENABLED = os.getenv("AUTH_CACHE_ENABLED", "true").lower() == "true"
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "30"))  # 缓存有效期（秒），也是多进程部署下用户变更生效的最长延迟
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))  # token和用户各自的最大缓存条目数
+
+# 提示词优化阶段缓存配置
+OPTIMIZER_CACHE_ENABLED = os.getenv("OPTIMIZER_CACHE_ENABLED", "true").lower() == "true"
+OPTIMIZER_CACHE_TTL = int(os.getenv("OPTIMIZER_CACHE_TTL", "3600"))  # 缓存有效期（秒）
+OPTIMIZER_CACHE_MAX_ENTRIES = int(os.getenv("OPTIMIZER_CACHE_MAX_ENTRIES", "1000"))  # 最大缓存条目数
+OPTIMIZER_MAX_CONCURRENCY = int(os.getenv("OPTIMIZER_MAX_CONCURRENCY", "4"))  # 单次优化中并发调用模型的最大数量
+OPTIMIZER_MAX_CANDIDATES = int(os.getenv("OPTIMIZER_MAX_CANDIDATES", "8"))  # 多候选优化的候选数量上限
+OPTIMIZER_MAX_REFINE_ROUNDS = int(os.getenv("OPTIMIZER_MAX_REFINE_ROUNDS", "10"))  # 迭代优化的最大轮数
+TEMPLATE_PARAMS_BATCH_MAX = int(os.getenv("TEMPLATE_PARAMS_BATCH_MAX", "500"))  # 批量生成模板参数单次最多的提示词数
+
+# SSE流式运行配置（断线重连后可通过Last-Event-ID续传）
+STREAM_RUN_MAX_EVENTS = int(os.getenv("STREAM_RUN_MAX_EVENTS", "5000"))  # 每次运行保留的最大事件数
+STREAM_RUN_TTL = int(os.getenv("STREAM_RUN_TTL", "600"))  # 运行结束后事件保留时间（秒）
+STREAM_RUN_DISCONNECT_GRACE = float(os.getenv("STREAM_RUN_DISCONNECT_GRACE", "15"))  # 客户端全部断开后等待重连的秒数，超时取消运行
+STREAM_RUN_MAX_PER_USER = int(os.getenv("STREAM_RUN_MAX_PER_USER", "5"))  # 每个用户同时进行中的最大运行数
+
+# 测试记录延迟写入配置（开启后测试记录先进入缓冲区，由后台线程批量提交）
+TEST_RECORD_WRITE_BEHIND = os.getenv("TEST_RECORD_WRITE_BEHIND", "false").lower() == "true"  # SQLite下ID在进程内分配，仅适用于单进程部署
+TEST_RECORD_BATCH_SIZE = int(os.getenv("TEST_RECORD_BATCH_SIZE", "100"))  # 缓冲区达到该数量立即提交
+TEST_RECORD_FLUSH_INTERVAL = float(os.getenv("TEST_RECORD_FLUSH_INTERVAL", "1"))  # 最长提交间隔（秒）
+
+# 大文本字段压缩配置（测试记录、历史记录、回复中的提示词和模型输出）
+TEXT_COMPRESSION_CODEC = os.getenv("TEXT_COMPRESSION_CODEC", "zstd").lower()  # zstd或zlib，未安装zstandard时使用zlib
+TEXT_COMPRESSION_THRESHOLD = int(os.getenv("TEXT_COMPRESSION_THRESHOLD", "1024"))  # 超过该字节数才压缩，负数表示不压缩
+TEXT_COMPRESSION_LEVEL = int(os.getenv("TEXT_COMPRESSION_LEVEL", "6"))  # 压缩级别（zlib最高9）
+TEXT_COMPRESSION_BACKFILL = os.getenv("TEXT_COMPRESSION_BACKFILL", "false").lower() == "true"  # 启动时在后台压缩已有数据
+TEXT_COMPRESSION_BACKFILL_BATCH = int(os.getenv("TEXT_COMPRESSION_BACKFILL_BATCH", "200"))  # 后台压缩每批处理的行数
+
+# 测试记录和历史记录归档配置
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))  # 超过该天数的记录移到归档文件，0表示不归档
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "archive"))  # 按月归档文件目录
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "86400"))  # 后台归档任务的执行间隔（秒）
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))  # 每批归档的记录数
+
+# 列表接口分页配置
+PAGINATION_DEFAULT_LIMIT = int(os.getenv("PAGINATION_DEFAULT_LIMIT", "50"))  # 只传cursor未传limit时的每页数量
+PAGINATION_MAX_LIMIT = int(os.getenv("PAGINATION_MAX_LIMIT", "200"))  # 每页数量上限
+CSV_EXPORT_CHUNK_ROWS = int(os.getenv("CSV_EXPORT_CHUNK_ROWS", "500"))  # CSV导出每批读取并输出的行数
+LIST_SUMMARY_LENGTH = int(os.getenv("LIST_SUMMARY_LENGTH", "100"))  # 列表摘要模式下大文本字段默认截取的字符数
+CONTENT_PREVIEW_LENGTH = int(os.getenv("CONTENT_PREVIEW_LENGTH", "200"))  # 内容预览保存的字符数，即摘要长度的上限
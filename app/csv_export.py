@@ -0,0 +1,73 @@
+import csv
+import io
+import logging
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query, Session
+
+from app.database import SessionLocal
+from app.config import CSV_EXPORT_CHUNK_ROWS
+
+logger = logging.getLogger(__name__)
+
+
+def iter_csv(
+    build_query: Callable[[Session], Query],
+    header: List[str],
+    to_row: Callable[[Any], List[Any]],
+    bom: bool = False,
+    chunk_rows: int = CSV_EXPORT_CHUNK_ROWS,
+    leading_rows: Optional[Callable[[], Iterable[Any]]] = None
+) -> Iterator[str]:
+    """
+    分批读取查询结果并逐块生成CSV文本
+
+    使用独立的数据库会话（请求的会话在响应开始发送前就会关闭），查询以yield_per分批获取，
+    支持的数据库上使用服务端游标，内存占用与导出行数无关。build_query应只查询需要的列
+    （ORM实体查询在旧式Query中会做结果去重，无法与yield_per一起使用）。
+    leading_rows返回的行（如归档记录）在查询结果之前输出，同样经过to_row转换
+    """
+    db = SessionLocal()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        if bom:
+            # 添加BOM头，使Excel能正确识别UTF-8编码的中文
+            buffer.write('\ufeff')
+        writer.writerow(header)
+
+        rows = 0
+        sources = [build_query(db).execution_options(yield_per=chunk_rows)]
+        if leading_rows:
+            sources.insert(0, leading_rows())
+        for item in (item for source in sources for item in source):
+            writer.writerow(to_row(item))
+            rows += 1
+            if rows % chunk_rows == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+    except Exception as e:
+        logger.error(f"导出CSV失败: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+
+def stream_csv(
+    build_query: Callable[[Session], Query],
+    header: List[str],
+    to_row: Callable[[Any], List[Any]],
+    filename: str,
+    media_type: str = "text/csv",
+    bom: bool = False,
+    leading_rows: Optional[Callable[[], Iterable[Any]]] = None
+) -> StreamingResponse:
+    """以流式响应导出CSV，build_query接收数据库会话并返回要导出的查询"""
+    return StreamingResponse(
+        iter_csv(build_query, header, to_row, bom=bom, leading_rows=leading_rows),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
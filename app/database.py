@@ -1,5 +1,5 @@
 # 可选：使用SQLAlchemy或其他ORM
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -19,16 +19,135 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # 数据库URL
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(BASE_DIR, 'prompt_lab.db')}")
 
+# 引擎配置档：production 启用下面的SQLite PRAGMA和连接池参数，default 使用SQLAlchemy默认配置
+DB_ENGINE_PROFILE = os.getenv("DB_ENGINE_PROFILE", "production").lower()
+
+# SQLite连接参数（每次建立连接时执行PRAGMA）
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL模式下读写互不阻塞
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # WAL模式下NORMAL即可保证一致性
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # 遇到锁时等待的毫秒数
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # 内存映射大小（字节）
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-64000"))  # 页缓存，负数表示KB
+
+# 服务器数据库（PostgreSQL/MySQL等）连接池参数
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # 获取连接的等待秒数
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 连接回收秒数，避免使用被服务端关闭的连接
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _engine_options() -> dict:
+    """根据数据库类型和配置档生成create_engine参数"""
+    options = {"echo": False}  # 禁用SQL语句日志，减少输出
+    if IS_SQLITE:
+        connect_args = {"check_same_thread": False}  # SQLite特定配置
+        if DB_ENGINE_PROFILE == "production":
+            connect_args["timeout"] = SQLITE_BUSY_TIMEOUT / 1000
+        options["connect_args"] = connect_args
+    elif DB_ENGINE_PROFILE == "production":
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    return options
+
+
 # 创建数据库引擎
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},  # SQLite特定配置
-    echo=False  # 禁用SQL语句日志，减少输出
-)
+engine = create_engine(DATABASE_URL, **_engine_options())
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新的SQLite连接设置PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # 内存数据库不支持WAL
+        if ":memory:" not in DATABASE_URL and DATABASE_URL.rstrip("/") not in ("sqlite:", "sqlite:/"):
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+
+if IS_SQLITE and DB_ENGINE_PROFILE == "production":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# 异步驱动映射，未设置ASYNC_DATABASE_URL时根据DATABASE_URL推导
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+# 异步驱动 -> 需要安装的包；aiosqlite在requirements.txt中，服务器数据库的驱动按需安装
+ASYNC_DRIVER_PACKAGES = {
+    "aiosqlite": "aiosqlite",
+    "asyncpg": "asyncpg",
+    "aiomysql": "aiomysql",
+}
+
+
+def _async_database_url(url: str) -> str:
+    """把同步数据库URL转换为对应异步驱动的URL"""
+    scheme, sep, rest = url.partition("://")
+    backend = scheme.split("+", 1)[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支持的异步数据库类型: {backend}")
+    return ASYNC_DRIVERS[backend] + sep + rest
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+
+# 异步引擎在第一次使用时创建，未安装异步驱动（aiosqlite/asyncpg）时不影响同步路径
+_async_engine = None
+_async_session_factory = None
+
+
+def get_async_engine():
+    """获取异步数据库引擎（与同步引擎使用相同的配置档）"""
+    global _async_engine, _async_session_factory
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        options = _engine_options()
+        if IS_SQLITE:
+            # aiosqlite在独立线程中访问连接，不需要check_same_thread
+            options.get("connect_args", {}).pop("check_same_thread", None)
+        url = ASYNC_DATABASE_URL or _async_database_url(DATABASE_URL)
+        try:
+            _async_engine = create_async_engine(url, **options)
+        except ImportError as e:
+            driver = url.partition("://")[0].partition("+")[2]
+            package = ASYNC_DRIVER_PACKAGES.get(driver, driver or str(e))
+            raise RuntimeError(f"异步数据库驱动未安装，请执行 pip install {package}（{url.partition('://')[0]}）") from e
+        if IS_SQLITE and DB_ENGINE_PROFILE == "production":
+            event.listen(_async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        # 提交后不过期对象，避免在异步上下文中触发隐式加载
+        _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def get_async_db():
+    """
+    获取异步数据库会话的依赖函数，用于async def路由，避免阻塞事件循环
+    """
+    get_async_engine()
+    async with _async_session_factory() as db:
+        yield db
+
 # 声明基类
 Base = declarative_base()
 
@@ -1,8 +1,17 @@
 from fastapi import FastAPI, WebSocket
+from typing import Optional
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import models, templates, prompts, responses, test, history, evaluate, auth, prompt_optimize
+from app.routers import models, templates, prompts, responses, test, history, evaluate, auth, prompt_optimize, search
 from app.database import init_db
 from app.websocket import manager
+from app.services.auth_service import AuthService
+from app.services.record_writer import record_writer
+from app.services.compression_backfill import compression_backfill
+from app.services.record_archive import record_archive
+from app.concurrency import blocking_executor, loop_lag_monitor
+from app.config import TEXT_COMPRESSION_BACKFILL
+from starlette.concurrency import run_in_threadpool
+import json
 import logging
 import os
 from dotenv import load_dotenv
@@ -41,15 +50,36 @@ app.add_middleware(
 )
 
 @app.websocket("/ws/templates")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
+    # 携带token的连接会关联到用户，只接收该用户自己的推送（模板变更、异步评估结果等）
+    user_id = None
+    if token:
+        payload = AuthService(None).verify_token(token)
+        if payload:
+            user_id = payload.get("user_id")
+
+    connection = await manager.connect(websocket, user_id=user_id, topics=["templates"])
+    if not connection:
+        return
     try:
         while True:
-            # 等待客户端消息，但我们主要用于服务器推送
+            # 主要用于服务器推送；客户端可发送 {"action": "subscribe"/"unsubscribe", "topic": ...} 调整订阅
             data = await websocket.receive_text()
             logger.debug(f"Received message from client: {data}")
+            if data == "ping":
+                connection.offer("pong")
+                continue
+            try:
+                message = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and isinstance(message.get("topic"), str):
+                if message.get("action") == "subscribe":
+                    manager.subscribe(websocket, message["topic"])
+                elif message.get("action") == "unsubscribe":
+                    manager.unsubscribe(websocket, message["topic"])
     except:
-        manager.disconnect(websocket)
+        await manager.disconnect(websocket)
 
 # 注册路由
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["auth"])
@@ -61,6 +91,7 @@ app.include_router(responses.router, prefix="/api/responses", tags=["responses"]
 app.include_router(test.router, prefix="/api/test", tags=["test"])
 app.include_router(history.router, prefix="/api/history", tags=["history"])
 app.include_router(evaluate.router, prefix="/api/evaluate", tags=["evaluate"])
+app.include_router(search.router, prefix="/api/search", tags=["search"])
 
 # 初始化数据库
 @app.on_event("startup")
@@ -72,13 +103,37 @@ async def startup_event():
         logger.info("Initializing database...")
         init_db()
         logger.info("Database initialized successfully")
+        if TEXT_COMPRESSION_BACKFILL:
+            compression_backfill.start()
+        record_archive.start()
+        loop_lag_monitor.start()
     except Exception as e:
         logger.error(f"Failed to initialize database: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    应用关闭时写完延迟写入缓冲区中的测试记录，停止后台压缩和归档任务
+    """
+    await loop_lag_monitor.stop()
+    await run_in_threadpool(compression_backfill.stop)
+    await run_in_threadpool(record_archive.stop)
+    if record_writer.enabled:
+        logger.info("Flushing pending test records...")
+        await run_in_threadpool(record_writer.stop)
+    blocking_executor.shutdown(wait=False)
+
 @app.get("/")
 async def root():
     """
     根路由
     """
-    return {"message": "Welcome to Prompt Lab API"} 
\ No newline at end of file
+    return {"message": "Welcome to Prompt Lab API"}
+
+@app.get("/health/loop")
+async def loop_health():
+    """
+    事件循环延迟统计，max_lag_ms持续偏高说明有阻塞事件循环的代码
+    """
+    return loop_lag_monitor.stats() 
\ No newline at end of file
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Boolean, UniqueConstraint, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, ForeignKey, Boolean, UniqueConstraint, Index, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import declarative_base, relationship
 import datetime
 from app.database import Base
+from app.models.content import ContentBlob, content_property
 import re
 from sqlalchemy.sql import func
 import hashlib
@@ -119,7 +121,8 @@ class Prompt(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), index=True)
     description = Column(Text)
-    content = Column(Text)
+    content_hash = Column(String(64), ForeignKey('content_blobs.hash'))
+    content = content_property(content_hash)
     variables = Column(JSON)
     model_id = Column(Integer, ForeignKey('llm_models.id'))
     template_id = Column(Integer, ForeignKey('prompt_templates.id'))
@@ -134,11 +137,16 @@ class Prompt(Base):
     template = relationship("PromptTemplate", back_populates="prompts")
     responses = relationship("Response", back_populates="prompt")
     histories = relationship("PromptHistory", back_populates="prompt")
+
+    # 内容按哈希存放在content_blobs中
+    __content_fields__ = {"content": "content_hash"}
     
     # 创建复合唯一约束：用户ID+名称+未删除
     __table_args__ = (
         UniqueConstraint('user_id', 'name', name='uq_prompt_user_name'),
         Index('ix_prompt_user_id_name_is_deleted', 'user_id', 'name', 'is_deleted', unique=True),
+        # 列表查询：按用户过滤未删除记录，按(created_at, id)排序
+        Index('ix_prompts_user_id_is_deleted_created_at', 'user_id', 'is_deleted', 'created_at', 'id'),
     )
 
 class PromptHistory(Base):
@@ -149,8 +157,10 @@ class PromptHistory(Base):
     model_id = Column(Integer, ForeignKey('llm_models.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
     variables = Column(JSON)
-    rendered_prompt = Column(Text)
-    response = Column(Text)
+    rendered_prompt_hash = Column(String(64), ForeignKey('content_blobs.hash'))
+    rendered_prompt = content_property(rendered_prompt_hash)
+    response_hash = Column(String(64), ForeignKey('content_blobs.hash'))
+    response = content_property(response_hash)
     evaluation = Column(JSON)
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -163,6 +173,16 @@ class PromptHistory(Base):
     model = relationship("LLMModel", back_populates="histories")
     evaluations = relationship("PromptEvaluation", back_populates="history")
 
+    # 渲染后的提示词和模型输出按哈希存放在content_blobs中
+    __content_fields__ = {"rendered_prompt": "rendered_prompt_hash", "response": "response_hash"}
+
+    # 列表查询：历史记录不做软删除过滤，按用户过滤后按(created_at, id)排序
+    __table_args__ = (
+        Index('ix_prompt_history_user_id_created_at', 'user_id', 'created_at', 'id'),
+        # 归档会删除记录，ID不能复用，否则与archived_records中已归档的记录冲突
+        {'sqlite_autoincrement': True},
+    )
+
 class PromptEvaluation(Base):
     __tablename__ = 'prompt_evaluations'
     id = Column(Integer, primary_key=True, index=True)
@@ -184,7 +204,8 @@ class Response(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     prompt_id = Column(Integer, ForeignKey("prompts.id"))
-    content = Column(Text)
+    content_hash = Column(String(64), ForeignKey('content_blobs.hash'))
+    content = content_property(content_hash)
     evaluation = Column(JSON)
     user_id = Column(Integer, ForeignKey('users.id'))
     is_deleted = Column(Boolean, default=False)
@@ -195,6 +216,14 @@ class Response(Base):
     user = relationship("User", back_populates="responses")
     prompt = relationship("Prompt", back_populates="responses")
 
+    # 模型输出按哈希存放在content_blobs中
+    __content_fields__ = {"content": "content_hash"}
+
+    # 列表查询：按用户过滤未删除记录，按(created_at, id)排序
+    __table_args__ = (
+        Index('ix_responses_user_id_is_deleted_created_at', 'user_id', 'is_deleted', 'created_at', 'id'),
+    )
+
 class TestRecord(Base):
     __tablename__ = 'test_records'
     
@@ -202,9 +231,11 @@ class TestRecord(Base):
     model_id = Column(Integer, ForeignKey('llm_models.id'))
     template_id = Column(Integer, ForeignKey('prompt_templates.id'), nullable=True)
     user_id = Column(Integer, ForeignKey('users.id'))
-    prompt = Column(Text, nullable=False)
+    prompt_hash = Column(String(64), ForeignKey('content_blobs.hash'), nullable=False)
+    prompt = content_property(prompt_hash)
     variables = Column(JSON, nullable=True, default=dict)
-    response = Column(Text, nullable=False)
+    response_hash = Column(String(64), ForeignKey('content_blobs.hash'), nullable=False)
+    response = content_property(response_hash)
     evaluation = Column(JSON, nullable=True, default=dict)
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -213,4 +244,67 @@ class TestRecord(Base):
     # 关系
     user = relationship("User", back_populates="test_records")
     model = relationship("LLMModel", back_populates="test_records")
-    template = relationship("PromptTemplate", back_populates="test_records") 
\ No newline at end of file
+    template = relationship("PromptTemplate", back_populates="test_records")
+
+    # 提示词和模型输出按哈希存放在content_blobs中
+    __content_fields__ = {"prompt": "prompt_hash", "response": "response_hash"}
+
+    __table_args__ = (
+        # 列表查询：按用户过滤未删除记录，按(created_at, id)排序
+        Index('ix_test_records_user_id_is_deleted_created_at', 'user_id', 'is_deleted', 'created_at', 'id'),
+        # 按提示词哈希查找是否运行过相同的提示词
+        Index('ix_test_records_user_id_prompt_hash', 'user_id', 'prompt_hash'),
+        # 归档会删除记录，ID不能复用，否则与archived_records中已归档的记录冲突
+        {'sqlite_autoincrement': True},
+    )
+
+class ArchivedRecord(Base):
+    """已归档记录的索引：记录本身移到按月划分的归档文件中"""
+    __tablename__ = 'archived_records'
+
+    id = Column(Integer, primary_key=True, index=True)
+    table_name = Column(String(50), nullable=False)
+    record_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    month = Column(String(7), nullable=False)  # 归档文件的月份，格式YYYY_MM
+    record_created_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_archived_records_table_name_record_id', 'table_name', 'record_id', unique=True),
+        Index('ix_archived_records_table_name_user_id_created_at', 'table_name', 'user_id', 'record_created_at'),
+    )
+
+class SearchDocument(Base):
+    """
+    全文搜索文档：每个模板、提示词、测试记录对应一行
+
+    SQLite下分词后的标题和正文写入FTS5表search_fts（rowid与本表id一致），
+    PostgreSQL下写入tsv字段并使用GIN索引
+    """
+    __tablename__ = 'search_documents'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(20), nullable=False)  # template / prompt / test_record
+    ref_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    tsv = Column(Text().with_variant(TSVECTOR(), "postgresql"))
+
+    __table_args__ = (
+        Index('ix_search_documents_kind_ref_id', 'kind', 'ref_id', unique=True),
+        Index('ix_search_documents_tsv', 'tsv', postgresql_using='gin').ddl_if(dialect='postgresql'),
+        # ID不复用，search_fts中的rowid始终只对应同一个文档
+        {'sqlite_autoincrement': True},
+    )
+
+# SQLite的全文索引表，保存分词后的文本，使替换、删除文档时可以按rowid删除旧条目
+event.listen(
+    SearchDocument.__table__,
+    "after_create",
+    DDL("CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(title, body)").execute_if(dialect="sqlite")
+)
+event.listen(
+    SearchDocument.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS search_fts").execute_if(dialect="sqlite")
+)
\ No newline at end of file
@@ -0,0 +1,175 @@
+import hashlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import Column, DateTime, Integer, String, Text, delete, event, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes, column_property
+from sqlalchemy.sql import func
+
+from app.database import Base
+from app.models.types import CompressedText
+from app.config import CONTENT_PREVIEW_LENGTH
+
+
+class ContentBlob(Base):
+    """
+    按内容寻址的大文本存储：相同的提示词/模型输出只保存一份，记录通过SHA-256引用
+
+    ref_count为引用该内容的记录数，降到0时删除；preview保存未压缩的开头部分，
+    列表的摘要模式直接在SQL中截取，不需要读取和解压全文
+    """
+    __tablename__ = 'content_blobs'
+    hash = Column(String(64), primary_key=True)
+    content = Column(CompressedText, nullable=False)
+    preview = Column(Text)  # 原文的前CONTENT_PREVIEW_LENGTH个字符
+    size = Column(Integer, default=0)  # 原文的UTF-8字节数
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+def content_hash(text: str) -> str:
+    """计算内容的SHA-256"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def content_property(hash_column: Column):
+    """
+    通过哈希引用读取内容的字段：查询时以关联子查询取出内容，可直接用于查询和投影
+
+    写入时给字段赋值即可，flush前由_sync_content_blobs换算成哈希并维护引用计数；
+    使用该字段的模型需要在__content_fields__中登记 字段名 -> 哈希字段名
+    """
+    return column_property(
+        select(ContentBlob.content)
+        .where(ContentBlob.hash == hash_column)
+        .correlate_except(ContentBlob)
+        .scalar_subquery()
+    )
+
+
+def content_preview(hash_column, length: int):
+    """按哈希取内容开头length个字符的子查询，用于列表摘要（length不超过CONTENT_PREVIEW_LENGTH）"""
+    return (
+        select(func.substr(ContentBlob.preview, 1, length))
+        .where(ContentBlob.hash == hash_column)
+        .correlate_except(ContentBlob)
+        .scalar_subquery()
+    )
+
+
+def acquire_blobs(conn: Connection, texts: Iterable[str]):
+    """保存内容并增加引用计数（内容已存在时只增加计数）"""
+    counts: Counter = Counter()
+    contents: Dict[str, str] = {}
+    for text in texts:
+        key = content_hash(text)
+        counts[key] += 1
+        contents[key] = text
+    if not counts:
+        return
+
+    rows = [
+        {
+            "hash": key,
+            "content": contents[key],
+            "preview": contents[key][:CONTENT_PREVIEW_LENGTH],
+            "size": len(contents[key].encode("utf-8")),
+            "ref_count": count
+        }
+        for key, count in counts.items()
+    ]
+    table = ContentBlob.__table__
+    dialect = conn.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.hash],
+            set_={"ref_count": table.c.ref_count + stmt.excluded.ref_count}
+        )
+        conn.execute(stmt, rows)
+        return
+    for row in rows:
+        result = conn.execute(
+            update(table).where(table.c.hash == row["hash"]).values(ref_count=table.c.ref_count + row["ref_count"])
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(table), [row])
+
+
+def release_blobs(conn: Connection, hashes: Iterable[Optional[str]]):
+    """减少引用计数，删除不再被引用的内容"""
+    counts = Counter(h for h in hashes if h)
+    if not counts:
+        return
+    table = ContentBlob.__table__
+    for key, count in counts.items():
+        conn.execute(update(table).where(table.c.hash == key).values(ref_count=table.c.ref_count - count))
+    conn.execute(delete(table).where(table.c.hash.in_(list(counts)), table.c.ref_count <= 0))
+
+
+def intern_content_rows(conn: Connection, model, rows: List[Dict]) -> List[Dict]:
+    """
+    批量插入前把行数据中的内容字段换成哈希并保存内容（用于绕过ORM的Core批量插入）
+    """
+    fields = getattr(model, "__content_fields__", {})
+    prepared, texts = [], []
+    for row in rows:
+        row = dict(row)
+        for attr, hash_attr in fields.items():
+            text = row.pop(attr, None)
+            if text is not None:
+                row[hash_attr] = content_hash(text)
+                texts.append(text)
+        prepared.append(row)
+    acquire_blobs(conn, texts)
+    return prepared
+
+
+@event.listens_for(Session, "before_flush")
+def _sync_content_blobs(session: Session, flush_context, instances):
+    """把新增/修改的内容字段换算成哈希并保存内容，被替换或删除的引用在flush后释放"""
+    acquired: List[str] = []
+    released: List[str] = session.info.setdefault("released_content_hashes", [])
+
+    for obj in list(session.new) + list(session.dirty):
+        fields = getattr(type(obj), "__content_fields__", None)
+        if not fields:
+            continue
+        for attr, hash_attr in fields.items():
+            history = attributes.get_history(obj, attr)
+            if not history.added:
+                continue
+            text = history.added[0]
+            new_hash = content_hash(text) if text is not None else None
+            old_hash = getattr(obj, hash_attr) if obj in session.dirty else None
+            if new_hash == old_hash:
+                continue
+            if text is not None:
+                acquired.append(text)
+            if old_hash:
+                released.append(old_hash)
+            setattr(obj, hash_attr, new_hash)
+
+    for obj in session.deleted:
+        fields = getattr(type(obj), "__content_fields__", None)
+        if fields:
+            released.extend(getattr(obj, hash_attr) for hash_attr in fields.values())
+
+    if acquired:
+        acquire_blobs(session.connection(), acquired)
+
+
+@event.listens_for(Session, "after_flush")
+def _release_content_blobs(session: Session, flush_context):
+    """记录已经更新/删除后再释放旧内容，避免删除仍被引用的内容"""
+    released = session.info.pop("released_content_hashes", None)
+    if released:
+        release_blobs(session.connection(), released)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_released_hashes(session: Session, previous_transaction):
+    """flush失败回滚时丢弃待释放的引用"""
+    session.info.pop("released_content_hashes", None)
@@ -0,0 +1,94 @@
+import logging
+import zlib
+from functools import lru_cache
+from typing import Optional, Union
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from app.config import TEXT_COMPRESSION_CODEC, TEXT_COMPRESSION_THRESHOLD, TEXT_COMPRESSION_LEVEL
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖，未安装时使用zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 压缩数据的格式：1字节标记 + 1字节算法 + 压缩数据；没有标记的值是未压缩的UTF-8文本
+COMPRESSED_MARKER = b"\x00"
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+
+
+@lru_cache(maxsize=None)
+def _resolve_codec(name: str) -> bytes:
+    """根据配置选择压缩算法，zstd不可用时退回zlib（只提示一次）"""
+    if name == "zstd":
+        if zstandard is not None:
+            return CODEC_ZSTD
+        logger.warning("未安装zstandard，大文本字段改用zlib压缩")
+    return CODEC_ZLIB
+
+
+def compress_text(
+    value: str,
+    threshold: int = TEXT_COMPRESSION_THRESHOLD,
+    codec: str = TEXT_COMPRESSION_CODEC,
+    level: int = TEXT_COMPRESSION_LEVEL
+) -> bytes:
+    """把文本编码为存储格式：超过阈值且压缩后更小时压缩，否则保存原始UTF-8"""
+    raw = value.encode("utf-8")
+    if threshold < 0 or len(raw) < threshold:
+        return raw
+    codec_id = _resolve_codec(codec)
+    if codec_id == CODEC_ZSTD:
+        packed = zstandard.ZstdCompressor(level=level).compress(raw)
+    else:
+        packed = zlib.compress(raw, min(level, 9))
+    if len(packed) + 2 >= len(raw):
+        return raw
+    return COMPRESSED_MARKER + codec_id + packed
+
+
+def decompress_text(value: Union[bytes, str]) -> str:
+    """把存储格式还原为文本，兼容未压缩的旧数据（SQLite中可能仍是文本）"""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(COMPRESSED_MARKER):
+        return value.decode("utf-8")
+    codec_id, packed = value[1:2], value[2:]
+    if codec_id == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("数据使用zstd压缩，需要安装zstandard才能读取")
+        return zstandard.ZstdDecompressor().decompress(packed).decode("utf-8")
+    if codec_id == CODEC_ZLIB:
+        return zlib.decompress(packed).decode("utf-8")
+    raise ValueError(f"未知的压缩格式: {codec_id!r}")
+
+
+def is_compressed(value: Union[bytes, str, None]) -> bool:
+    """判断存储值是否已经是压缩格式"""
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:1]) == COMPRESSED_MARKER
+
+
+class CompressedText(TypeDecorator):
+    """
+    透明压缩的大文本字段：写入时超过阈值的文本压缩后以二进制保存，读取时自动解压
+
+    压缩后的值不能在SQL中做文本比较或截取
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[str], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value: Union[bytes, str, None], dialect) -> Optional[str]:
+        if value is None:
+            return None
+        return decompress_text(value)
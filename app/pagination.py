@@ -0,0 +1,177 @@
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, Query
+from sqlalchemy import and_, func, or_, literal
+from sqlalchemy.orm import Query as OrmQuery
+
+from app.models.content import content_preview
+from app.config import PAGINATION_DEFAULT_LIMIT, PAGINATION_MAX_LIMIT, LIST_SUMMARY_LENGTH, CONTENT_PREVIEW_LENGTH
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """把(created_at, id)编码为不透明的分页游标"""
+    raw = json.dumps([created_at.isoformat() if created_at else None, row_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析分页游标，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+class DateRangeParams:
+    """按创建时间过滤的参数（FastAPI依赖），用于导出等不分页的接口"""
+
+    def __init__(
+        self,
+        created_after: Optional[datetime] = Query(None, description="只返回该时间及之后创建的记录"),
+        created_before: Optional[datetime] = Query(None, description="只返回该时间之前创建的记录"),
+    ):
+        self.created_after = created_after
+        self.created_before = created_before
+
+
+class PageParams:
+    """
+    列表接口的分页与时间范围参数（FastAPI依赖）
+
+    传入limit或cursor时按(created_at, id)倒序进行游标分页，返回 {items, next_cursor, total}；
+    两者都不传时保持原有行为，返回完整列表
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=PAGINATION_MAX_LIMIT, description="每页数量，传入后启用游标分页"),
+        cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+        include_total: bool = Query(False, description="是否返回总数（需要额外的COUNT查询）"),
+        created_after: Optional[datetime] = Query(None, description="只返回该时间及之后创建的记录"),
+        created_before: Optional[datetime] = Query(None, description="只返回该时间之前创建的记录"),
+    ):
+        try:
+            self.cursor = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        self.limit = limit or (PAGINATION_DEFAULT_LIMIT if cursor else None)
+        self.include_total = include_total
+        self.created_after = created_after
+        self.created_before = created_before
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit is not None
+
+
+class FieldParams:
+    """
+    列表接口的字段选择参数（FastAPI依赖）
+
+    fields只返回指定的字段，未选择的字段不会出现在SQL中；summary为True时大文本字段
+    从内容预览中截取前summary_length个字符，不读取全文
+    """
+
+    def __init__(
+        self,
+        fields: Optional[str] = Query(None, description="逗号分隔的返回字段，默认返回全部字段"),
+        summary: bool = Query(False, description="摘要模式：大文本字段只返回开头部分"),
+        summary_length: int = Query(
+            LIST_SUMMARY_LENGTH, ge=1, le=CONTENT_PREVIEW_LENGTH, description="摘要模式下大文本字段截取的字符数"
+        ),
+    ):
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+        self.summary = summary
+        self.summary_length = summary_length
+
+    def select(
+        self, columns: Dict[str, Any], content_hashes: Dict[str, Any], text_fields: Iterable[str] = ()
+    ) -> Tuple[List[str], List[Any]]:
+        """
+        按请求的字段生成查询列，返回(输出字段名, 查询列)
+
+        columns为 字段名 -> 列（顺序即输出顺序，须包含id和created_at，分页需要），
+        content_hashes为大文本字段 -> 其哈希列，摘要模式下替换为预览子查询；
+        text_fields为直接保存在表中的大文本字段，摘要模式下在SQL中截取
+        """
+        text_fields = set(text_fields)
+        names = list(columns)
+        if self.fields is not None:
+            unknown = [f for f in self.fields if f not in columns]
+            if unknown:
+                raise HTTPException(400, f"不支持的字段: {', '.join(unknown)}，可选字段: {', '.join(columns)}")
+            names = [name for name in columns if name in self.fields]
+
+        selected = []
+        for name in dict.fromkeys(names + ["id", "created_at"]):
+            if self.summary and name in content_hashes:
+                selected.append(content_preview(content_hashes[name], self.summary_length).label(name))
+            elif self.summary and name in text_fields:
+                selected.append(func.substr(columns[name], 1, self.summary_length).label(name))
+            else:
+                selected.append(columns[name].label(name))
+        return names, selected
+
+
+def _bind_datetime(query: OrmQuery, value: datetime):
+    """
+    生成与created_at比较用的参数
+
+    SQLite把server_default的时间存成不带微秒的文本，而SQLAlchemy绑定datetime时总会带上微秒，
+    按文本比较会出错，因此SQLite下绑定与存储格式一致的字符串
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    bind = query.session.get_bind()
+    if bind.dialect.name != "sqlite":
+        return value
+    fmt = "%Y-%m-%d %H:%M:%S.%f" if value.microsecond else "%Y-%m-%d %H:%M:%S"
+    return literal(value.strftime(fmt))
+
+
+def apply_filters(query: OrmQuery, model, params: Union[PageParams, DateRangeParams], **equals: Any) -> OrmQuery:
+    """应用时间范围过滤和等值过滤（值为None的条件忽略）"""
+    for name, value in equals.items():
+        if value is not None:
+            query = query.filter(getattr(model, name) == value)
+    if params.created_after:
+        query = query.filter(model.created_at >= _bind_datetime(query, params.created_after))
+    if params.created_before:
+        query = query.filter(model.created_at < _bind_datetime(query, params.created_before))
+    return query
+
+
+def paginate(query: OrmQuery, model, params: PageParams, serialize: Callable[[Any], Any]):
+    """
+    按(created_at, id)倒序执行游标分页
+
+    未启用分页时返回序列化后的完整列表；启用时返回 {items, next_cursor, total}，
+    total只有在include_total为True时才计算
+    """
+    if not params.enabled:
+        return [item for item in (serialize(row) for row in query.all()) if item is not None]
+
+    total = query.order_by(None).count() if params.include_total else None
+
+    if params.cursor:
+        created_at, row_id = params.cursor
+        bound = _bind_datetime(query, created_at)
+        query = query.filter(or_(
+            model.created_at < bound,
+            and_(model.created_at == bound, model.id < row_id)
+        ))
+
+    rows = query.order_by(None).order_by(model.created_at.desc(), model.id.desc()).limit(params.limit + 1).all()
+    has_more = len(rows) > params.limit
+    rows = rows[:params.limit]
+
+    return {
+        "items": [item for item in (serialize(row) for row in rows) if item is not None],
+        "next_cursor": encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+        "total": total,
+    }
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime
 
-from ..database import get_db
-from ..services.auth_service import AuthService
+from ..database import get_db, get_async_db
+from ..services.auth_service import AuthService, AsyncAuthService
+from ..services.auth_cache import auth_cache
 from ..models import User
 
 router = APIRouter(prefix="", tags=["认证"])
@@ -44,28 +46,35 @@ class ApiResponse(BaseModel):
 
 # 依赖注入：获取当前用户
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    auth_service = AuthService(db)
-    payload = auth_service.verify_token(credentials.credentials)
-    
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="无效的访问令牌",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    # 先查认证缓存，命中时不解码JWT、不查询数据库
+    token = credentials.credentials
+    payload = auth_cache.get_token(token)
+    if payload is None:
+        auth_service = AuthService(db)
+        payload = auth_service.verify_token(token)
+        if not payload:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="无效的访问令牌",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        auth_cache.set_token(token, payload)
     
-    user = auth_service.get_user_by_id(payload["user_id"])
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="用户不存在",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+    user = auth_cache.get_user(payload["user_id"])
+    if user is None:
+        user = AuthService(db).get_user_by_id(payload["user_id"])
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="用户不存在",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        auth_cache.set_user(user)
     
     return user
 
 @router.post("/login", response_model=ApiResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """用户登录"""
     try:
         if not request.username or not request.password:
@@ -74,8 +83,8 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
                 detail="用户名和密码不能为空"
             )
         
-        auth_service = AuthService(db)
-        user = auth_service.authenticate_user(request.username, request.password)
+        auth_service = AsyncAuthService(db)
+        user = await auth_service.authenticate_user(request.username, request.password)
         
         if not user:
             raise HTTPException(
@@ -112,7 +121,7 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
         )
 
 @router.post("/register", response_model=ApiResponse)
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """用户注册"""
     try:
         # 验证输入
@@ -140,10 +149,10 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
                 detail="密码长度至少为6个字符"
             )
         
-        auth_service = AuthService(db)
+        auth_service = AsyncAuthService(db)
         
         try:
-            user = auth_service.create_user(
+            user = await auth_service.create_user(
                 username=request.username,
                 password=request.password,
                 display_name=request.displayName,
@@ -184,11 +193,11 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
         )
 
 @router.get("/check-username/{username}")
-async def check_username(username: str, db: Session = Depends(get_db)):
+async def check_username(username: str, db: AsyncSession = Depends(get_async_db)):
     """检查用户名是否可用"""
     try:
-        auth_service = AuthService(db)
-        is_available = auth_service.check_username_available(username)
+        auth_service = AsyncAuthService(db)
+        is_available = await auth_service.check_username_available(username)
         
         return ApiResponse(
             success=True,
@@ -219,3 +228,8 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
         data=user_info.dict(),
         message="获取用户信息成功"
     )
+
+@router.get("/cache/stats")
+def auth_cache_stats(current_user: User = Depends(get_current_user)):
+    """获取认证缓存统计，包括token和用户的命中率"""
+    return auth_cache.stats()
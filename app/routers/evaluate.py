@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.models import PromptEvaluation, PromptHistory
+from app.models import PromptEvaluation, PromptHistory, User
+from app.routers.auth import get_current_user
+from app.services.evaluation_cascade import get_cascade_stats
 from typing import List
 
 router = APIRouter()
@@ -38,4 +40,9 @@ def get_evaluations(history_id: int, db: Session = Depends(get_db)):
     evaluations = db.query(PromptEvaluation).filter_by(history_id=history_id).all()
     return [
         {"id": e.id, "score": e.score, "comment": e.comment, "evaluator": e.evaluator, "created_at": e.created_at} for e in evaluations
-    ] 
\ No newline at end of file
+    ]
+
+@router.get("/cascade/stats")
+def cascade_stats(current_user: User = Depends(get_current_user)):
+    """获取级联评估统计（节省的LLM评估调用次数等）"""
+    return get_cascade_stats()
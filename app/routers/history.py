@@ -1,60 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session, joinedload
 from app.database import get_db
 from app.models import PromptHistory, PromptTemplate, LLMModel, User
 from app.routers.auth import get_current_user
-from typing import List
-import csv
-import io
+from app.pagination import PageParams, DateRangeParams, FieldParams, apply_filters, paginate
+from app.csv_export import stream_csv
+from app.services.record_archive import record_archive
+from typing import List, Optional, Union
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-def list_history(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    history = db.query(PromptHistory).filter_by(user_id=current_user.id).all()
-    return [
-        {
-            "id": h.id,
-            "template_id": h.template_id,
-            "template_name": h.template.name if h.template else None,
-            "variables": h.variables,
-            "rendered_prompt": h.rendered_prompt,
-            "model_id": h.model_id,
-            "model_name": h.model.name if h.model else None,
-            "response": h.response,
-            "created_at": h.created_at.isoformat() if h.created_at else None
-        } for h in history
-    ]
+# 模板名、模型名与历史记录联表加载，避免逐条懒加载（N+1查询）
+HISTORY_NAME_OPTIONS = (
+    joinedload(PromptHistory.template).load_only(PromptTemplate.name),
+    joinedload(PromptHistory.model).load_only(LLMModel.name),
+)
+
+# 列表可返回的字段；大文本字段在摘要模式下只取开头部分
+HISTORY_LIST_COLUMNS = {
+    "id": PromptHistory.id,
+    "template_id": PromptHistory.template_id,
+    "template_name": PromptTemplate.name,
+    "variables": PromptHistory.variables,
+    "rendered_prompt": PromptHistory.rendered_prompt,
+    "model_id": PromptHistory.model_id,
+    "model_name": LLMModel.name,
+    "response": PromptHistory.response,
+    "created_at": PromptHistory.created_at,
+}
+HISTORY_CONTENT_HASHES = {
+    "rendered_prompt": PromptHistory.rendered_prompt_hash,
+    "response": PromptHistory.response_hash,
+}
+
+@router.get("/", response_model=Union[List[dict], dict])
+def list_history(
+    model_id: Optional[int] = None,
+    template_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    fields: FieldParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # 只查询请求的字段，模板名、模型名通过外连接在同一条SQL中取得
+    names, columns = fields.select(HISTORY_LIST_COLUMNS, HISTORY_CONTENT_HASHES)
+    query = db.query(*columns).filter(PromptHistory.user_id == current_user.id)
+    if "template_name" in names:
+        query = query.outerjoin(PromptHistory.template)
+    if "model_name" in names:
+        query = query.outerjoin(PromptHistory.model)
+    query = apply_filters(query, PromptHistory, page, model_id=model_id, template_id=template_id)
+    return paginate(query, PromptHistory, page, lambda h: {
+        name: h.created_at.isoformat() if name == "created_at" and h.created_at else getattr(h, name)
+        for name in names
+    })
 
 @router.get("/export")
-def export_history(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    history = db.query(PromptHistory).filter_by(user_id=current_user.id).all()
-    output = io.StringIO()
-    # 添加BOM头，使Excel能正确识别UTF-8编码的中文
-    output.write('\ufeff')
-    writer = csv.writer(output)
-    writer.writerow(["ID", "模板", "变量", "渲染后Prompt", "模型", "响应", "时间"])
-    for h in history:
-        writer.writerow([
+def export_history(dates: DateRangeParams = Depends(), current_user: User = Depends(get_current_user)):
+    """流式导出历史记录为CSV，按批读取，内存占用与记录数无关"""
+    user_id = current_user.id
+    
+    def build_query(db: Session):
+        # 只查询导出需要的列，模板名、模型名通过外连接在同一条SQL中取得
+        query = db.query(
+            PromptHistory.id,
+            PromptTemplate.name.label("template_name"),
+            PromptHistory.variables,
+            PromptHistory.rendered_prompt,
+            LLMModel.name.label("model_name"),
+            PromptHistory.response,
+            PromptHistory.created_at
+        ).outerjoin(PromptHistory.template).outerjoin(PromptHistory.model).filter(PromptHistory.user_id == user_id)
+        return apply_filters(query, PromptHistory, dates).order_by(PromptHistory.id)
+    
+    return stream_csv(
+        build_query,
+        ["ID", "模板", "变量", "渲染后Prompt", "模型", "响应", "时间"],
+        lambda h: [
             h.id,
-            h.template.name if h.template else "",
+            h.template_name or "",
             str(h.variables),
             h.rendered_prompt,
-            h.model.name if h.model else "",
+            h.model_name or "",
             h.response,
             h.created_at
-        ])
-    return Response(
-        content=output.getvalue(), 
+        ],
+        filename="prompt_history.csv",
         media_type="text/csv; charset=utf-8-sig",
-        headers={"Content-Disposition": f"attachment; filename=prompt_history.csv"}
+        bom=True,
+        # 归档记录早于主库中的记录，先输出
+        leading_rows=lambda: record_archive.iter_rows("prompt_history", user_id, dates)
     )
 
 @router.get("/{history_id}")
 def get_history(history_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    h = db.query(PromptHistory).filter_by(id=history_id, user_id=current_user.id).first()
+    h = db.query(PromptHistory).options(*HISTORY_NAME_OPTIONS).filter_by(id=history_id, user_id=current_user.id).first()
     if not h:
-        raise HTTPException(404, "历史记录不存在或无权访问")
+        # 不在主库中时查找归档记录
+        archived = record_archive.get("prompt_history", history_id, current_user.id)
+        if not archived:
+            raise HTTPException(404, "历史记录不存在或无权访问")
+        return {
+            "id": archived.id,
+            "template_id": archived.template_id,
+            "template_name": archived.template_name,
+            "variables": archived.variables,
+            "rendered_prompt": archived.rendered_prompt,
+            "model_id": archived.model_id,
+            "model_name": archived.model_name,
+            "response": archived.response,
+            "created_at": archived.created_at,
+            "archived": True
+        }
     return {
         "id": h.id,
         "template_id": h.template_id,
@@ -1,18 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import json
 import asyncio
 
-from ..database import get_db
+from ..database import get_async_db
+from ..config import TEMPLATE_PARAMS_BATCH_MAX
 from ..services.prompt_optimizer import PromptOptimizer
+from ..services.stream_runs import stream_runs, parse_event_id, StreamRun, TooManyRuns
 from ..models import User, LLMModel
 from .auth import get_current_user
 
 router = APIRouter(prefix="", tags=["提示词优化"])
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Expose-Headers": "X-Run-Id",
+}
+
+def _sse_response(run: StreamRun, after_seq: int = 0) -> StreamingResponse:
+    """
+    把一次运行的事件输出为SSE，每个事件带有 id: 运行ID:序号，便于断线后通过Last-Event-ID续传
+    """
+    async def event_stream():
+        async for seq, data in run.subscribe(after_seq):
+            if seq is None:
+                yield "data: " + data + "\n\n"
+            else:
+                yield f"id: {run.id}:{seq}\n" + "data: " + data + "\n\n"
+            await asyncio.sleep(0)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, "X-Run-Id": run.id}
+    )
+
+def _start_run(user_id: int, factory) -> StreamRun:
+    """启动一次运行，同时进行中的运行数超过上限时返回429"""
+    try:
+        return stream_runs.start(user_id, factory)
+    except TooManyRuns as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+def _resume_run(last_event_id: Optional[str], current_user: User) -> Optional[StreamingResponse]:
+    """根据Last-Event-ID查找当前用户的运行，找到则从该事件之后续传"""
+    run_id, seq = parse_event_id(last_event_id)
+    if not run_id:
+        return None
+    run = stream_runs.get(run_id, current_user.id)
+    if not run:
+        return None
+    return _sse_response(run, seq)
+
+async def _get_user_model(db: AsyncSession, model_id: Optional[int], user_id: int) -> Optional[LLMModel]:
+    """获取指定的模型，确保模型属于当前用户；未指定时返回None"""
+    if not model_id:
+        return None
+    result = await db.execute(select(LLMModel).filter_by(id=model_id, user_id=user_id, is_deleted=False).limit(1))
+    llm_model = result.scalars().first()
+    if not llm_model:
+        raise HTTPException(status_code=404, detail="指定的模型不存在或无权访问")
+    return llm_model
+
+def _default_template_parameters(prompt: str, error: str = None) -> dict:
+    """模型不可用或输出无法解析时的默认模板参数"""
+    params = {
+        "title": f"优化提示词 - {prompt[:20]}...",
+        "description": "通过AI智能分析生成的优化提示词模板，提供更好的指令清晰度和执行效果。",
+        "tags": "AI优化,提示词,智能生成"
+    }
+    if error:
+        params["error"] = error
+    return params
+
 class PromptOptimizeRequest(BaseModel):
     prompt: str
     requirements: Optional[str] = ""
@@ -20,37 +87,61 @@ class PromptOptimizeRequest(BaseModel):
     chatModel: Optional[str] = None
     language: str = "zh-CN"
     modelId: Optional[int] = None  # 添加模型ID字段
+    useCache: bool = True  # 为False时跳过阶段缓存，强制重新生成
+
+class PromptCandidatesRequest(PromptOptimizeRequest):
+    candidates: int = 3  # 候选数量
+    temperatures: Optional[List[float]] = None  # 每个候选使用的温度，不足时循环使用
+    varyTemperature: bool = True  # 未指定temperatures时是否自动使用不同温度
+
+class PromptRefineRequest(PromptOptimizeRequest):
+    maxRounds: int = 3  # 最大迭代轮数
+    beamWidth: int = 2  # 每轮保留的候选数量
+    patience: int = 1  # 连续多少轮提升不足时停止
+    minImprovement: float = 0.2  # 视为有效提升的最小分数增量
+    targetScore: float = 9.5  # 达到该分数即停止
+    tokenBudget: Optional[int] = None  # 估算token预算，超出后停止
 
 class PromptTemplateParameterRequest(BaseModel):
     prompt: str
     language: str = "zh-CN"
     modelId: Optional[int] = None  # 添加模型ID字段
+    useCache: bool = True  # 为False时跳过缓存，强制重新生成
+
+class PromptTemplateParameterBatchRequest(BaseModel):
+    prompts: List[str]
+    language: str = "zh-CN"
+    modelId: Optional[int] = None
+    useCache: bool = True
+    concurrency: Optional[int] = None  # 并发调用数，不超过OPTIMIZER_MAX_CONCURRENCY
 
 @router.post("/prompt/generate")
 async def generate_optimized_prompt(
     request: PromptOptimizeRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
     """
     生成优化后的提示词 - SSE流式响应
     """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
     if not request.prompt.strip():
         raise HTTPException(status_code=400, detail="提示词不能为空")
     
     # 获取模型实例，确保模型属于当前用户
-    llm_model = None
-    if request.modelId:
-        llm_model = db.query(LLMModel).filter_by(id=request.modelId, user_id=current_user.id, is_deleted=False).first()
-        if not llm_model:
-            raise HTTPException(status_code=404, detail="指定的模型不存在或无权访问")
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
     
     # 创建优化器实例
     optimizer = PromptOptimizer(model=request.chatModel, llm_model=llm_model)
     
-    async def generate_stream():
+    async def generate_stream(run_id: str):
         try:
-            yield "data: " + json.dumps({"type": "start", "message": "开始优化提示词"}) + "\n\n"
+            yield json.dumps({"type": "start", "message": "开始优化提示词", "runId": run_id})
             
             # 传递参数时，如果使用自定义模型，则不传递chat_model参数
             chat_model_param = None if llm_model else request.chatModel
@@ -61,52 +152,46 @@ async def generate_optimized_prompt(
                 enable_deep_reasoning=request.enableDeepReasoning,
                 chat_model=chat_model_param,
                 language=request.language,
+                use_cache=request.useCache,
                 optimization_type="general"  # 通用优化类型
             ):
-                yield "data: " + json.dumps(chunk) + "\n\n"
-                await asyncio.sleep(0.01)  # 小延迟以确保流式传输
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)  # 让出事件循环，分块延迟由优化器控制（命中缓存时不延迟）
             
-            yield "data: [DONE]\n\n"
+            yield "[DONE]"
             
         except Exception as e:
             error_data = {"type": "error", "message": f"优化失败: {str(e)}"}
-            yield "data: " + json.dumps(error_data) + "\n\n"
+            yield json.dumps(error_data)
     
-    return StreamingResponse(
-        generate_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
+    return _sse_response(_start_run(current_user.id, generate_stream))
 
 @router.post("/prompt/optimize-function-calling")
 async def optimize_function_calling_prompt(
     request: PromptOptimizeRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
     """
     优化Function Calling提示词 - SSE流式响应
     """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
     if not request.prompt.strip():
         raise HTTPException(status_code=400, detail="提示词不能为空")
     
     # 获取模型实例，确保模型属于当前用户
-    llm_model = None
-    if request.modelId:
-        llm_model = db.query(LLMModel).filter_by(id=request.modelId, user_id=current_user.id, is_deleted=False).first()
-        if not llm_model:
-            raise HTTPException(status_code=404, detail="指定的模型不存在或无权访问")
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
     
     optimizer = PromptOptimizer(model=request.chatModel, llm_model=llm_model)
     
-    async def generate_stream():
+    async def generate_stream(run_id: str):
         try:
-            yield "data: " + json.dumps({"type": "start", "message": "开始优化Function Calling提示词"}) + "\n\n"
+            yield json.dumps({"type": "start", "message": "开始优化Function Calling提示词", "runId": run_id})
             
             # 为Function Calling特化的优化要求
             fc_requirements = f"""
@@ -129,52 +214,46 @@ async def optimize_function_calling_prompt(
                 enable_deep_reasoning=request.enableDeepReasoning,
                 chat_model=chat_model_param,
                 language=request.language,
+                use_cache=request.useCache,
                 optimization_type="function-calling"  # 函数调用优化类型
             ):
-                yield "data: " + json.dumps(chunk) + "\n\n"
-                await asyncio.sleep(0.01)
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)
             
-            yield "data: [DONE]\n\n"
+            yield "[DONE]"
             
         except Exception as e:
             error_data = {"type": "error", "message": f"优化失败: {str(e)}"}
-            yield "data: " + json.dumps(error_data) + "\n\n"
+            yield json.dumps(error_data)
     
-    return StreamingResponse(
-        generate_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
+    return _sse_response(_start_run(current_user.id, generate_stream))
 
 @router.post("/prompt/optimizeimageprompt")
 async def optimize_image_prompt(
     request: PromptOptimizeRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
     """
     优化图像生成提示词 - SSE流式响应
     """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
     if not request.prompt.strip():
         raise HTTPException(status_code=400, detail="提示词不能为空")
     
     # 获取模型实例，确保模型属于当前用户
-    llm_model = None
-    if request.modelId:
-        llm_model = db.query(LLMModel).filter_by(id=request.modelId, user_id=current_user.id, is_deleted=False).first()
-        if not llm_model:
-            raise HTTPException(status_code=404, detail="指定的模型不存在或无权访问")
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
     
     optimizer = PromptOptimizer(model=request.chatModel, llm_model=llm_model)
     
-    async def generate_stream():
+    async def generate_stream(run_id: str):
         try:
-            yield "data: " + json.dumps({"type": "start", "message": "开始优化图像生成提示词"}) + "\n\n"
+            yield json.dumps({"type": "start", "message": "开始优化图像生成提示词", "runId": run_id})
             
             # 为图像生成特化的优化要求
             image_requirements = f"""
@@ -198,33 +277,155 @@ async def optimize_image_prompt(
                 enable_deep_reasoning=request.enableDeepReasoning,
                 chat_model=chat_model_param,
                 language=request.language,
+                use_cache=request.useCache,
                 optimization_type="image"  # 图像生成优化类型
             ):
-                yield "data: " + json.dumps(chunk) + "\n\n"
-                await asyncio.sleep(0.01)
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)
             
-            yield "data: [DONE]\n\n"
+            yield "[DONE]"
             
         except Exception as e:
             error_data = {"type": "error", "message": f"优化失败: {str(e)}"}
-            yield "data: " + json.dumps(error_data) + "\n\n"
+            yield json.dumps(error_data)
     
-    return StreamingResponse(
-        generate_stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "*",
-        }
-    )
+    return _sse_response(_start_run(current_user.id, generate_stream))
+
+@router.post("/prompt/generate-candidates")
+async def generate_prompt_candidates(
+    request: PromptCandidatesRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    并发生成多个优化候选并评分排序 - SSE流式响应
+    """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
+    if not request.prompt.strip():
+        raise HTTPException(status_code=400, detail="提示词不能为空")
+    if request.candidates < 1:
+        raise HTTPException(status_code=400, detail="候选数量必须大于0")
+    
+    # 获取模型实例，确保模型属于当前用户
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
+    
+    optimizer = PromptOptimizer(model=request.chatModel, llm_model=llm_model)
+    
+    async def generate_stream(run_id: str):
+        try:
+            yield json.dumps({"type": "start", "message": "开始生成优化候选", "runId": run_id})
+            
+            # 传递参数时，如果使用自定义模型，则不传递chat_model参数
+            chat_model_param = None if llm_model else request.chatModel
+            
+            async for chunk in optimizer.optimize_prompt_candidates_stream(
+                prompt=request.prompt,
+                requirements=request.requirements,
+                candidates=request.candidates,
+                temperatures=request.temperatures,
+                vary_temperature=request.varyTemperature,
+                enable_deep_reasoning=request.enableDeepReasoning,
+                chat_model=chat_model_param,
+                language=request.language,
+                use_cache=request.useCache,
+                optimization_type="general"
+            ):
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)
+            
+            yield "[DONE]"
+            
+        except Exception as e:
+            error_data = {"type": "error", "message": f"优化失败: {str(e)}"}
+            yield json.dumps(error_data)
+    
+    return _sse_response(_start_run(current_user.id, generate_stream))
+
+@router.post("/prompt/refine")
+async def refine_prompt(
+    request: PromptRefineRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    迭代优化提示词，每轮评估结果反馈给下一轮，分数收敛后提前停止 - SSE流式响应
+    """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
+    if not request.prompt.strip():
+        raise HTTPException(status_code=400, detail="提示词不能为空")
+    
+    # 获取模型实例，确保模型属于当前用户
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
+    
+    optimizer = PromptOptimizer(model=request.chatModel, llm_model=llm_model)
+    
+    async def generate_stream(run_id: str):
+        try:
+            yield json.dumps({"type": "start", "message": "开始迭代优化提示词", "runId": run_id})
+            
+            # 传递参数时，如果使用自定义模型，则不传递chat_model参数
+            chat_model_param = None if llm_model else request.chatModel
+            
+            async for chunk in optimizer.refine_prompt_stream(
+                prompt=request.prompt,
+                requirements=request.requirements,
+                max_rounds=request.maxRounds,
+                beam_width=request.beamWidth,
+                patience=request.patience,
+                min_improvement=request.minImprovement,
+                target_score=request.targetScore,
+                token_budget=request.tokenBudget,
+                enable_deep_reasoning=request.enableDeepReasoning,
+                chat_model=chat_model_param,
+                language=request.language,
+                use_cache=request.useCache,
+                optimization_type="general"
+            ):
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)
+            
+            yield "[DONE]"
+            
+        except Exception as e:
+            error_data = {"type": "error", "message": f"优化失败: {str(e)}"}
+            yield json.dumps(error_data)
+    
+    return _sse_response(_start_run(current_user.id, generate_stream))
+
+@router.get("/prompt/runs/{run_id}/events")
+async def get_run_events(
+    run_id: str,
+    after: int = 0,
+    current_user: User = Depends(get_current_user),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    回放优化运行的事件并继续接收实时事件 - SSE流式响应（供EventSource重连使用）
+    """
+    run = stream_runs.get(run_id, current_user.id)
+    if not run:
+        raise HTTPException(status_code=404, detail="运行不存在或已过期")
+    
+    header_run_id, header_seq = parse_event_id(last_event_id)
+    if header_run_id == run_id:
+        after = max(after, header_seq)
+    return _sse_response(run, after)
 
 @router.post("/prompt/generateprompttemplateparameters")
 async def generate_prompt_template_parameters(
     request: PromptTemplateParameterRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     生成提示词模板参数（标题、描述、标签）
@@ -233,87 +434,77 @@ async def generate_prompt_template_parameters(
         raise HTTPException(status_code=400, detail="提示词不能为空")
     
     # 获取模型实例，确保模型属于当前用户
-    llm_model = None
-    if request.modelId:
-        llm_model = db.query(LLMModel).filter_by(id=request.modelId, user_id=current_user.id, is_deleted=False).first()
-        if not llm_model:
-            raise HTTPException(status_code=404, detail="指定的模型不存在或无权访问")
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
     
     optimizer = PromptOptimizer(llm_model=llm_model)
     
     try:
-        # 构建生成模板参数的提示词
-        if request.language == "zh-CN":
-            system_prompt = f"""
-请为以下提示词生成合适的模板参数：
-
-提示词内容：
-{request.prompt}
-
-请生成以下信息并以JSON格式返回：
-1. title: 简洁明确的标题（不超过50字）
-2. description: 详细的描述说明（100-200字）
-3. tags: 相关标签（用逗号分隔，3-5个标签）
-
-返回格式：
-{{
-    "title": "标题",
-    "description": "描述",
-    "tags": "标签1,标签2,标签3"
-}}
-"""
-        else:
-            system_prompt = f"""
-Please generate appropriate template parameters for the following prompt:
-
-Prompt Content:
-{request.prompt}
-
-Please generate the following information and return in JSON format:
-1. title: Concise and clear title (no more than 50 characters)
-2. description: Detailed description (100-200 characters)
-3. tags: Relevant tags (comma-separated, 3-5 tags)
-
-Return format:
-{{
-    "title": "Title",
-    "description": "Description", 
-    "tags": "tag1,tag2,tag3"
-}}
-"""
-        
         # 如果有配置模型，则使用模型生成参数
         if optimizer.adapter:
-            result = optimizer.adapter.send_prompt(system_prompt)
-            if result and "output" in result:
-                # 尝试解析JSON
-                try:
-                    output = result["output"]
-                    # 查找JSON部分
-                    import re
-                    json_match = re.search(r'\{.*\}', output, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group(0)
-                        params = json.loads(json_str)
-                        return params
-                except Exception as e:
-                    # 解析失败，返回默认值
-                    return {
-                        "title": f"优化提示词 - {request.prompt[:20]}...",
-                        "description": "通过AI智能分析生成的优化提示词模板，提供更好的指令清晰度和执行效果。",
-                        "tags": "AI优化,提示词,智能生成",
-                        "error": f"解析失败: {str(e)}"
-                    }
+            output = await optimizer.generate_template_parameters(
+                request.prompt, request.language, use_cache=request.useCache
+            )
+            if output:
+                params = optimizer.parse_template_parameters(output)
+                if params:
+                    return params
+                # 解析失败，返回默认值
+                return _default_template_parameters(request.prompt, "解析失败: 模型输出不是有效的模板参数JSON")
         
         # 默认返回
-        return {
-            "title": f"优化提示词 - {request.prompt[:20]}...",
-            "description": "通过AI智能分析生成的优化提示词模板，提供更好的指令清晰度和执行效果。",
-            "tags": "AI优化,提示词,智能生成"
-        }
+        return _default_template_parameters(request.prompt)
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"生成模板参数失败: {str(e)}"
         )
+
+
+@router.post("/prompt/generateprompttemplateparameters/batch")
+async def generate_prompt_template_parameters_batch(
+    request: PromptTemplateParameterBatchRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    批量生成提示词模板参数 - SSE流式响应，按完成顺序逐条返回
+    """
+    # 断线重连：携带Last-Event-ID时从已有运行续传
+    resumed = _resume_run(last_event_id, current_user)
+    if resumed:
+        return resumed
+    
+    if not request.prompts:
+        raise HTTPException(status_code=400, detail="提示词列表不能为空")
+    if len(request.prompts) > TEMPLATE_PARAMS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多处理{TEMPLATE_PARAMS_BATCH_MAX}个提示词")
+    
+    llm_model = await _get_user_model(db, request.modelId, current_user.id)
+    
+    optimizer = PromptOptimizer(llm_model=llm_model)
+    
+    async def generate_stream(run_id: str):
+        try:
+            yield json.dumps({"type": "start", "message": "开始批量生成模板参数", "runId": run_id})
+            
+            async for chunk in optimizer.generate_template_parameters_batch_stream(
+                prompts=request.prompts,
+                language=request.language,
+                use_cache=request.useCache,
+                concurrency=request.concurrency
+            ):
+                # 失败的条目附带默认参数，与单条接口的返回保持一致
+                if chunk.get("type") == "item" and chunk["params"] is None:
+                    chunk["params"] = _default_template_parameters(request.prompts[chunk["index"]] or "")
+                yield json.dumps(chunk)
+                await asyncio.sleep(0)
+            
+            yield "[DONE]"
+            
+        except Exception as e:
+            error_data = {"type": "error", "message": f"批量生成失败: {str(e)}"}
+            yield json.dumps(error_data)
+    
+    return _sse_response(_start_run(current_user.id, generate_stream))
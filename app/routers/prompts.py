@@ -3,14 +3,13 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Prompt, LLMModel, PromptTemplate, User
 from app.routers.auth import get_current_user
+from app.pagination import PageParams, DateRangeParams, FieldParams, apply_filters, paginate
+from app.csv_export import stream_csv
 from app.services.model_adapter import ModelAdapter
-from app.services.evaluator import ResponseEvaluator
-from typing import List
+from app.services.evaluation_cascade import EvaluationCascade
+from typing import List, Optional, Union
 import logging
 import json
-import csv
-from io import StringIO
-from fastapi.responses import StreamingResponse
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
@@ -18,23 +17,33 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-def list_prompts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# 列表可返回的字段；content在摘要模式下只取开头部分
+PROMPT_LIST_COLUMNS = {
+    "id": Prompt.id,
+    "name": Prompt.name,
+    "description": Prompt.description,
+    "content": Prompt.content,
+    "variables": Prompt.variables,
+    "model_id": Prompt.model_id,
+    "template_id": Prompt.template_id,
+    "created_at": Prompt.created_at,
+    "updated_at": Prompt.updated_at,
+}
+
+@router.get("/", response_model=Union[List[dict], dict])
+def list_prompts(
+    model_id: Optional[int] = None,
+    template_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    fields: FieldParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    names, columns = fields.select(PROMPT_LIST_COLUMNS, {"content": Prompt.content_hash})
     try:
-        prompts = db.query(Prompt).filter_by(user_id=current_user.id, is_deleted=False).all()
-        return [
-            {
-                "id": p.id,
-                "name": p.name,
-                "description": p.description,
-                "content": p.content,
-                "variables": p.variables,
-                "model_id": p.model_id,
-                "template_id": p.template_id,
-                "created_at": p.created_at,
-                "updated_at": p.updated_at
-            } for p in prompts
-        ]
+        query = db.query(*columns).filter(Prompt.user_id == current_user.id, Prompt.is_deleted == False)
+        query = apply_filters(query, Prompt, page, model_id=model_id, template_id=template_id)
+        return paginate(query, Prompt, page, lambda p: {name: getattr(p, name) for name in names})
     except Exception as e:
         logger.error(f"Failed to list prompts: {str(e)}")
         raise HTTPException(500, f"获取提示词列表失败: {str(e)}")
@@ -204,7 +213,7 @@ def test_prompt(prompt_id: int, data: dict, db: Session = Depends(get_db), curre
         response = adapter.send_prompt(content)
         
         # 评估响应
-        evaluator = ResponseEvaluator()
+        evaluator = EvaluationCascade()
         evaluation = evaluator.evaluate_response(content, response)
         
         return {
@@ -218,35 +227,32 @@ def test_prompt(prompt_id: int, data: dict, db: Session = Depends(get_db), curre
         raise HTTPException(500, f"测试提示词失败: {str(e)}")
 
 @router.post("/export")
-def export_prompts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def export_prompts(dates: DateRangeParams = Depends(), current_user: User = Depends(get_current_user)):
     try:
-        prompts = db.query(Prompt).filter_by(user_id=current_user.id, is_deleted=False).all()
-        
-        # 准备CSV数据
-        output = StringIO()
-        writer = csv.writer(output)
+        user_id = current_user.id
         
-        # 写入表头
-        writer.writerow([
-            "ID", "名称", "描述", "内容", "变量", 
-            "模型ID", "模板ID", "创建时间", "更新时间"
-        ])
+        def build_query(db: Session):
+            # 只查询导出需要的列
+            query = db.query(
+                Prompt.id, Prompt.name, Prompt.description, Prompt.content, Prompt.variables,
+                Prompt.model_id, Prompt.template_id, Prompt.created_at, Prompt.updated_at
+            ).filter(Prompt.user_id == user_id, Prompt.is_deleted == False)
+            return apply_filters(query, Prompt, dates).order_by(Prompt.id)
         
-        # 写入数据
-        for p in prompts:
-            writer.writerow([
+        # 按批读取并流式输出CSV
+        return stream_csv(
+            build_query,
+            [
+                "ID", "名称", "描述", "内容", "变量", 
+                "模型ID", "模板ID", "创建时间", "更新时间"
+            ],
+            lambda p: [
                 p.id, p.name, p.description, p.content,
                 json.dumps(p.variables, ensure_ascii=False),
                 p.model_id, p.template_id,
                 p.created_at, p.updated_at
-            ])
-        
-        # 准备响应
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment;filename=prompts.csv"}
+            ],
+            filename="prompts.csv"
         )
     except Exception as e:
         logger.error(f"Failed to export prompts: {str(e)}")
@@ -3,13 +3,12 @@ from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Response, Prompt, User
 from app.routers.auth import get_current_user
-from app.services.evaluator import ResponseEvaluator
-from typing import List
+from app.pagination import PageParams, DateRangeParams, FieldParams, apply_filters, paginate
+from app.csv_export import stream_csv
+from app.services.evaluation_cascade import EvaluationCascade
+from typing import List, Optional, Union
 import logging
 import json
-import csv
-from io import StringIO
-from fastapi.responses import StreamingResponse
 
 # 配置日志
 logging.basicConfig(level=logging.DEBUG)
@@ -17,20 +16,29 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-def list_responses(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# 列表可返回的字段；content在摘要模式下只取开头部分
+RESPONSE_LIST_COLUMNS = {
+    "id": Response.id,
+    "prompt_id": Response.prompt_id,
+    "content": Response.content,
+    "evaluation": Response.evaluation,
+    "created_at": Response.created_at,
+    "updated_at": Response.updated_at,
+}
+
+@router.get("/", response_model=Union[List[dict], dict])
+def list_responses(
+    prompt_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    fields: FieldParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    names, columns = fields.select(RESPONSE_LIST_COLUMNS, {"content": Response.content_hash})
     try:
-        responses = db.query(Response).filter_by(user_id=current_user.id, is_deleted=False).all()
-        return [
-            {
-                "id": r.id,
-                "prompt_id": r.prompt_id,
-                "content": r.content,
-                "evaluation": r.evaluation,
-                "created_at": r.created_at,
-                "updated_at": r.updated_at
-            } for r in responses
-        ]
+        query = db.query(*columns).filter(Response.user_id == current_user.id, Response.is_deleted == False)
+        query = apply_filters(query, Response, page, prompt_id=prompt_id)
+        return paginate(query, Response, page, lambda r: {name: getattr(r, name) for name in names})
     except Exception as e:
         logger.error(f"Failed to list responses: {str(e)}")
         raise HTTPException(500, f"获取响应列表失败: {str(e)}")
@@ -68,7 +76,7 @@ def create_response(data: dict, db: Session = Depends(get_db), current_user: Use
                 raise HTTPException(404, "提示词不存在或无权访问")
         
         # 评估响应
-        evaluator = ResponseEvaluator()
+        evaluator = EvaluationCascade()
         # 如果有关联的提示词，使用提示词内容；否则使用默认提示词
         prompt_content = prompt.content if prompt else "请评估以下内容的质量"
         evaluation = evaluator.evaluate_response(prompt_content, data["content"])
@@ -107,7 +115,7 @@ def update_response(response_id: int, data: dict, db: Session = Depends(get_db),
         if "content" in data:
             response.content = data["content"]
             # 重新评估响应
-            evaluator = ResponseEvaluator()
+            evaluator = EvaluationCascade()
             # 获取关联的提示词内容
             prompt = db.query(Prompt).filter_by(id=response.prompt_id, user_id=current_user.id, is_deleted=False).first() if response.prompt_id else None
             prompt_content = prompt.content if prompt else "请评估以下内容的质量"
@@ -141,34 +149,31 @@ def delete_response(response_id: int, db: Session = Depends(get_db), current_use
         raise HTTPException(500, f"删除响应失败: {str(e)}")
 
 @router.get("/export")
-def export_responses(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def export_responses(dates: DateRangeParams = Depends(), current_user: User = Depends(get_current_user)):
     try:
-        responses = db.query(Response).filter_by(user_id=current_user.id, is_deleted=False).all()
-        
-        # 准备CSV数据
-        output = StringIO()
-        writer = csv.writer(output)
+        user_id = current_user.id
         
-        # 写入表头
-        writer.writerow([
-            "ID", "提示词ID", "内容", "评估结果",
-            "创建时间", "更新时间"
-        ])
+        def build_query(db: Session):
+            # 只查询导出需要的列
+            query = db.query(
+                Response.id, Response.prompt_id, Response.content, Response.evaluation,
+                Response.created_at, Response.updated_at
+            ).filter(Response.user_id == user_id, Response.is_deleted == False)
+            return apply_filters(query, Response, dates).order_by(Response.id)
         
-        # 写入数据
-        for r in responses:
-            writer.writerow([
+        # 按批读取并流式输出CSV
+        return stream_csv(
+            build_query,
+            [
+                "ID", "提示词ID", "内容", "评估结果",
+                "创建时间", "更新时间"
+            ],
+            lambda r: [
                 r.id, r.prompt_id, r.content,
                 json.dumps(r.evaluation, ensure_ascii=False),
                 r.created_at, r.updated_at
-            ])
-        
-        # 准备响应
-        output.seek(0)
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment;filename=responses.csv"}
+            ],
+            filename="responses.csv"
         )
     except Exception as e:
         logger.error(f"Failed to export responses: {str(e)}")
@@ -0,0 +1,117 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, joinedload
+from app.database import get_db
+from app.models import User
+from app.routers.auth import get_current_user
+from app.services.search_index import INDEXED_MODELS, search_index
+from app.config import PAGINATION_DEFAULT_LIMIT, PAGINATION_MAX_LIMIT
+from typing import Dict, List, Optional
+import base64
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+SNIPPET_BEFORE = 30
+SNIPPET_LENGTH = 120
+
+
+def _encode_offset(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode("ascii")).decode("ascii").rstrip("=")
+
+
+def _decode_offset(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = int(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(400, "无效的分页游标")
+    if offset < 0:
+        raise HTTPException(400, "无效的分页游标")
+    return offset
+
+
+def _snippet(text: Optional[str], q: str) -> str:
+    """截取包含第一个命中词的片段"""
+    if not text:
+        return ""
+    lowered = text.lower()
+    positions = [p for p in (lowered.find(term) for term in q.lower().split()) if p >= 0]
+    start = max(min(positions) - SNIPPET_BEFORE, 0) if positions else 0
+    snippet = text[start:start + SNIPPET_LENGTH].replace("\n", " ")
+    return ("…" if start else "") + snippet + ("…" if start + SNIPPET_LENGTH < len(text) else "")
+
+
+def _matching_text(q: str, *texts: Optional[str]) -> Optional[str]:
+    """返回第一个包含搜索词的文本，都不包含时返回第一个非空文本"""
+    terms = q.lower().split()
+    for text in texts:
+        if text and any(term in text.lower() for term in terms):
+            return text
+    return next((text for text in texts if text), None)
+
+
+def _serialize(kind: str, obj, q: str, score: float) -> dict:
+    if kind == "test_record":
+        title = obj.template.name if obj.template else (obj.model.name if obj.model else None)
+        body = _matching_text(q, obj.prompt, obj.response)
+    else:
+        title = obj.name
+        body = _matching_text(q, obj.description, obj.content)
+    return {
+        "type": kind,
+        "id": obj.id,
+        "title": title,
+        "snippet": _snippet(body, q),
+        "score": round(score, 4),
+        "created_at": obj.created_at.isoformat() if obj.created_at else None
+    }
+
+
+@router.get("/")
+def search(
+    q: str = Query(..., min_length=1, max_length=200, description="搜索词，多个词之间为AND关系"),
+    types: Optional[str] = Query(None, description="逗号分隔的类型：template,prompt,test_record，默认全部"),
+    limit: int = Query(PAGINATION_DEFAULT_LIMIT, ge=1, le=PAGINATION_MAX_LIMIT, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """在模板、提示词和测试记录中全文搜索，按相关度排序"""
+    kinds = [t.strip() for t in types.split(",") if t.strip()] if types else list(INDEXED_MODELS)
+    unknown = [k for k in kinds if k not in INDEXED_MODELS]
+    if unknown:
+        raise HTTPException(400, f"不支持的搜索类型: {', '.join(unknown)}")
+    offset = _decode_offset(cursor) if cursor else 0
+
+    try:
+        hits = search_index.search(db, current_user.id, q, kinds, limit + 1, offset)
+        has_more = len(hits) > limit
+        hits = hits[:limit]
+
+        # 按类型批量加载命中的对象
+        ids_by_kind: Dict[str, List[int]] = {}
+        for kind, ref_id, _ in hits:
+            ids_by_kind.setdefault(kind, []).append(ref_id)
+        objects = {}
+        for kind, ids in ids_by_kind.items():
+            model = INDEXED_MODELS[kind][0]
+            query = db.query(model).filter(model.id.in_(ids), model.user_id == current_user.id, model.is_deleted == False)
+            if kind == "test_record":
+                query = query.options(joinedload(model.model), joinedload(model.template))
+            objects.update(((kind, obj.id), obj) for obj in query)
+
+        return {
+            "items": [
+                _serialize(kind, objects[(kind, ref_id)], q, score)
+                for kind, ref_id, score in hits if (kind, ref_id) in objects
+            ],
+            "next_cursor": _encode_offset(offset + limit) if has_more else None,
+            "total": None
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"搜索失败: {str(e)}")
+        raise HTTPException(500, f"搜索失败: {str(e)}")
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app.models import PromptTemplate, User
 from app.routers.auth import get_current_user
+from app.pagination import PageParams, FieldParams, apply_filters, paginate
 from app.websocket import manager
-from typing import List
+from typing import List, Union
 import logging
 import json
 from sqlalchemy.sql import func
@@ -16,21 +19,40 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.get("/", response_model=List[dict])
-def list_templates(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def _first_template(db: AsyncSession, **filters):
+    """按条件查询第一个模板（异步会话）"""
+    result = await db.execute(select(PromptTemplate).filter_by(**filters).limit(1))
+    return result.scalars().first()
+
+# 列表可返回的字段；content在摘要模式下只取开头部分
+TEMPLATE_LIST_COLUMNS = {
+    "id": PromptTemplate.id,
+    "name": PromptTemplate.name,
+    "description": PromptTemplate.description,
+    "content": PromptTemplate.content,
+    "variables": PromptTemplate.variables,
+    "created_at": PromptTemplate.created_at,
+    "updated_at": PromptTemplate.updated_at,
+}
+TEMPLATE_DATETIME_FIELDS = ("created_at", "updated_at")
+
+@router.get("/", response_model=Union[List[dict], dict])
+def list_templates(
+    page: PageParams = Depends(),
+    fields: FieldParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    # 模板内容直接保存在表中，摘要模式下在SQL中截取
+    names, columns = fields.select(TEMPLATE_LIST_COLUMNS, {}, text_fields=("content",))
     try:
-        templates = db.query(PromptTemplate).filter_by(user_id=current_user.id, is_deleted=False).all()
-        return [
-            {
-                "id": t.id,
-                "name": t.name,
-                "description": t.description,
-                "content": t.content,
-                "variables": t.variables,
-                "created_at": t.created_at.isoformat() if t.created_at else None,
-                "updated_at": t.updated_at.isoformat() if t.updated_at else None
-            } for t in templates
-        ]
+        query = db.query(*columns).filter(PromptTemplate.user_id == current_user.id, PromptTemplate.is_deleted == False)
+        query = apply_filters(query, PromptTemplate, page)
+        return paginate(query, PromptTemplate, page, lambda t: {
+            name: (getattr(t, name).isoformat() if getattr(t, name) else None)
+            if name in TEMPLATE_DATETIME_FIELDS else getattr(t, name)
+            for name in names
+        })
     except Exception as e:
         logger.error(f"Failed to list templates: {str(e)}")
         raise HTTPException(500, f"获取模板列表失败: {str(e)}")
@@ -59,24 +81,24 @@ def get_template(template_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(500, f"获取模板详情失败: {str(e)}")
 
 @router.post("/")
-async def create_template(template_data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_template(template_data: dict, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     try:
         # 检查是否存在同名未删除模板
-        existing_active = db.query(PromptTemplate).filter_by(
+        existing_active = await _first_template(db,
             name=template_data["name"],
             user_id=current_user.id,
             is_deleted=False
-        ).first()
+        )
         
         if existing_active:
             raise HTTPException(400, "模板名称已存在，请使用其他名称")
             
         # 检查是否存在同名已删除模板
-        existing_deleted = db.query(PromptTemplate).filter_by(
+        existing_deleted = await _first_template(db,
             name=template_data["name"],
             user_id=current_user.id,
             is_deleted=True
-        ).first()
+        )
         
         if existing_deleted:
             # 如果存在已删除的同名模板，更新它
@@ -91,8 +113,8 @@ async def create_template(template_data: dict, db: Session = Depends(get_db), cu
             template = PromptTemplate(**template_data)
             db.add(template)
             
-        db.commit()
-        db.refresh(template)
+        await db.commit()
+        await db.refresh(template)
         
         # 广播创建消息
         try:
@@ -103,7 +125,7 @@ async def create_template(template_data: dict, db: Session = Depends(get_db), cu
                     "name": template.name,
                     "user_id": current_user.id
                 }
-            })
+            }, user_id=current_user.id, topic="templates")
         except Exception as e:
             logger.error(f"Failed to broadcast template creation: {str(e)}")
         
@@ -114,7 +136,7 @@ async def create_template(template_data: dict, db: Session = Depends(get_db), cu
         }
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template creation failed (integrity error): {str(e)}")
         raise HTTPException(400, "模板创建失败：数据完整性错误")
         
@@ -122,24 +144,24 @@ async def create_template(template_data: dict, db: Session = Depends(get_db), cu
         raise e
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template creation failed: {str(e)}")
         raise HTTPException(500, f"模板创建失败: {str(e)}")
 
 @router.put("/{template_id}")
-async def update_template(template_id: int, template_data: dict, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def update_template(template_id: int, template_data: dict, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     try:
-        template = db.query(PromptTemplate).filter_by(id=template_id, user_id=current_user.id, is_deleted=False).first()
+        template = await _first_template(db, id=template_id, user_id=current_user.id, is_deleted=False)
         if not template:
             raise HTTPException(404, "模板不存在")
             
         # 检查新名称是否与其他模板冲突
         if "name" in template_data and template_data["name"] != template.name:
-            existing = db.query(PromptTemplate).filter_by(
+            existing = await _first_template(db,
                 name=template_data["name"],
                 user_id=current_user.id,
                 is_deleted=False
-            ).first()
+            )
             if existing:
                 raise HTTPException(400, "模板名称已存在")
         
@@ -148,7 +170,7 @@ async def update_template(template_id: int, template_data: dict, db: Session = D
             if key != "user_id":  # 不允许修改用户ID
                 setattr(template, key, value)
             
-        db.commit()
+        await db.commit()
         
         # 广播更新消息
         try:
@@ -159,7 +181,7 @@ async def update_template(template_id: int, template_data: dict, db: Session = D
                     "name": template.name,
                     "user_id": current_user.id
                 }
-            })
+            }, user_id=current_user.id, topic="templates")
         except Exception as e:
             logger.error(f"Failed to broadcast template update: {str(e)}")
         
@@ -170,7 +192,7 @@ async def update_template(template_id: int, template_data: dict, db: Session = D
         }
         
     except IntegrityError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template update failed (integrity error): {str(e)}")
         raise HTTPException(400, "模板更新失败：数据完整性错误")
         
@@ -178,19 +200,19 @@ async def update_template(template_id: int, template_data: dict, db: Session = D
         raise e
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template update failed: {str(e)}")
         raise HTTPException(500, f"模板更新失败: {str(e)}")
 
 @router.delete("/{template_id}")
-async def delete_template(template_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def delete_template(template_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     try:
-        template = db.query(PromptTemplate).filter_by(id=template_id, user_id=current_user.id, is_deleted=False).first()
+        template = await _first_template(db, id=template_id, user_id=current_user.id, is_deleted=False)
         if not template:
             raise HTTPException(404, "模板不存在")
         
         template.is_deleted = True
-        db.commit()
+        await db.commit()
 
         # 广播删除消息
         try:
@@ -201,7 +223,7 @@ async def delete_template(template_id: int, db: Session = Depends(get_db), curre
                     "name": template.name,
                     "user_id": current_user.id
                 }
-            })
+            }, user_id=current_user.id, topic="templates")
         except Exception as e:
             logger.error(f"Failed to broadcast template deletion: {str(e)}")
         
@@ -211,28 +233,28 @@ async def delete_template(template_id: int, db: Session = Depends(get_db), curre
         raise e
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template deletion failed: {str(e)}")
         raise HTTPException(500, f"删除模板失败: {str(e)}")
 
 @router.post("/{template_id}/restore")
-async def restore_template(template_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def restore_template(template_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     try:
-        template = db.query(PromptTemplate).filter_by(id=template_id, user_id=current_user.id, is_deleted=True).first()
+        template = await _first_template(db, id=template_id, user_id=current_user.id, is_deleted=True)
         if not template:
             raise HTTPException(404, "模板不存在或未被删除")
             
         # 检查是否存在同名未删除模板
-        existing = db.query(PromptTemplate).filter_by(
+        existing = await _first_template(db,
             name=template.name,
             user_id=current_user.id,
             is_deleted=False
-        ).first()
+        )
         if existing:
             raise HTTPException(400, "存在同名模板，无法恢复")
         
         template.is_deleted = False
-        db.commit()
+        await db.commit()
 
         # 广播恢复消息
         try:
@@ -243,7 +265,7 @@ async def restore_template(template_id: int, db: Session = Depends(get_db), curr
                     "name": template.name,
                     "user_id": current_user.id
                 }
-            })
+            }, user_id=current_user.id, topic="templates")
         except Exception as e:
             logger.error(f"Failed to broadcast template restoration: {str(e)}")
         
@@ -253,6 +275,6 @@ async def restore_template(template_id: int, db: Session = Depends(get_db), curr
         raise e
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Template restoration failed: {str(e)}")
         raise HTTPException(500, f"恢复模板失败: {str(e)}") 
\ No newline at end of file
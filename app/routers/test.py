@@ -1,18 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.orm import Session, joinedload
 from app.database import get_db
 from app.models import PromptTemplate, LLMModel, PromptHistory, TestRecord, User
+from app.models.content import content_hash
 from app.routers.auth import get_current_user
 from app.services.model_adapter import ModelAdapter
-from app.services.evaluator import ResponseEvaluator
+from app.services.evaluation_cascade import EvaluationCascade
+from app.services.evaluation_tasks import evaluation_tasks, run_evaluation_task
+from app.services.record_writer import record_writer
+from app.services.record_archive import record_archive
+from app.pagination import PageParams, DateRangeParams, FieldParams, apply_filters, paginate
+from app.csv_export import stream_csv
 from typing import List, Dict, Optional
 import re
 import json
 import logging
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
-from io import StringIO
-import csv
 import datetime
 
 # 配置日志
@@ -21,6 +25,12 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# 详情需要模型名、模板名，与记录在同一条SQL中联表加载，避免逐条懒加载（N+1查询）
+RECORD_NAME_OPTIONS = (
+    joinedload(TestRecord.model).load_only(LLMModel.name),
+    joinedload(TestRecord.template).load_only(PromptTemplate.name),
+)
+
 def render_prompt(template: str, variables: dict):
     def replacer(match):
         var = match.group(1)
@@ -32,6 +42,7 @@ class TestPromptRequest(BaseModel):
     model_id: int
     variables: Dict = {}
     evaluator_model_id: Optional[int] = None
+    async_evaluation: bool = False  # 为True时先返回生成结果，评估在后台完成后通过WebSocket推送
 
 @router.post("/validate_api_key")
 def validate_api_key(data: dict):
@@ -52,7 +63,7 @@ def validate_api_key(data: dict):
         raise HTTPException(500, f"验证API密钥失败: {str(e)}")
 
 @router.post("/prompt")
-def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def test_prompt(request: TestPromptRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     try:
         # 获取选定的模型
         model = db.query(LLMModel).filter_by(id=request.model_id, is_deleted=False).first()
@@ -84,16 +95,20 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), curre
         
         # 如果指定了评估模型，进行评估
         evaluation = None
+        deferred_evaluator_id = None
         if request.evaluator_model_id:
             evaluator_model = db.query(LLMModel).filter_by(
                 id=request.evaluator_model_id, 
                 is_deleted=False
             ).first()
             
-            if evaluator_model:
+            if evaluator_model and request.async_evaluation:
+                # 评估放到后台执行，不阻塞本次响应
+                deferred_evaluator_id = evaluator_model.id
+            elif evaluator_model:
                 try:
                     logger.info(f"使用评估模型: {evaluator_model.name} (ID={evaluator_model.id})")
-                    evaluator = ResponseEvaluator(evaluator_model)
+                    evaluator = EvaluationCascade(evaluator_model)
                     evaluation = evaluator.evaluate_response(
                         prompt=request.content,
                         response=result["output"]
@@ -118,10 +133,10 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), curre
                     }
 
         # 保存测试记录
-        test_record = None
+        record_id = None
         try:
             logger.info("保存测试记录")
-            test_record = TestRecord(
+            fields = dict(
                 model_id=model.id,
                 prompt=request.content,
                 variables=variables,
@@ -129,10 +144,17 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), curre
                 evaluation=evaluation if isinstance(evaluation, dict) else None,
                 user_id=current_user.id
             )
-            db.add(test_record)
-            db.commit()
-            db.refresh(test_record)
-            logger.info(f"测试记录保存成功: ID={test_record.id}")
+            if record_writer.enabled:
+                # 放入缓冲区由后台批量提交，ID已预先分配
+                record_id = record_writer.submit(db, fields)
+                logger.info(f"测试记录已加入写入队列: ID={record_id}")
+            else:
+                test_record = TestRecord(**fields)
+                db.add(test_record)
+                db.commit()
+                db.refresh(test_record)
+                record_id = test_record.id
+                logger.info(f"测试记录保存成功: ID={record_id}")
         except Exception as e:
             logger.error(f"保存测试记录失败: {str(e)}")
             db.rollback()
@@ -142,8 +164,22 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), curre
             "model": model.name,
             "output": result["output"],
             "evaluation": evaluation,
-            "record_id": test_record.id if test_record else None
+            "record_id": record_id
         }
+
+        if deferred_evaluator_id:
+            evaluation_id = evaluation_tasks.create(current_user.id, response_data["record_id"])
+            background_tasks.add_task(
+                run_evaluation_task,
+                evaluation_id=evaluation_id,
+                user_id=current_user.id,
+                evaluator_model_id=deferred_evaluator_id,
+                prompt=request.content,
+                response=result["output"],
+                record_id=response_data["record_id"]
+            )
+            response_data["evaluation_id"] = evaluation_id
+            response_data["evaluation_status"] = "pending"
         
         # 如果是ModelScope模型且包含思考内容，添加到响应中
         if "thinking" in result:
@@ -158,77 +194,158 @@ def test_prompt(request: TestPromptRequest, db: Session = Depends(get_db), curre
         logger.error(f"Test failed: {str(e)}")
         raise HTTPException(500, f"测试失败: {str(e)}")
 
+@router.get("/evaluations/{evaluation_id}")
+def get_evaluation(evaluation_id: str, current_user: User = Depends(get_current_user)):
+    """获取异步评估结果"""
+    task = evaluation_tasks.get(evaluation_id, current_user.id)
+    if not task:
+        raise HTTPException(404, "评估任务不存在或已过期")
+    return {
+        "evaluation_id": task["id"],
+        "record_id": task["record_id"],
+        "status": task["status"],
+        "evaluation": task["evaluation"],
+        "error": task["error"]
+    }
+
+# 列表可返回的字段；大文本字段在摘要模式下只取开头部分
+RECORD_LIST_COLUMNS = {
+    "id": TestRecord.id,
+    "model": LLMModel.name,
+    "template": PromptTemplate.name,
+    "prompt": TestRecord.prompt,
+    "response": TestRecord.response,
+    "evaluation": TestRecord.evaluation,
+    "created_at": TestRecord.created_at,
+}
+RECORD_CONTENT_HASHES = {
+    "prompt": TestRecord.prompt_hash,
+    "response": TestRecord.response_hash,
+}
+
 @router.get("/records")
-def list_test_records(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """获取测试记录列表"""
+def list_test_records(
+    model_id: Optional[int] = None,
+    template_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    fields: FieldParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """获取测试记录列表，传入limit或cursor时分页返回；fields、summary可减少返回的数据量"""
+    names, columns = fields.select(RECORD_LIST_COLUMNS, RECORD_CONTENT_HASHES)
     try:
         logger.info("获取测试记录列表")
-        records = db.query(TestRecord).filter_by(user_id=current_user.id, is_deleted=False).order_by(TestRecord.created_at.desc()).all()
-        logger.info(f"找到 {len(records)} 条测试记录")
-        
-        result = []
-        for record in records:
-            try:
-                model_name = record.model.name if record.model else None
-                template_name = record.template.name if record.template else None
-                
-                result.append({
-                    "id": record.id,
-                    "model": model_name,
-                    "template": template_name,
-                    "prompt": record.prompt,
-                    "response": record.response,
-                    "evaluation": record.evaluation,
-                    "created_at": record.created_at
-                })
-            except Exception as e:
-                logger.error(f"处理记录 {record.id} 时出错: {str(e)}")
-        
-        return result
+        # 只查询请求的字段，模型名、模板名通过外连接在同一条SQL中取得
+        query = db.query(*columns).filter(TestRecord.user_id == current_user.id, TestRecord.is_deleted == False)
+        if "model" in names:
+            query = query.outerjoin(TestRecord.model)
+        if "template" in names:
+            query = query.outerjoin(TestRecord.template)
+        query = apply_filters(query, TestRecord, page, model_id=model_id, template_id=template_id)
+        # 不分页时也按创建时间倒序返回（分页时由paginate按同样的顺序重新排序）
+        query = query.order_by(TestRecord.created_at.desc(), TestRecord.id.desc())
+        return paginate(query, TestRecord, page, lambda record: {name: getattr(record, name) for name in names})
     except Exception as e:
         logger.error(f"获取测试记录列表失败: {str(e)}")
         raise HTTPException(500, f"获取测试记录列表失败: {str(e)}")
 
-@router.get("/records/export_csv")
-def export_test_records_csv(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """导出测试记录为CSV（使用不会与路径参数冲突的路径）"""
-    records = db.query(TestRecord).filter_by(user_id=current_user.id, is_deleted=False).all()
-    
-    output = StringIO()
-    # 添加BOM头，使Excel能正确识别UTF-8编码的中文
-    output.write('\ufeff')
-    writer = csv.writer(output)
-    
-    # 写入表头
-    writer.writerow([
-        "ID", "模型", "模板", "提示词", "响应", "评估结果", "创建时间"
-    ])
+def _export_test_records(user_id: int, dates: DateRangeParams) -> StreamingResponse:
+    """流式导出测试记录为CSV，按批读取，内存占用与记录数无关"""
+    def build_query(db: Session):
+        # 只查询导出需要的列，模型名、模板名通过外连接在同一条SQL中取得
+        query = db.query(
+            TestRecord.id,
+            LLMModel.name.label("model_name"),
+            PromptTemplate.name.label("template_name"),
+            TestRecord.prompt,
+            TestRecord.response,
+            TestRecord.evaluation,
+            TestRecord.created_at
+        ).outerjoin(TestRecord.model).outerjoin(TestRecord.template).filter(
+            TestRecord.user_id == user_id, TestRecord.is_deleted == False
+        )
+        return apply_filters(query, TestRecord, dates).order_by(TestRecord.id)
     
-    # 写入数据
-    for record in records:
-        writer.writerow([
+    return stream_csv(
+        build_query,
+        ["ID", "模型", "模板", "提示词", "响应", "评估结果", "创建时间"],
+        lambda record: [
             record.id,
-            record.model.name if record.model else "",
-            record.template.name if record.template else "",
+            record.model_name or "",
+            record.template_name or "",
             record.prompt,
             record.response,
             json.dumps(record.evaluation, ensure_ascii=False) if record.evaluation else "",
             record.created_at.strftime("%Y-%m-%d %H:%M:%S") if record.created_at else ""
-        ])
-    
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
+        ],
+        filename=f"test_records_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
         media_type="text/csv; charset=utf-8-sig",
-        headers={"Content-Disposition": f"attachment; filename=test_records_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
+        bom=True,
+        # 归档记录早于主库中的记录，先输出
+        leading_rows=lambda: record_archive.iter_rows("test_records", user_id, dates, include_deleted=False)
     )
 
+@router.get("/records/export_csv")
+def export_test_records_csv(dates: DateRangeParams = Depends(), current_user: User = Depends(get_current_user)):
+    """导出测试记录为CSV（使用不会与路径参数冲突的路径）"""
+    return _export_test_records(current_user.id, dates)
+
+class RecordLookupRequest(BaseModel):
+    prompt: Optional[str] = None
+    prompt_hash: Optional[str] = None  # 提示词UTF-8编码的SHA-256
+    model_id: Optional[int] = None
+
+@router.post("/records/lookup")
+def lookup_test_records(request: RecordLookupRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """按提示词或其哈希查找是否运行过完全相同的提示词，返回最近的记录"""
+    if request.prompt is not None:
+        prompt_hash = content_hash(request.prompt)
+    elif request.prompt_hash:
+        prompt_hash = request.prompt_hash.strip().lower()
+    else:
+        raise HTTPException(400, "需要提供prompt或prompt_hash")
+
+    query = db.query(
+        TestRecord.id, TestRecord.model_id, LLMModel.name.label("model_name"), TestRecord.created_at
+    ).outerjoin(TestRecord.model).filter(
+        TestRecord.user_id == current_user.id,
+        TestRecord.prompt_hash == prompt_hash,
+        TestRecord.is_deleted == False
+    )
+    if request.model_id:
+        query = query.filter(TestRecord.model_id == request.model_id)
+    rows = query.order_by(TestRecord.created_at.desc(), TestRecord.id.desc()).limit(20).all()
+
+    return {
+        "prompt_hash": prompt_hash,
+        "found": bool(rows),
+        "records": [
+            {"id": row.id, "model_id": row.model_id, "model": row.model_name, "created_at": row.created_at}
+            for row in rows
+        ]
+    }
+
 @router.get("/records/{record_id}")
 def get_test_record(record_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """获取单个测试记录详情"""
-    record = db.query(TestRecord).filter_by(id=record_id, user_id=current_user.id, is_deleted=False).first()
+    record = db.query(TestRecord).options(*RECORD_NAME_OPTIONS).filter_by(id=record_id, user_id=current_user.id, is_deleted=False).first()
     if not record:
-        raise HTTPException(404, "记录不存在或无权访问")
+        # 不在主库中时查找归档记录
+        archived = record_archive.get("test_records", record_id, current_user.id)
+        if not archived or archived.is_deleted:
+            raise HTTPException(404, "记录不存在或无权访问")
+        return {
+            "id": archived.id,
+            "model": archived.model_name,
+            "template": archived.template_name,
+            "prompt": archived.prompt,
+            "prompt_hash": content_hash(archived.prompt),
+            "response": archived.response,
+            "evaluation": archived.evaluation,
+            "created_at": archived.created_at,
+            "archived": True
+        }
         
     model_name = record.model.name if record.model else None
     template_name = record.template.name if record.template else None
@@ -238,6 +355,7 @@ def get_test_record(record_id: int, db: Session = Depends(get_db), current_user:
         "model": model_name,
         "template": template_name,
         "prompt": record.prompt,
+        "prompt_hash": record.prompt_hash,
         "response": record.response,
         "evaluation": record.evaluation,
         "created_at": record.created_at
@@ -254,35 +372,6 @@ def delete_test_record(record_id: int, db: Session = Depends(get_db), current_us
     return {"message": "删除成功"}
 
 @router.get("/records/export_all")
-def export_all_test_records(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def export_all_test_records(dates: DateRangeParams = Depends(), current_user: User = Depends(get_current_user)):
     """导出所有测试记录为CSV（避免路由冲突）"""
-    records = db.query(TestRecord).filter_by(user_id=current_user.id, is_deleted=False).all()
-    
-    output = StringIO()
-    # 添加BOM头，使Excel能正确识别UTF-8编码的中文
-    output.write('\ufeff')
-    writer = csv.writer(output)
-    
-    # 写入表头
-    writer.writerow([
-        "ID", "模型", "模板", "提示词", "响应", "评估结果", "创建时间"
-    ])
-    
-    # 写入数据
-    for record in records:
-        writer.writerow([
-            record.id,
-            record.model.name if record.model else "",
-            record.template.name if record.template else "",
-            record.prompt,
-            record.response,
-            json.dumps(record.evaluation, ensure_ascii=False) if record.evaluation else "",
-            record.created_at.strftime("%Y-%m-%d %H:%M:%S") if record.created_at else ""
-        ])
-    
-    output.seek(0)
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv; charset=utf-8-sig",
-        headers={"Content-Disposition": f"attachment; filename=test_records_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"}
-    ) 
\ No newline at end of file
+    return _export_test_records(current_user.id, dates)
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models import User
+from app.services.metrics import metrics
+from app.config import AUTH_CACHE_ENABLED, AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES
+
+# 缓存的用户字段；这些字段或密码变化时缓存立即失效
+USER_FIELDS = ("id", "username", "display_name", "email", "role", "is_active", "created_at", "last_login_at")
+INVALIDATING_FIELDS = USER_FIELDS + ("password_hash",)
+
+
+class AuthCache:
+    """
+    认证缓存（进程内LRU + TTL）：已验证的token -> 载荷，用户ID -> 活跃用户的字段
+
+    命中时get_current_user不再解码JWT、不再查询users表。停用用户、修改角色或密码时
+    通过ORM事件立即失效；其他进程中的缓存最长在TTL后失效
+    """
+
+    def __init__(self, ttl: int = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES, enabled: bool = AUTH_CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._tokens: "OrderedDict[str, tuple]" = OrderedDict()
+        self._users: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, entries: OrderedDict, key, name: str):
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del entries[key]
+                entry = None
+            if entry is None:
+                metrics.incr(f"auth_cache.{name}.miss")
+                return None
+            entries.move_to_end(key)
+            metrics.incr(f"auth_cache.{name}.hit")
+            return entry[1]
+
+    def _set(self, entries: OrderedDict, key, value, expires_at: float):
+        with self._lock:
+            entries[key] = (expires_at, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def get_token(self, token: str) -> Optional[dict]:
+        """读取已验证的token载荷，过期或不存在返回None"""
+        if not self.enabled:
+            return None
+        return self._get(self._tokens, token, "token")
+
+    def set_token(self, token: str, payload: dict):
+        """缓存验证通过的token，有效期不超过token本身的过期时间"""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        if payload.get("exp"):
+            expires_at = min(expires_at, float(payload["exp"]))
+        self._set(self._tokens, token, payload, expires_at)
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """读取缓存的活跃用户，每次返回新的（未关联会话的）User对象"""
+        if not self.enabled:
+            return None
+        values = self._get(self._users, user_id, "user")
+        return User(**values) if values else None
+
+    def set_user(self, user: User):
+        """缓存活跃用户的字段"""
+        if not self.enabled:
+            return
+        values = {field: getattr(user, field) for field in USER_FIELDS}
+        self._set(self._users, user.id, values, time.time() + self.ttl)
+
+    def invalidate_user(self, user_id: int):
+        """删除用户及其token的缓存"""
+        with self._lock:
+            self._users.pop(user_id, None)
+            for token in [t for t, (_, payload) in self._tokens.items() if payload.get("user_id") == user_id]:
+                del self._tokens[token]
+        metrics.incr("auth_cache.invalidations")
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+
+    def stats(self) -> Dict:
+        """获取缓存统计，包括命中率"""
+        result = {"enabled": self.enabled, "ttl": self.ttl, "invalidations": metrics.get("auth_cache.invalidations")}
+        for name in ("token", "user"):
+            hit = metrics.get(f"auth_cache.{name}.hit")
+            miss = metrics.get(f"auth_cache.{name}.miss")
+            result[name] = {"hit": hit, "miss": miss, "hit_ratio": round(hit / (hit + miss), 4) if hit + miss else 0.0}
+        with self._lock:
+            result["entries"] = {"token": len(self._tokens), "user": len(self._users)}
+        return result
+
+
+auth_cache = AuthCache()
+
+
+def _invalidate(target: User):
+    """立即失效；提交后再失效一次，防止提交前其他请求把旧值重新放入缓存"""
+    auth_cache.invalidate_user(target.id)
+    session = inspect(target).session
+    if session is not None:
+        pending: Set[int] = session.info.setdefault("auth_cache_invalidated", set())
+        pending.add(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_changed_user(mapper, connection, target: User):
+    """停用用户、修改角色或密码等情况下失效"""
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in INVALIDATING_FIELDS):
+        _invalidate(target)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target: User):
+    _invalidate(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session: Session):
+    for user_id in session.info.pop("auth_cache_invalidated", ()):
+        auth_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_invalidated_users(session: Session, previous_transaction):
+    session.info.pop("auth_cache_invalidated", None)
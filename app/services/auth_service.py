@@ -1,6 +1,8 @@
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models import User
 from ..config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_EXPIRE_HOURS
@@ -80,3 +82,62 @@ class AuthService:
         """检查用户名是否可用"""
         existing_user = self.db.query(User).filter(User.username == username).first()
         return existing_user is None
+
+
+class AsyncAuthService:
+    """AuthService的异步版本，用于使用AsyncSession的async def路由"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # token的生成与验证不访问数据库，与同步版本共用实现
+    generate_token = AuthService.generate_token
+    verify_token = AuthService.verify_token
+
+    async def _first(self, *conditions) -> Optional[User]:
+        result = await self.db.execute(select(User).where(*conditions).limit(1))
+        return result.scalars().first()
+
+    async def authenticate_user(self, username: str, password: str) -> Optional[User]:
+        """验证用户凭据"""
+        user = await self._first(User.username == username, User.is_active == True)
+
+        if user and User.verify_password(password, user.password_hash):
+            # 更新最后登录时间
+            user.last_login_at = datetime.utcnow()
+            await self.db.commit()
+            return user
+        return None
+
+    async def create_user(self, username: str, password: str, display_name: str = None, email: str = None) -> User:
+        """创建新用户"""
+        # 检查用户名是否已存在
+        if await self._first(User.username == username):
+            raise ValueError("用户名已存在")
+
+        # 检查邮箱是否已存在（如果提供了邮箱）
+        if email and await self._first(User.email == email):
+            raise ValueError("邮箱已存在")
+
+        # 创建新用户
+        user = User(
+            username=username,
+            password_hash=User.hash_password(password),
+            display_name=display_name or username,
+            email=email or "",
+            role="user",
+            is_active=True
+        )
+
+        self.db.add(user)
+        await self.db.commit()
+        await self.db.refresh(user)
+        return user
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """根据ID获取用户"""
+        return await self._first(User.id == user_id, User.is_active == True)
+
+    async def check_username_available(self, username: str) -> bool:
+        """检查用户名是否可用"""
+        return await self._first(User.username == username) is None
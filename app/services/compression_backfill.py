@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import LargeBinary, literal, select, type_coerce
+
+from app.database import SessionLocal
+from app.models import ContentBlob
+from app.models.types import compress_text, decompress_text, is_compressed
+from app.services.metrics import metrics
+from app.config import TEXT_COMPRESSION_BACKFILL_BATCH
+
+logger = logging.getLogger(__name__)
+
+# 使用CompressedText存储的字段（测试记录、历史记录、提示词和响应的内容都在content_blobs中）
+COMPRESSED_COLUMNS = [
+    (ContentBlob, ("content",)),
+]
+
+
+class CompressionBackfill:
+    """
+    后台压缩已有数据：按主键分批读取原始存储值，把未压缩的大文本改写为压缩格式
+
+    新写入的数据由CompressedText直接压缩，这里只处理升级前写入的行；可以重复执行
+    """
+
+    def __init__(self, batch_size: int = TEXT_COMPRESSION_BACKFILL_BATCH, pause: float = 0.05):
+        self.batch_size = batch_size
+        self.pause = pause  # 每批之间的间隔，避免长时间占用写锁
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在后台线程中执行"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="compression-backfill", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，当前批次提交后退出"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run(self) -> int:
+        """压缩全部字段，返回改写的行数"""
+        total = 0
+        for model, columns in COMPRESSED_COLUMNS:
+            for column in columns:
+                if self._stop.is_set():
+                    return total
+                total += self._backfill_column(model, column)
+        logger.info(f"大文本字段压缩完成，共改写{total}行")
+        return total
+
+    def _backfill_column(self, model, column: str) -> int:
+        """按主键分批压缩一个字段"""
+        table = model.__table__
+        pk = list(table.primary_key.columns)[0]
+        # 以二进制读取原始存储值，绕过CompressedText的解压
+        raw = type_coerce(table.c[column], LargeBinary)
+        last_id, rewritten = None, 0
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                query = select(pk, raw).where(table.c[column].isnot(None))
+                if last_id is not None:
+                    query = query.where(pk > last_id)
+                rows = db.execute(query.order_by(pk).limit(self.batch_size)).all()
+                if not rows:
+                    return rewritten
+                last_id = rows[-1][0]
+                for row_id, value in rows:
+                    if is_compressed(value):
+                        continue
+                    packed = compress_text(decompress_text(value))
+                    if not is_compressed(packed):
+                        continue
+                    db.execute(
+                        table.update().where(pk == row_id).values({column: literal(packed, LargeBinary)})
+                    )
+                    rewritten += 1
+                db.commit()
+                metrics.incr("compression_backfill.rows", len(rows))
+            except Exception as e:
+                db.rollback()
+                logger.error(f"压缩{table.name}.{column}失败: {str(e)}")
+                return rewritten
+            finally:
+                db.close()
+            time.sleep(self.pause)
+        return rewritten
+
+
+compression_backfill = CompressionBackfill()
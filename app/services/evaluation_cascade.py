@@ -0,0 +1,174 @@
+import logging
+import re
+from typing import Dict, Iterable, List
+
+from app.models import LLMModel
+from app.services.evaluator import ResponseEvaluator
+from app.services.response_evaluator import ResponseEvaluator as HeuristicEvaluator
+from app.services.metrics import metrics
+from app.config import EVAL_CASCADE_ENABLED, EVAL_CASCADE_HEURISTIC_RULES, EVAL_CASCADE_MIN_CHARS, EVAL_CASCADE_LOW_SCORE
+
+logger = logging.getLogger(__name__)
+
+SCORE_KEYS = ["relevance", "accuracy", "completeness", "clarity"]
+
+# 规则名称与说明，按检查顺序排列
+RULE_MESSAGES = {
+    "empty": "回答为空",
+    "error": "回答是模型调用失败的错误信息",
+    "no_content": "回答只包含标点或符号",
+    "echo": "回答只是重复了问题",
+    "too_short": "回答内容过短",
+    "truncated": "回答被截断（代码块未闭合）",
+    "low_quality": "启发式质量分过低",
+}
+
+# 命中即可确定回答无效的规则，始终直接判定
+HARD_RULES = ("empty", "error", "no_content", "echo")
+# 启发式规则：对JSON、代码、数字等简短但正确的回答可能误判，
+# 默认只记录在cascade.flags中交给LLM评估，配置开启后才直接判定
+HEURISTIC_RULES = ("too_short", "truncated", "low_quality")
+
+
+class EvaluationCascade:
+    """
+    级联评估器：先执行本地启发式评分和规则检查，确定无效的回答（空、错误信息、只有符号、
+    重复问题）直接给出结果，其余情况调用LLM评估模型
+    """
+
+    def __init__(
+        self,
+        eval_model: LLMModel = None,
+        enabled: bool = None,
+        min_chars: int = None,
+        low_score: float = None,
+        heuristic_rules: Iterable[str] = None
+    ):
+        """初始化级联评估器
+
+        Args:
+            eval_model: 用于LLM评估的模型，默认使用配置文件中指定的模型
+            enabled: 是否启用级联，默认读取配置
+            min_chars: 有效字符数下限，默认读取配置
+            low_score: 启发式质量分阈值，默认读取配置
+            heuristic_rules: 直接判定的启发式规则，默认读取配置（不启用）
+        """
+        self.eval_model = eval_model
+        self.enabled = EVAL_CASCADE_ENABLED if enabled is None else enabled
+        self.min_chars = EVAL_CASCADE_MIN_CHARS if min_chars is None else min_chars
+        self.low_score = EVAL_CASCADE_LOW_SCORE if low_score is None else low_score
+        rules = EVAL_CASCADE_HEURISTIC_RULES if heuristic_rules is None else heuristic_rules
+        unknown = [r for r in rules if r not in HEURISTIC_RULES]
+        if unknown:
+            raise ValueError(f"不支持的级联评估规则: {', '.join(unknown)}，可选: {', '.join(HEURISTIC_RULES)}")
+        self.heuristic_rules = set(rules)
+        self.heuristic = HeuristicEvaluator()
+        self._judge = None
+
+    @property
+    def judge(self) -> ResponseEvaluator:
+        """LLM评估器，只在需要升级评估时才创建"""
+        if self._judge is None:
+            self._judge = ResponseEvaluator(self.eval_model)
+        return self._judge
+
+    def evaluate_response(self, prompt: str, response, criteria: List[Dict] = None) -> Dict:
+        """评估模型响应质量，返回格式与ResponseEvaluator.evaluate_response一致
+
+        Args:
+            prompt: 原始提示词
+            response: 模型响应，可以是字符串或包含output字段的字典
+            criteria: 评估标准，传递给LLM评估器
+
+        Returns:
+            Dict: 评估结果，cascade字段记录评估所在阶段
+        """
+        metrics.incr("eval_cascade.total")
+
+        if isinstance(response, dict):
+            text = response.get("output")
+            if response.get("error") and text:
+                text = f"调用失败: {text}"
+        else:
+            text = response
+        text = "" if text is None else str(text)
+
+        flags = []
+        if self.enabled:
+            quality = round(self.heuristic.evaluate(text).get("quality_score", 0.0), 2)
+            for rule in self._check_rules(prompt, text, quality):
+                if rule in HARD_RULES or rule in self.heuristic_rules:
+                    metrics.incr("eval_cascade.short_circuit")
+                    metrics.incr(f"eval_cascade.rule.{rule}")
+                    logger.info(f"级联评估命中规则 {rule}，跳过LLM评估")
+                    return self._build_evaluation(rule, quality)
+                flags.append(rule)
+        else:
+            quality = None
+
+        metrics.incr("eval_cascade.judge_calls")
+        evaluation = self.judge.evaluate_response(prompt, response, criteria)
+        if isinstance(evaluation, dict):
+            evaluation["cascade"] = {"stage": "judge", "heuristic_score": quality, "flags": flags}
+        return evaluation
+
+    def _check_rules(self, prompt: str, text: str, quality: float) -> List[str]:
+        """执行规则检查，按RULE_MESSAGES的顺序返回命中的规则名称"""
+        stripped = text.strip()
+        if not stripped:
+            return ["empty"]
+        if re.match(r"^(调用失败|评估失败|API调用失败)[:：]", stripped):
+            return ["error"]
+
+        visible = re.sub(r"\s", "", stripped)
+        if not any(c.isalnum() for c in visible):
+            return ["no_content"]
+        if prompt and re.sub(r"\s", "", prompt) == visible:
+            return ["echo"]
+
+        hits = []
+        if len(visible) < self.min_chars:
+            hits.append("too_short")
+        if stripped.count("```") % 2 == 1:
+            hits.append("truncated")
+        if quality < self.low_score:
+            hits.append("low_quality")
+        return hits
+
+    def _build_evaluation(self, rule: str, quality: float) -> Dict:
+        """根据命中的规则构造评估结果"""
+        reason = RULE_MESSAGES[rule]
+        if rule in ("low_quality", "truncated"):
+            # 启发式质量分映射到1-10分
+            base = max(1, min(10, round(quality * 10)))
+            scores = {key: base for key in SCORE_KEYS}
+            if rule == "truncated":
+                scores = {key: min(base, 5) for key in SCORE_KEYS}
+                scores["completeness"] = 2
+        else:
+            scores = {key: 1 for key in SCORE_KEYS}
+
+        return {
+            "scores": scores,
+            "reasons": {key: reason for key in SCORE_KEYS},
+            "suggestions": f"{reason}，已跳过LLM评估，请检查模型输出或调整提示词",
+            "cascade": {"stage": "heuristic", "rule": rule, "heuristic_score": quality}
+        }
+
+
+def get_cascade_stats() -> Dict:
+    """获取级联评估统计，包括节省的LLM评估调用次数"""
+    total = metrics.get("eval_cascade.total")
+    saved = metrics.get("eval_cascade.short_circuit")
+    rules = {
+        name[len("eval_cascade.rule."):]: count
+        for name, count in metrics.snapshot("eval_cascade.rule.").items()
+    }
+    return {
+        "enabled": EVAL_CASCADE_ENABLED,
+        "total": total,
+        "judge_calls": metrics.get("eval_cascade.judge_calls"),
+        "judge_calls_saved": saved,
+        "saved_ratio": round(saved / total, 4) if total else 0.0,
+        "rules": rules
+    }
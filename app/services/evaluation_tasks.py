@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.database import SessionLocal
+from app.models import LLMModel, TestRecord
+from app.services.evaluation_cascade import EvaluationCascade
+from app.services.record_writer import record_writer
+from app.websocket import manager
+from app.config import ASYNC_EVAL_RESULT_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationTaskRegistry:
+    """
+    异步评估任务登记表：保存待完成/已完成的评估结果，供按ID查询
+    """
+
+    def __init__(self, ttl: int = ASYNC_EVAL_RESULT_TTL):
+        self.ttl = ttl
+        self._tasks: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_id: int, record_id: Optional[int] = None) -> str:
+        """登记一个新的评估任务，返回评估ID"""
+        evaluation_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge_expired()
+            self._tasks[evaluation_id] = {
+                "id": evaluation_id,
+                "user_id": user_id,
+                "record_id": record_id,
+                "status": "pending",
+                "evaluation": None,
+                "error": None,
+                "created_at": time.time(),
+                "finished_at": None
+            }
+        return evaluation_id
+
+    def get(self, evaluation_id: str, user_id: int) -> Optional[Dict]:
+        """获取评估任务，只返回属于该用户的任务"""
+        with self._lock:
+            task = self._tasks.get(evaluation_id)
+            if not task or task["user_id"] != user_id:
+                return None
+            return dict(task)
+
+    def finish(self, evaluation_id: str, evaluation: Dict = None, error: str = None):
+        """记录评估结果"""
+        with self._lock:
+            task = self._tasks.get(evaluation_id)
+            if not task:
+                return
+            task["status"] = "failed" if error else "completed"
+            task["evaluation"] = evaluation
+            task["error"] = error
+            task["finished_at"] = time.time()
+
+    def _purge_expired(self):
+        """清理过期的任务，调用方需持有锁"""
+        deadline = time.time() - self.ttl
+        for key in [k for k, t in self._tasks.items() if t["created_at"] < deadline]:
+            del self._tasks[key]
+
+
+evaluation_tasks = EvaluationTaskRegistry()
+
+
+def _evaluate_and_save(evaluator_model_id: int, prompt: str, response: str, record_id: Optional[int]) -> Dict:
+    """在线程池中执行评估并回写测试记录"""
+    db = SessionLocal()
+    try:
+        evaluator_model = db.query(LLMModel).filter_by(id=evaluator_model_id, is_deleted=False).first()
+        if not evaluator_model:
+            raise ValueError("评估模型不存在")
+
+        evaluation = EvaluationCascade(evaluator_model).evaluate_response(prompt=prompt, response=response)
+
+        if record_id:
+            # 记录可能还在延迟写入的缓冲区中，先提交再回写评估结果
+            if record_writer.enabled:
+                record_writer.flush()
+            record = db.query(TestRecord).filter_by(id=record_id).first()
+            if record:
+                record.evaluation = evaluation if isinstance(evaluation, dict) else None
+                db.commit()
+        return evaluation
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_evaluation_task(
+    evaluation_id: str,
+    user_id: int,
+    evaluator_model_id: int,
+    prompt: str,
+    response: str,
+    record_id: Optional[int] = None
+):
+    """
+    后台执行评估，完成后写入登记表并通过WebSocket推送给该用户
+    """
+    try:
+        evaluation = await run_in_threadpool(_evaluate_and_save, evaluator_model_id, prompt, response, record_id)
+        evaluation_tasks.finish(evaluation_id, evaluation=evaluation)
+        logger.info(f"异步评估完成: {evaluation_id}")
+    except Exception as e:
+        logger.error(f"异步评估失败: {evaluation_id}, {str(e)}")
+        evaluation_tasks.finish(evaluation_id, error=f"评估过程出错: {str(e)}")
+
+    task = evaluation_tasks.get(evaluation_id, user_id)
+    if not task:
+        return
+    try:
+        await manager.send_json_to_user(user_id, {
+            "type": "evaluation_completed" if task["status"] == "completed" else "evaluation_failed",
+            "data": {
+                "evaluation_id": evaluation_id,
+                "record_id": task["record_id"],
+                "evaluation": task["evaluation"],
+                "error": task["error"]
+            }
+        })
+    except Exception as e:
+        logger.error(f"推送评估结果失败: {str(e)}")
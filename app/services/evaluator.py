@@ -20,7 +20,7 @@ class ResponseEvaluator:
             self.eval_model = LLMModel(
                 provider=DEFAULT_PROVIDER,
                 api_key=DEFAULT_API_KEY,
-                model_name=DEFAULT_MODEL_NAME
+                name=DEFAULT_MODEL_NAME
             )
         self._validate_evaluator()
     
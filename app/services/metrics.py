@@ -0,0 +1,37 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class Metrics:
+    """
+    进程内计数器，用于统计缓存命中、评估节省次数等运行指标
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+        """增加计数"""
+        with self._lock:
+            self._counters[name] += value
+
+    def get(self, name: str) -> int:
+        """获取单个计数"""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, int]:
+        """获取计数快照，可按前缀过滤"""
+        with self._lock:
+            return {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+
+    def reset(self, prefix: str = ""):
+        """清零计数，可按前缀过滤"""
+        with self._lock:
+            for key in [k for k in self._counters if k.startswith(prefix)]:
+                del self._counters[key]
+
+
+metrics = Metrics()
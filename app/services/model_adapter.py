@@ -6,17 +6,35 @@ from volcenginesdkarkruntime import Ark
 import re
 import json
 import logging
+import threading
+from typing import Optional
+
+from app.services.metrics import metrics
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+
+class RequestCancelled(Exception):
+    """模型调用已被取消（例如客户端断开连接）"""
+
+
 class ModelAdapter:
+    # guard只检查回复开头的这些字符，之后不再调用
+    GUARD_WINDOW = 512
+
     def __init__(self, provider: str, api_key: str, base_url: str = ""):
         self.provider = provider
         self.api_key = api_key.strip() if api_key else ""
         self.base_url = base_url.strip() if base_url else ""
         self._validate_api_key()
 
+    def _check_cancelled(self, cancel_event: Optional[threading.Event]):
+        """本次调用已取消时抛出RequestCancelled"""
+        if cancel_event is not None and cancel_event.is_set():
+            metrics.incr("model_adapter.cancelled")
+            raise RequestCancelled(f"{self.provider}模型调用已取消")
+
     @classmethod
     def get_model_types(cls):
         """返回所有支持的模型类型列表"""
@@ -60,20 +78,40 @@ class ModelAdapter:
         except ValueError:
             return False
 
-    def send_prompt(self, prompt: str, variables: dict = None):
+    def send_prompt(
+        self,
+        prompt: str,
+        variables: dict = None,
+        guard=None,
+        stream: bool = False,
+        cancel_event: Optional[threading.Event] = None
+    ):
+        """
+        发送提示词并返回完整回复
+
+        stream为True时以流式方式接收回复（仅OpenAI兼容接口和Anthropic支持，其余提供商忽略），
+        生成过程中可以中止：
+        - guard为可选的输出检查函数，接收回复开头已生成的文本（最多GUARD_WINDOW个字符），返回True时
+          立即中止请求，返回结果带有aborted标记及已生成的部分内容
+        - cancel_event为本次调用的取消标记，被设置后进行中的请求在下一个分块时中止并抛出RequestCancelled
+        非流式调用忽略guard，cancel_event只在发出请求前检查
+        """
         # 替换变量
         if variables:
             for var_name, var_value in variables.items():
                 prompt = prompt.replace("{{" + var_name + "}}", str(var_value))
 
+        self._check_cancelled(cancel_event)
+
+        streaming = {"stream": stream, "guard": guard, "cancel_event": cancel_event}
         if self.provider == "openai":
-            return self._call_openai(prompt, variables)
+            return self._call_openai(prompt, variables, **streaming)
         elif self.provider == "anthropic":
-            return self._call_anthropic(prompt, variables)
+            return self._call_anthropic(prompt, variables, **streaming)
         elif self.provider == "deepseek":
-            return self._call_deepseek(prompt, variables)
+            return self._call_deepseek(prompt, variables, **streaming)
         elif self.provider == "qwen":
-            return self._call_qwen(prompt, variables)
+            return self._call_qwen(prompt, variables, **streaming)
         elif self.provider == "doubao":
             return self._call_doubao(prompt, variables)
         elif self.provider == "chatglm":
@@ -91,34 +129,100 @@ class ModelAdapter:
         else:
             raise NotImplementedError(f"不支持的模型类型: {self.provider}")
 
-    def _call_openai(self, prompt, variables):
+    def _sampling_params(self, variables):
+        """从variables中提取采样参数（目前支持temperature），未设置时使用模型默认值"""
+        params = {}
+        if variables and variables.get("temperature") is not None:
+            params["temperature"] = float(variables["temperature"])
+        return params
+
+    def _create_chat_completion(self, client, stream=False, guard=None, cancel_event=None, **params):
+        """
+        调用OpenAI兼容的chat接口，返回(内容, 是否被guard中止)
+
+        流式调用时拼接完整回复，每收到一个分块检查一次取消标记和guard，已取消时关闭HTTP流并抛出
+        RequestCancelled，guard返回True时关闭HTTP流并返回已生成的部分内容
+        """
+        if not stream:
+            response = client.chat.completions.create(stream=False, **params)
+            return response.choices[0].message.content, False
+
+        response_stream = client.chat.completions.create(stream=True, **params)
+        parts = []
+        head = ""
+        aborted = False
+        try:
+            for chunk in response_stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info(f"中止进行中的{self.provider}流式请求")
+                    metrics.incr("model_adapter.aborted_streams")
+                    break
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    if guard and len(head) < self.GUARD_WINDOW:
+                        head += chunk.choices[0].delta.content
+                        if guard(head):
+                            aborted = True
+                            metrics.incr("model_adapter.guard_aborts")
+                            break
+        finally:
+            response_stream.close()
+        self._check_cancelled(cancel_event)
+        return "".join(parts), aborted
+
+    def _call_openai(self, prompt, variables, **streaming):
         if not self.api_key:
             raise ValueError("未配置OpenAI API密钥")
         # 默认模型为gpt-4，可以通过variables传入自定义模型
         model = variables.get("model", "gpt-4") if variables else "gpt-4"
         logger.info(f"Calling OpenAI with model: {model}")
         client = openai.OpenAI(api_key=self.api_key)
-        response = client.chat.completions.create(
+        content, aborted = self._create_chat_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
-            stream=False
+            **self._sampling_params(variables),
+            **streaming
         )
-        return {"model": "openai", "output": response.choices[0].message.content}
+        return {"model": "openai", "output": content, "aborted": aborted}
 
-    def _call_anthropic(self, prompt, variables):
+    def _call_anthropic(self, prompt, variables, stream=False, guard=None, cancel_event=None):
         if not self.api_key:
             raise ValueError("未配置Anthropic API密钥")
         # 默认模型为claude-3-opus-20240229，可以通过variables传入自定义模型
         model = variables.get("model", "claude-3-opus-20240229") if variables else "claude-3-opus-20240229"
         client = anthropic.Anthropic(api_key=self.api_key)
-        response = client.messages.create(
+        params = dict(
             model=model,
             max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **self._sampling_params(variables)
         )
-        return {"model": "anthropic", "output": response.content[0].text if hasattr(response.content[0], 'text') else response.content}
+        if not stream:
+            response = client.messages.create(**params)
+            return {"model": "anthropic", "output": response.content[0].text if hasattr(response.content[0], 'text') else response.content}
 
-    def _call_deepseek(self, prompt, variables):
+        parts = []
+        head = ""
+        aborted = False
+        # 流式接收回复，已取消或guard要求中止时退出上下文即关闭HTTP流
+        with client.messages.stream(**params) as response_stream:
+            for text in response_stream.text_stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    logger.info("中止进行中的anthropic流式请求")
+                    metrics.incr("model_adapter.aborted_streams")
+                    break
+                parts.append(text)
+                if guard and len(head) < self.GUARD_WINDOW:
+                    head += text
+                    if guard(head):
+                        aborted = True
+                        metrics.incr("model_adapter.guard_aborts")
+                        break
+        self._check_cancelled(cancel_event)
+        return {"model": "anthropic", "output": "".join(parts), "aborted": aborted}
+
+    def _call_deepseek(self, prompt, variables, **streaming):
         if not self.api_key:
             raise ValueError("未配置Deepseek API密钥")
         # 默认模型为deepseek-chat，可以通过variables传入自定义模型
@@ -127,35 +231,39 @@ class ModelAdapter:
         logger.info(f"Calling Deepseek with model: {model}, base_url: {base_url}")
         try:
             client = openai.OpenAI(api_key=self.api_key, base_url=base_url)
-            response = client.chat.completions.create(
+            content, aborted = self._create_chat_completion(
+                client,
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
-                stream=False
+                **self._sampling_params(variables),
+                **streaming
             )
-            # 获取响应内容
-            content = response.choices[0].message.content
             # 预处理响应内容，移除可能导致格式错误的字符
             content = content.strip()
             content = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', content)  # 移除控制字符
-            return {"model": "deepseek", "output": content}
+            return {"model": "deepseek", "output": content, "aborted": aborted}
+        except RequestCancelled:
+            raise
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Deepseek API调用失败: {error_msg}")
             return {"model": "deepseek", "output": f"调用失败: {error_msg}", "error": True}
 
-    def _call_qwen(self, prompt, variables):
+    def _call_qwen(self, prompt, variables, **streaming):
         if not self.api_key:
             raise ValueError("未配置Qwen API密钥")
         # 默认模型为qwen-plus，可以通过variables传入自定义模型
         model = variables.get("model", "qwen-plus") if variables else "qwen-plus"
         logger.info(f"Calling Qwen with model: {model}")
         client = openai.OpenAI(api_key=self.api_key, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
-        response = client.chat.completions.create(
+        content, aborted = self._create_chat_completion(
+            client,
             model=model,
             messages=[{"role": "user", "content": prompt}],
-            stream=False
+            **self._sampling_params(variables),
+            **streaming
         )
-        return {"model": "qwen", "output": response.choices[0].message.content}
+        return {"model": "qwen", "output": content, "aborted": aborted}
 
     def _call_modelscope(self, prompt, variables):
         """调用ModelScope API"""
@@ -211,6 +319,7 @@ class ModelAdapter:
                     "enable_thinking": False  # 非流式调用时必须设置为false
                 }
             }
+            api_params.update(self._sampling_params(variables))
             
             # 发送请求
             response = client.chat.completions.create(**api_params)
@@ -284,7 +393,8 @@ class ModelAdapter:
         ark_client = Ark(api_key=self.api_key)
         response = ark_client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            **self._sampling_params(variables)
         )
         return {"model": "doubao", "output": response.choices[0].message.content}
 
@@ -308,7 +418,7 @@ class ModelAdapter:
         
         data = {
             "prompt": prompt,
-            "temperature": 0.7,
+            "temperature": self._sampling_params(variables).get("temperature", 0.7),
             "top_p": 0.7,
             "request_id": f"{model}_" + str(variables.get("request_id", "") if variables else "")
         }
@@ -344,7 +454,7 @@ class ModelAdapter:
         
         data = {
             "prompt": prompt,
-            "temperature": 0.7,
+            "temperature": self._sampling_params(variables).get("temperature", 0.7),
             "top_p": 0.7
         }
         
@@ -389,7 +499,7 @@ class ModelAdapter:
                 
                 data = {
                     "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7,
+                    "temperature": self._sampling_params(variables).get("temperature", 0.7),
                     "top_p": 0.7
                 }
                 
@@ -462,7 +572,7 @@ class ModelAdapter:
                 "parameter": {
                     "chat": {
                         "domain": model_domain,
-                        "temperature": 0.7,
+                        "temperature": self._sampling_params(variables).get("temperature", 0.7),
                         "top_k": 4
                     }
                 },
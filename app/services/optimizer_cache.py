@@ -0,0 +1,64 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.services.metrics import metrics
+from app.config import OPTIMIZER_CACHE_ENABLED, OPTIMIZER_CACHE_TTL, OPTIMIZER_CACHE_MAX_ENTRIES
+
+
+class StageCache:
+    """
+    提示词优化阶段结果缓存（进程内LRU + TTL）
+    """
+
+    def __init__(self, ttl: int = OPTIMIZER_CACHE_TTL, max_entries: int = OPTIMIZER_CACHE_MAX_ENTRIES, enabled: bool = OPTIMIZER_CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(stage: str, *parts: Any) -> str:
+        """根据阶段名称和输入生成缓存键"""
+        raw = json.dumps([stage, *parts], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，过期或不存在返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                metrics.incr("optimizer_cache.miss")
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                metrics.incr("optimizer_cache.miss")
+                return None
+            self._entries.move_to_end(key)
+            metrics.incr("optimizer_cache.hit")
+            return value
+
+    def set(self, key: str, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+
+stage_cache = StageCache()
@@ -1,10 +1,17 @@
 import asyncio
 import json
 import re
-from typing import AsyncGenerator, Dict, Any, Optional
+import threading
+from typing import AsyncGenerator, Dict, Any, List, Optional, Tuple
 from ..models import LLMModel
 from .model_adapter import ModelAdapter
-from ..config import DEFAULT_API_KEY, DEFAULT_PROVIDER, DEFAULT_MODEL_NAME
+from .optimizer_cache import stage_cache
+from .metrics import metrics
+from ..concurrency import run_blocking
+from ..config import (
+    DEFAULT_API_KEY, DEFAULT_PROVIDER, DEFAULT_MODEL_NAME,
+    OPTIMIZER_MAX_CONCURRENCY, OPTIMIZER_MAX_CANDIDATES, OPTIMIZER_MAX_REFINE_ROUNDS
+)
 
 class PromptOptimizer:
     def __init__(self, api_key: str = None, model: str = None, llm_model: LLMModel = None):
@@ -33,6 +40,11 @@ class PromptOptimizer:
             )
         else:
             self.adapter = None
+        
+        # 本次运行中命中缓存的阶段
+        self._cache_hits = set()
+        # 本实例累计消耗的估算token数
+        self.tokens_used = 0
     
     async def optimize_prompt_stream(
         self,
@@ -41,10 +53,17 @@ class PromptOptimizer:
         enable_deep_reasoning: bool = True,
         chat_model: str = None,
         language: str = "zh-CN",
-        optimization_type: str = None
+        optimization_type: str = None,
+        use_cache: bool = True
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         流式优化提示词
+
+        事件顺序：deep-reasoning-start / deep-reasoning / deep-reasoning-end（启用深度推理时）、
+        optimize-start / message / optimize-end、evaluate-start / evaluate / evaluate-end、done。
+        评估阶段只依赖原始提示词和优化要求，因此在开始时即并发执行，结果缓存到optimize-end之后再输出。
+        各阶段结果按输入、模型和语言缓存，use_cache为False时跳过缓存读取；命中缓存的阶段不加延迟直接输出，
+        对应的*-end事件带有cached标记。
         """
         if not self.adapter:
             yield {"type": "error", "message": "未配置模型API密钥"}
@@ -57,52 +76,370 @@ class PromptOptimizer:
         else:
             model = chat_model or self.model_name
         
+        self._cache_hits = set()
+        
+        # 评估阶段不依赖前两个阶段的输出，提前启动与其并发执行
+        evaluation_task = asyncio.ensure_future(
+            self._evaluate_optimization(prompt, requirements, model, language, use_cache=use_cache)
+        )
+        
         try:
             # 第一阶段：深度推理（如果启用）
             deep_reasoning_content = ""
             if enable_deep_reasoning:
                 yield {"type": "deep-reasoning-start"}
                 
-                reasoning_content = await self._deep_reasoning(prompt, requirements, model, language)
+                reasoning_content = await self._deep_reasoning(prompt, requirements, model, language, use_cache=use_cache)
                 deep_reasoning_content = reasoning_content
                 
                 # 模拟流式输出，将结果分成小块发送
-                chunks = self._split_text_into_chunks(reasoning_content, 20)  # 每块约20个字符
-                for chunk in chunks:
+                async for chunk in self._stream_chunks(reasoning_content, "deep_reasoning"):
                     yield {"type": "deep-reasoning", "message": chunk}
-                    await asyncio.sleep(0.01)  # 小延迟以模拟流式传输
                 
-                yield {"type": "deep-reasoning-end"}
+                yield {"type": "deep-reasoning-end", "cached": "deep_reasoning" in self._cache_hits}
             
             # 第二阶段：生成优化后的提示词
             yield {"type": "optimize-start"}
             
-            optimized_content = await self._optimize_prompt(prompt, requirements, deep_reasoning_content, model, language, optimization_type)
+            optimized_content = await self._optimize_prompt(prompt, requirements, deep_reasoning_content, model, language, optimization_type, use_cache=use_cache)
             
             # 模拟流式输出
-            chunks = self._split_text_into_chunks(optimized_content, 20)
-            for chunk in chunks:
+            async for chunk in self._stream_chunks(optimized_content, "optimize"):
                 yield {"type": "message", "message": chunk}
-                await asyncio.sleep(0.01)
             
-            yield {"type": "optimize-end"}
+            yield {"type": "optimize-end", "cached": "optimize" in self._cache_hits}
             
             # 第三阶段：评估优化结果
             yield {"type": "evaluate-start"}
             
-            evaluation_content = await self._evaluate_optimization(prompt, requirements, model, language)
+            evaluation_content = await evaluation_task
             
             # 模拟流式输出
-            chunks = self._split_text_into_chunks(evaluation_content, 20)
-            for chunk in chunks:
+            async for chunk in self._stream_chunks(evaluation_content, "evaluate"):
                 yield {"type": "evaluate", "message": chunk}
-                await asyncio.sleep(0.01)
             
-            yield {"type": "evaluate-end"}
+            yield {"type": "evaluate-end", "cached": "evaluate" in self._cache_hits}
+            yield {"type": "done", "done": True}
+            
+        except Exception as e:
+            yield {"type": "error", "message": f"优化过程中发生错误: {str(e)}"}
+        finally:
+            # 出错或客户端提前结束时，不再等待评估结果
+            if not evaluation_task.done():
+                evaluation_task.cancel()
+    
+    async def optimize_prompt_candidates_stream(
+        self,
+        prompt: str,
+        requirements: str = "",
+        candidates: int = 3,
+        temperatures: Optional[List[float]] = None,
+        vary_temperature: bool = True,
+        enable_deep_reasoning: bool = True,
+        chat_model: str = None,
+        language: str = "zh-CN",
+        optimization_type: str = None,
+        use_cache: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        多候选流式优化：并发生成多个优化候选并逐个评分，最后按分数排序输出
+
+        事件顺序：deep-reasoning-*（启用深度推理时）、candidates-start、candidate（按完成顺序，每个候选一条）、
+        ranking（按分数从高到低，第一个为最优候选）、candidates-end、done。
+        未指定temperatures且vary_temperature为True时，候选温度在0.3到1.0之间均匀分布。
+        生成和评分的并发数受OPTIMIZER_MAX_CONCURRENCY限制。
+        """
+        if not self.adapter:
+            yield {"type": "error", "message": "未配置模型API密钥"}
+            return
+        
+        model = self.llm_model.name if self.llm_model else (chat_model or self.model_name)
+        count = max(1, min(candidates, OPTIMIZER_MAX_CANDIDATES))
+        if temperatures:
+            temperatures = [temperatures[i % len(temperatures)] for i in range(count)]
+        elif vary_temperature and count > 1:
+            temperatures = [round(0.3 + 0.7 * i / (count - 1), 2) for i in range(count)]
+        else:
+            temperatures = [None] * count
+        
+        self._cache_hits = set()
+        tasks = []
+        
+        try:
+            # 深度推理只执行一次，所有候选共用
+            deep_reasoning_content = ""
+            if enable_deep_reasoning:
+                yield {"type": "deep-reasoning-start"}
+                deep_reasoning_content = await self._deep_reasoning(prompt, requirements, model, language, use_cache=use_cache)
+                async for chunk in self._stream_chunks(deep_reasoning_content, "deep_reasoning"):
+                    yield {"type": "deep-reasoning", "message": chunk}
+                yield {"type": "deep-reasoning-end", "cached": "deep_reasoning" in self._cache_hits}
+            
+            yield {"type": "candidates-start", "count": count, "temperatures": temperatures}
+            
+            semaphore = asyncio.Semaphore(OPTIMIZER_MAX_CONCURRENCY)
+            
+            tasks = [
+                asyncio.ensure_future(self._build_candidate(
+                    semaphore, prompt, requirements, deep_reasoning_content, model, language, optimization_type,
+                    index=i, temperature=t
+                ))
+                for i, t in enumerate(temperatures)
+            ]
+            results = []
+            for future in asyncio.as_completed(tasks):
+                candidate = await future
+                results.append(candidate)
+                yield {"type": "candidate", **candidate}
+            
+            ranking = sorted(results, key=lambda c: (c["score"] is not None, c["score"] or 0), reverse=True)
+            yield {"type": "ranking", "candidates": ranking, "best": ranking[0] if ranking else None}
+            yield {"type": "candidates-end"}
             yield {"type": "done", "done": True}
             
         except Exception as e:
             yield {"type": "error", "message": f"优化过程中发生错误: {str(e)}"}
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def refine_prompt_stream(
+        self,
+        prompt: str,
+        requirements: str = "",
+        max_rounds: int = 3,
+        beam_width: int = 2,
+        patience: int = 1,
+        min_improvement: float = 0.2,
+        target_score: float = 9.5,
+        token_budget: Optional[int] = None,
+        enable_deep_reasoning: bool = True,
+        chat_model: str = None,
+        language: str = "zh-CN",
+        optimization_type: str = None,
+        use_cache: bool = True
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        迭代优化：每轮把上一轮候选及其评估反馈送入下一轮优化，保留分数最高的beam_width个候选
+
+        每个候选只扩展一次：后续轮次只从上一轮新进入beam的候选出发，已扩展过的候选不再重复生成。
+        停止条件：达到最大轮数（max_rounds）、最高分达到target_score、最高分连续patience轮提升不足min_improvement（plateau），
+        上一轮没有新候选进入beam、无可扩展的候选（converged），或估算token消耗超过token_budget（budget）。
+        事件顺序：refine-start、deep-reasoning-*（启用深度推理时）、每轮round-start / candidate / round-end、refine-end、done。
+        """
+        if not self.adapter:
+            yield {"type": "error", "message": "未配置模型API密钥"}
+            return
+        
+        model = self.llm_model.name if self.llm_model else (chat_model or self.model_name)
+        max_rounds = max(1, min(max_rounds, OPTIMIZER_MAX_REFINE_ROUNDS))
+        beam_width = max(1, min(beam_width, OPTIMIZER_MAX_CANDIDATES))
+        
+        self._cache_hits = set()
+        self.tokens_used = 0
+        tasks = []
+        
+        try:
+            yield {"type": "refine-start", "maxRounds": max_rounds, "beamWidth": beam_width, "tokenBudget": token_budget}
+            
+            # 深度推理只在第一轮之前执行一次
+            deep_reasoning_content = ""
+            if enable_deep_reasoning:
+                yield {"type": "deep-reasoning-start"}
+                deep_reasoning_content = await self._deep_reasoning(prompt, requirements, model, language, use_cache=use_cache)
+                async for chunk in self._stream_chunks(deep_reasoning_content, "deep_reasoning"):
+                    yield {"type": "deep-reasoning", "message": chunk}
+                yield {"type": "deep-reasoning-end", "cached": "deep_reasoning" in self._cache_hits}
+            
+            semaphore = asyncio.Semaphore(OPTIMIZER_MAX_CONCURRENCY)
+            beam: List[Dict[str, Any]] = []
+            expanded = set()  # 已扩展过的候选：(轮次, 序号)
+            best_score = None
+            stale_rounds = 0
+            stop_reason = "max_rounds"
+            rounds_run = 0
+            
+            for round_index in range(1, max_rounds + 1):
+                if token_budget and self.tokens_used >= token_budget:
+                    stop_reason = "budget"
+                    break
+                
+                # 第一轮从原始提示词出发，之后每个新进入beam的候选携带自己的评估反馈各生成一个新候选；
+                # 已扩展过的候选反馈相同，重复扩展只会浪费调用
+                parents = [c for c in beam if (c["round"], c["index"]) not in expanded] if beam else [None]
+                if not parents:
+                    stop_reason = "converged"
+                    break
+                expanded.update((c["round"], c["index"]) for c in parents if c)
+                
+                rounds_run = round_index
+                yield {"type": "round-start", "round": round_index}
+                
+                tasks = [
+                    asyncio.ensure_future(self._build_candidate(
+                        semaphore, prompt, requirements, deep_reasoning_content, model, language, optimization_type,
+                        index=i, feedback=self._format_feedback(parent, language) if parent else None,
+                        use_cache=use_cache and round_index == 1
+                    ))
+                    for i, parent in enumerate(parents)
+                ]
+                round_candidates = []
+                for future in asyncio.as_completed(tasks):
+                    candidate = await future
+                    candidate["round"] = round_index
+                    round_candidates.append(candidate)
+                    yield {"type": "candidate", **candidate}
+                
+                # 合并旧beam与新候选，保留分数最高的若干个
+                beam = sorted(
+                    beam + round_candidates,
+                    key=lambda c: (c["score"] is not None, c["score"] or 0),
+                    reverse=True
+                )[:beam_width]
+                round_best = beam[0]["score"] if beam else None
+                
+                improved = round_best is not None and (best_score is None or round_best - best_score >= min_improvement)
+                if round_best is not None and (best_score is None or round_best > best_score):
+                    best_score = round_best
+                stale_rounds = 0 if improved else stale_rounds + 1
+                
+                yield {
+                    "type": "round-end",
+                    "round": round_index,
+                    "bestScore": best_score,
+                    "beam": [{"round": c["round"], "index": c["index"], "score": c["score"]} for c in beam],
+                    "tokensUsed": self.tokens_used
+                }
+                
+                if best_score is not None and best_score >= target_score:
+                    stop_reason = "target"
+                    break
+                if round_index > 1 and stale_rounds >= patience:
+                    stop_reason = "plateau"
+                    break
+                if token_budget and self.tokens_used >= token_budget:
+                    stop_reason = "budget"
+                    break
+            
+            yield {
+                "type": "refine-end",
+                "reason": stop_reason,
+                "rounds": rounds_run,
+                "best": beam[0] if beam else None,
+                "beam": beam,
+                "tokensUsed": self.tokens_used
+            }
+            yield {"type": "done", "done": True}
+            
+        except Exception as e:
+            yield {"type": "error", "message": f"优化过程中发生错误: {str(e)}"}
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _build_candidate(
+        self, semaphore: asyncio.Semaphore, prompt: str, requirements: str, reasoning: str, model: str, language: str,
+        optimization_type: str = None, index: int = 0, temperature: float = None, feedback: str = None,
+        use_cache: bool = False
+    ) -> Dict[str, Any]:
+        """生成一个优化候选并评分，生成和评分各占用一个并发名额"""
+        async with semaphore:
+            # 候选之间需要差异，默认不读取缓存
+            content = await self._optimize_prompt(
+                prompt, requirements, reasoning, model, language, optimization_type,
+                use_cache=use_cache, temperature=temperature, feedback=feedback
+            )
+        async with semaphore:
+            score, reason = await self._score_candidate(prompt, requirements, content, model, language)
+        return {"index": index, "temperature": temperature, "score": score, "reason": reason, "prompt": content}
+    
+    def _format_feedback(self, candidate: Dict[str, Any], language: str) -> str:
+        """把上一轮候选及其评估整理为下一轮的优化反馈"""
+        score = "未知" if candidate["score"] is None else candidate["score"]
+        if language == "zh-CN":
+            return f"上一轮优化结果：\n{candidate['prompt']}\n\n评分：{score}/10\n评价：{candidate['reason']}"
+        return f"Previous optimized prompt:\n{candidate['prompt']}\n\nScore: {score}/10\nReview: {candidate['reason']}"
+    
+    @staticmethod
+    def _estimate_tokens(text: Optional[str]) -> int:
+        """粗略估算token数：中日韩字符按1个token计，其余字符按4个字符1个token计"""
+        if not text:
+            return 0
+        cjk = len(re.findall(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]", text))
+        return cjk + (len(text) - cjk + 3) // 4
+    
+    async def _score_candidate(
+        self, prompt: str, requirements: str, candidate: str, model: str, language: str
+    ) -> tuple:
+        """为优化候选打分，返回(分数, 理由)，分数范围0-10，解析失败时分数为None"""
+        scoring_prompt = self._build_candidate_scoring_prompt(prompt, requirements, candidate, language)
+        try:
+            result = await self._send_prompt(scoring_prompt, {"model": model, "temperature": 0})
+            if not result or result.get("error") or not result.get("output"):
+                return None, "评分失败"
+            data = self._parse_json_object(result["output"])
+            if not data or "score" not in data:
+                return None, "评分结果解析失败"
+            score = max(0.0, min(10.0, float(data["score"])))
+            return score, str(data.get("reason", ""))
+        except Exception as e:
+            return None, f"评分过程中发生错误: {str(e)}"
+    
+    @staticmethod
+    def _parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+        """从模型输出中解析第一个完整的JSON对象，失败返回None"""
+        if not text:
+            return None
+        decoder = json.JSONDecoder()
+        for match in re.finditer(r"\{", text):
+            try:
+                data, _ = decoder.raw_decode(text, match.start())
+            except ValueError:
+                continue
+            if isinstance(data, dict):
+                return data
+        return None
+    
+    async def _stream_chunks(self, text: str, stage: str):
+        """将阶段结果分块输出，命中缓存的阶段不加延迟"""
+        delay = 0 if stage in self._cache_hits else 0.01
+        for chunk in self._split_text_into_chunks(text, 20):  # 每块约20个字符
+            yield chunk
+            await asyncio.sleep(delay)  # 小延迟以模拟流式传输
+    
+    def _cache_key(self, stage: str, stage_prompt: str, model: Optional[str], language: str, *extra: Any) -> str:
+        """阶段缓存键：阶段名称 + 模型配置 + 语言 + 阶段输入（以及温度等额外参数）"""
+        return stage_cache.make_key(stage, self.adapter.provider, self.adapter.base_url, model, language, stage_prompt, *extra)
+    
+    def _cache_get(self, stage: str, key: str, use_cache: bool) -> Optional[str]:
+        """读取阶段缓存并记录命中情况"""
+        if not use_cache:
+            return None
+        cached = stage_cache.get(key)
+        if cached is not None:
+            self._cache_hits.add(stage)
+        return cached
+    
+    async def _send_prompt(self, prompt: str, variables: dict = None, guard=None) -> Dict[str, Any]:
+        """
+        在有界线程池中调用模型，避免同步请求阻塞事件循环，使各阶段可以并发执行
+
+        以流式方式调用，协程被取消（客户端断开）时通过本次调用的取消标记中止线程中进行的请求
+        """
+        cancel_event = threading.Event()
+        try:
+            result = await run_blocking(
+                self.adapter.send_prompt, prompt, variables, guard=guard, stream=True, cancel_event=cancel_event
+            )
+        except asyncio.CancelledError:
+            # 协程被取消时线程中的请求仍在进行，通知本次调用中止
+            cancel_event.set()
+            raise
+        output = result.get("output") if isinstance(result, dict) else None
+        self.tokens_used += self._estimate_tokens(prompt) + self._estimate_tokens(output if isinstance(output, str) else None)
+        return result
     
     def _split_text_into_chunks(self, text: str, chunk_size: int) -> list:
         """将文本分割成小块，用于模拟流式输出"""
@@ -111,15 +448,21 @@ class PromptOptimizer:
         return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
     
     async def _deep_reasoning(
-        self, prompt: str, requirements: str, model: str, language: str
+        self, prompt: str, requirements: str, model: str, language: str, use_cache: bool = True
     ) -> str:
         """深度推理阶段"""
         reasoning_prompt = self._build_deep_reasoning_prompt(prompt, requirements, language)
+        cache_key = self._cache_key("deep_reasoning", reasoning_prompt, model, language)
+        cached = self._cache_get("deep_reasoning", cache_key, use_cache)
+        if cached is not None:
+            return cached
         
         try:
             # 使用ModelAdapter发送请求
-            result = self.adapter.send_prompt(reasoning_prompt, {"model": model})
+            result = await self._send_prompt(reasoning_prompt, {"model": model})
             if result and "output" in result:
+                if not result.get("error"):
+                    stage_cache.set(cache_key, result["output"])
                 return result["output"]
             else:
                 error_msg = result.get("error", "未知错误")
@@ -129,33 +472,41 @@ class PromptOptimizer:
             return f"深度推理过程中发生错误: {str(e)}"
     
     async def _optimize_prompt(
-        self, prompt: str, requirements: str, reasoning: str, model: str, language: str, optimization_type: str = None
+        self, prompt: str, requirements: str, reasoning: str, model: str, language: str, optimization_type: str = None,
+        use_cache: bool = True, temperature: float = None, feedback: str = None
     ) -> str:
         """优化提示词阶段"""
-        optimize_prompt = self._build_optimize_prompt(prompt, requirements, reasoning, language, optimization_type)
+        optimize_prompt = self._build_optimize_prompt(prompt, requirements, reasoning, language, optimization_type, feedback)
+        variables = {"model": model}
+        if temperature is not None:
+            variables["temperature"] = temperature
+        cache_key = self._cache_key("optimize", optimize_prompt, model, language, temperature)
+        cached = self._cache_get("optimize", cache_key, use_cache)
+        if cached is not None:
+            return cached
         
         try:
-            # 使用ModelAdapter发送请求
-            result = self.adapter.send_prompt(optimize_prompt, {"model": model})
+            # 使用ModelAdapter发送请求，流式调用时一旦开头看起来是评估JSON就立即中止
+            result = await self._send_prompt(optimize_prompt, variables, guard=self._evaluation_json_guard)
             if result and "output" in result:
                 output = result["output"]
                 
-                # 检查返回内容是否是JSON格式的评估结果
-                if output.strip().startswith('{') and output.strip().endswith('}'):
-                    try:
-                        # 尝试解析JSON
-                        json_data = json.loads(output)
-                        # 如果包含评分和理由字段，说明返回了评估结果而非优化提示词
-                        if "评分" in json_data or "分数" in json_data or "score" in json_data or "rating" in json_data:
-                            # 重新发送请求，强调返回优化后的提示词
-                            retry_prompt = optimize_prompt + "\n\n请注意：你必须返回优化后的提示词文本，不要返回任何JSON格式的评估结果。直接输出优化后的提示词内容。"
-                            retry_result = self.adapter.send_prompt(retry_prompt, {"model": model})
-                            if retry_result and "output" in retry_result:
-                                return retry_result["output"]
-                    except:
-                        # 如果JSON解析失败，说明不是JSON格式，直接返回原始输出
-                        pass
+                # 被格式检查中止，或完整返回内容是JSON格式的评估结果
+                if result.get("aborted") or self._is_evaluation_json(output):
+                    metrics.incr("optimizer.format_retry")
+                    # 重新发送请求，强调返回优化后的提示词
+                    retry_prompt = optimize_prompt + "\n\n请注意：你必须返回优化后的提示词文本，不要返回任何JSON格式的评估结果。直接输出优化后的提示词内容。"
+                    retry_result = await self._send_prompt(retry_prompt, variables)
+                    if retry_result and "output" in retry_result:
+                        # 重试结果同样完整解析校验，仍是评估结果时不作为优化后的提示词返回
+                        if self._is_evaluation_json(retry_result["output"]):
+                            return "优化过程中发生错误: 模型返回了评估结果而不是优化后的提示词"
+                        if not retry_result.get("error"):
+                            stage_cache.set(cache_key, retry_result["output"])
+                        return retry_result["output"]
                 
+                if not result.get("error"):
+                    stage_cache.set(cache_key, output)
                 return output
             else:
                 error_msg = result.get("error", "未知错误")
@@ -164,8 +515,85 @@ class PromptOptimizer:
         except Exception as e:
             return f"优化过程中发生错误: {str(e)}"
     
-    def _build_optimize_prompt(self, prompt: str, requirements: str, reasoning: str, language: str, optimization_type: str = None) -> str:
-        """构建优化提示词"""
+    # 评估结果JSON中的评分字段
+    EVALUATION_KEYS = ("评分", "分数", "score", "rating")
+
+    @staticmethod
+    def _strip_json_fence(text: str) -> str:
+        """去掉开头的```json代码块标记和结尾的```"""
+        text = text.strip()
+        if text.startswith("```"):
+            text = re.sub(r"^```(?:json)?\s*", "", text)
+            text = re.sub(r"\s*```$", "", text)
+        return text
+
+    @staticmethod
+    def _top_level_keys(text: str) -> List[str]:
+        """提取JSON对象文本（可以不完整）中最外层的键，嵌套对象中的键不计入"""
+        keys = []
+        depth = 0
+        i = 0
+        while i < len(text):
+            c = text[i]
+            if c == '"':
+                end = i + 1
+                while end < len(text) and text[end] != '"':
+                    end += 2 if text[end] == "\\" else 1
+                if end >= len(text):
+                    break
+                if depth == 1 and re.match(r"\s*:", text[end + 1:]):
+                    keys.append(text[i + 1:end])
+                i = end + 1
+                continue
+            if c in "{[":
+                depth += 1
+            elif c in "}]":
+                depth -= 1
+            i += 1
+        return keys
+
+    @classmethod
+    def _evaluation_json_guard(cls, head: str) -> bool:
+        """
+        流式格式检查：回复开头是JSON对象（可带```json代码块）且最外层出现评分类字段时返回True
+
+        只根据回复开头判断，用于提前中止请求；完整回复仍由_is_evaluation_json完整解析后判断
+        """
+        text = cls._strip_json_fence(head)
+        if not text.startswith("{"):
+            return False
+        return any(key in cls.EVALUATION_KEYS for key in cls._top_level_keys(text))
+
+    @classmethod
+    def _is_evaluation_json(cls, output: str) -> bool:
+        """完整回复是否是包含评分字段的JSON评估结果（而非优化后的提示词）"""
+        if not isinstance(output, str):
+            return False
+        text = cls._strip_json_fence(output)
+        if not (text.startswith('{') and text.endswith('}')):
+            return False
+        try:
+            json_data = json.loads(text)
+        except ValueError:
+            return False
+        return isinstance(json_data, dict) and any(key in json_data for key in cls.EVALUATION_KEYS)
+
+    def _build_optimize_prompt(self, prompt: str, requirements: str, reasoning: str, language: str, optimization_type: str = None, feedback: str = None) -> str:
+        """构建优化提示词，feedback为上一轮的优化结果及评估反馈（迭代优化时使用）"""
+        if feedback:
+            base = self._build_optimize_prompt(prompt, requirements, reasoning, language, optimization_type)
+            if language == "zh-CN":
+                return base + f"""
+以下是上一轮的优化结果及评估反馈，请针对其中指出的不足继续改进，输出新的完整提示词：
+
+{feedback}
+"""
+            return base + f"""
+Below is the previous round's optimized prompt and its review. Address the weaknesses it points out and output a new complete prompt:
+
+{feedback}
+"""
+        
         if language == "zh-CN":
             # 优先使用传入的优化类型，如果没有则进行关键词检测
             if optimization_type == "function-calling":
@@ -283,15 +711,21 @@ DO NOT return evaluation results or scores. You MUST return the optimized prompt
 """
     
     async def _evaluate_optimization(
-        self, original_prompt: str, requirements: str, model: str, language: str
+        self, original_prompt: str, requirements: str, model: str, language: str, use_cache: bool = True
     ) -> str:
         """评估优化结果阶段"""
         evaluation_prompt = self._build_evaluation_prompt(original_prompt, requirements, language)
+        cache_key = self._cache_key("evaluate", evaluation_prompt, model, language)
+        cached = self._cache_get("evaluate", cache_key, use_cache)
+        if cached is not None:
+            return cached
         
         try:
             # 使用ModelAdapter发送请求
-            result = self.adapter.send_prompt(evaluation_prompt, {"model": model})
+            result = await self._send_prompt(evaluation_prompt, {"model": model})
             if result and "output" in result:
+                if not result.get("error"):
+                    stage_cache.set(cache_key, result["output"])
                 return result["output"]
             else:
                 error_msg = result.get("error", "未知错误")
@@ -300,6 +734,179 @@ DO NOT return evaluation results or scores. You MUST return the optimized prompt
         except Exception as e:
             return f"评估过程中发生错误: {str(e)}"
     
+    async def generate_template_parameters(self, prompt: str, language: str = "zh-CN", use_cache: bool = True) -> Optional[str]:
+        """生成提示词模板参数（标题、描述、标签），返回模型原始输出，未配置模型或调用失败时返回None"""
+        output, _ = await self._generate_template_parameters(prompt, language, use_cache)
+        return output
+    
+    async def _generate_template_parameters(self, prompt: str, language: str, use_cache: bool) -> Tuple[Optional[str], bool]:
+        """生成模板参数，返回(模型原始输出, 是否命中缓存)，只缓存能通过校验的输出"""
+        if not self.adapter:
+            return None, False
+        
+        parameters_prompt = self._build_template_parameters_prompt(prompt, language)
+        cache_key = self._cache_key("template_parameters", parameters_prompt, None, language)
+        cached = self._cache_get("template_parameters", cache_key, use_cache)
+        if cached is not None:
+            return cached, True
+        
+        result = await self._send_prompt(parameters_prompt)
+        if result and "output" in result:
+            if not result.get("error") and self.parse_template_parameters(result["output"]):
+                stage_cache.set(cache_key, result["output"])
+            return result["output"], False
+        return None, False
+    
+    async def generate_template_parameters_batch_stream(
+        self,
+        prompts: List[str],
+        language: str = "zh-CN",
+        use_cache: bool = True,
+        concurrency: int = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        批量生成模板参数，并发调用模型（相同的提示词只调用一次），按完成顺序逐条返回校验后的结果
+        """
+        limit = max(1, min(concurrency or OPTIMIZER_MAX_CONCURRENCY, OPTIMIZER_MAX_CONCURRENCY))
+        semaphore = asyncio.Semaphore(limit)
+        
+        # 相同的提示词合并为一次调用
+        groups: Dict[str, List[int]] = {}
+        for index, item in enumerate(prompts):
+            groups.setdefault(item or "", []).append(index)
+        
+        async def run_group(text: str):
+            if not text.strip():
+                return text, {"status": "error", "cached": False, "params": None, "error": "提示词不能为空"}
+            if not self.adapter:
+                return text, {"status": "error", "cached": False, "params": None, "error": "未配置可用的模型"}
+            async with semaphore:
+                try:
+                    output, cached = await self._generate_template_parameters(text, language, use_cache)
+                except Exception as e:
+                    return text, {"status": "error", "cached": False, "params": None, "error": f"调用失败: {str(e)}"}
+            params = self.parse_template_parameters(output)
+            if params is None:
+                return text, {"status": "error", "cached": cached, "params": None, "error": "解析失败: 模型输出不是有效的模板参数JSON"}
+            return text, {"status": "ok", "cached": cached, "params": params, "error": None}
+        
+        tasks = []
+        try:
+            yield {"type": "batch-start", "total": len(prompts), "unique": len(groups), "concurrency": limit}
+            
+            tasks = [asyncio.ensure_future(run_group(text)) for text in groups]
+            succeeded = failed = cached = 0
+            for future in asyncio.as_completed(tasks):
+                text, outcome = await future
+                for index in groups[text]:
+                    if outcome["status"] == "ok":
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    if outcome["cached"]:
+                        cached += 1
+                    yield {"type": "item", "index": index, **outcome}
+            
+            yield {"type": "batch-end", "total": len(prompts), "succeeded": succeeded, "failed": failed, "cached": cached}
+            yield {"type": "done", "done": True}
+            
+        except Exception as e:
+            yield {"type": "error", "message": f"批量生成模板参数时发生错误: {str(e)}"}
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    @classmethod
+    def parse_template_parameters(cls, output: Optional[str]) -> Optional[Dict[str, str]]:
+        """从模型输出中解析并校验模板参数，title/description/tags都必须是非空文本（tags也接受列表），否则返回None"""
+        data = cls._parse_json_object(output)
+        if not data:
+            return None
+        tags = data.get("tags")
+        if isinstance(tags, list):
+            tags = ",".join(str(tag).strip() for tag in tags if str(tag).strip())
+        params = {"title": data.get("title"), "description": data.get("description"), "tags": tags}
+        if not all(isinstance(value, str) and value.strip() for value in params.values()):
+            return None
+        return {key: value.strip() for key, value in params.items()}
+    
+    def _build_template_parameters_prompt(self, prompt: str, language: str) -> str:
+        """构建生成模板参数的提示词"""
+        if language == "zh-CN":
+            return f"""
+请为以下提示词生成合适的模板参数：
+
+提示词内容：
+{prompt}
+
+请生成以下信息并以JSON格式返回：
+1. title: 简洁明确的标题（不超过50字）
+2. description: 详细的描述说明（100-200字）
+3. tags: 相关标签（用逗号分隔，3-5个标签）
+
+返回格式：
+{{
+    "title": "标题",
+    "description": "描述",
+    "tags": "标签1,标签2,标签3"
+}}
+"""
+        else:
+            return f"""
+Please generate appropriate template parameters for the following prompt:
+
+Prompt Content:
+{prompt}
+
+Please generate the following information and return in JSON format:
+1. title: Concise and clear title (no more than 50 characters)
+2. description: Detailed description (100-200 characters)
+3. tags: Relevant tags (comma-separated, 3-5 tags)
+
+Return format:
+{{
+    "title": "Title",
+    "description": "Description", 
+    "tags": "tag1,tag2,tag3"
+}}
+"""
+    
+    def _build_candidate_scoring_prompt(self, prompt: str, requirements: str, candidate: str, language: str) -> str:
+        """构建候选评分提示词"""
+        if language == "zh-CN":
+            return f"""
+请评估下面这个优化后的提示词相对原始提示词的质量，综合考虑清晰度、完整性、准确性、可执行性以及是否满足优化要求。
+
+原始提示词：
+{prompt}
+
+优化要求：
+{requirements}
+
+优化后的提示词：
+{candidate}
+
+只返回JSON，不要包含其他内容，格式如下：
+{{"score": 0到10之间的数字, "reason": "简要的评分理由和改进建议"}}
+"""
+        else:
+            return f"""
+Please rate the quality of the optimized prompt below relative to the original prompt, considering clarity, completeness, accuracy, executability and whether it meets the optimization requirements.
+
+Original Prompt:
+{prompt}
+
+Optimization Requirements:
+{requirements}
+
+Optimized Prompt:
+{candidate}
+
+Return JSON only, with no other content, in this format:
+{{"score": a number from 0 to 10, "reason": "brief justification and suggestions for improvement"}}
+"""
+    
     def _build_deep_reasoning_prompt(self, prompt: str, requirements: str, language: str) -> str:
         """构建深度推理提示词"""
         if language == "zh-CN":
@@ -0,0 +1,267 @@
+import datetime
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import (
+    JSON, Boolean, Column, DateTime, Integer, MetaData, String, Table, create_engine, exists, select
+)
+from sqlalchemy.engine import Engine, Row
+
+from app.database import SessionLocal
+from app.models import ArchivedRecord, LLMModel, PromptEvaluation, PromptHistory, PromptTemplate, TestRecord
+from app.models.content import release_blobs
+from app.models.types import CompressedText
+from app.pagination import DateRangeParams, apply_filters
+from app.services.search_index import KIND_BY_MODEL, search_index
+from app.services.metrics import metrics
+from app.config import ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 归档文件的表结构：大文本内联压缩保存，模型名、模板名随记录一起保存，读取时不再依赖主库
+archive_metadata = MetaData()
+
+archived_test_records = Table(
+    "test_records", archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, index=True),
+    Column("model_id", Integer),
+    Column("model_name", String(100)),
+    Column("template_id", Integer),
+    Column("template_name", String(100)),
+    Column("prompt", CompressedText),
+    Column("variables", JSON),
+    Column("response", CompressedText),
+    Column("evaluation", JSON),
+    Column("is_deleted", Boolean),
+    Column("created_at", DateTime(timezone=True)),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+archived_prompt_history = Table(
+    "prompt_history", archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, index=True),
+    Column("prompt_id", Integer),
+    Column("template_id", Integer),
+    Column("template_name", String(100)),
+    Column("model_id", Integer),
+    Column("model_name", String(100)),
+    Column("variables", JSON),
+    Column("rendered_prompt", CompressedText),
+    Column("response", CompressedText),
+    Column("evaluation", JSON),
+    Column("is_deleted", Boolean),
+    Column("created_at", DateTime(timezone=True)),
+    Column("updated_at", DateTime(timezone=True)),
+)
+
+ARCHIVE_TABLES = {
+    "test_records": (TestRecord, archived_test_records),
+    "prompt_history": (PromptHistory, archived_prompt_history),
+}
+
+
+class RecordArchive:
+    """
+    测试记录和历史记录的按月归档
+
+    超过保留期的记录移到按月划分的SQLite文件（archive_YYYY_MM.db）中，主库只保留
+    archived_records索引（记录ID -> 月份），详情和导出接口通过索引透明地读取归档记录
+    """
+
+    def __init__(
+        self,
+        archive_dir: str = ARCHIVE_DIR,
+        after_days: int = ARCHIVE_AFTER_DAYS,
+        interval: int = ARCHIVE_INTERVAL,
+        batch_size: int = ARCHIVE_BATCH_SIZE
+    ):
+        self.archive_dir = archive_dir
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self._engines: Dict[str, Engine] = {}
+        self._engines_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def start(self):
+        """启动后台归档线程，按interval定期执行"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="record-archive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，当前批次完成后退出"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        with self._engines_lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.archive_expired()
+            except Exception as e:
+                logger.error(f"归档记录出错: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def archive_expired(self) -> int:
+        """归档超过保留期的记录，返回归档的行数"""
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=self.after_days)
+        total = 0
+        for table_name in ARCHIVE_TABLES:
+            while not self._stop.is_set():
+                moved = self._archive_batch(table_name, cutoff)
+                total += moved
+                if moved < self.batch_size:
+                    break
+        if total:
+            logger.info(f"已归档{total}条记录（早于{cutoff:%Y-%m-%d}）")
+        return total
+
+    def _engine(self, month: str) -> Engine:
+        """获取某个月的归档文件，不存在时创建"""
+        with self._engines_lock:
+            engine = self._engines.get(month)
+            if engine is None:
+                os.makedirs(self.archive_dir, exist_ok=True)
+                path = os.path.join(self.archive_dir, f"archive_{month}.db")
+                engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+                archive_metadata.create_all(engine)
+                self._engines[month] = engine
+            return engine
+
+    def _archive_path_exists(self, month: str) -> bool:
+        return os.path.exists(os.path.join(self.archive_dir, f"archive_{month}.db"))
+
+    def _select_expired(self, db, table_name: str, cutoff: datetime.datetime):
+        """查询一批需要归档的记录（含模型名、模板名和内容）"""
+        model, archive_table = ARCHIVE_TABLES[table_name]
+        columns = [getattr(model, c.name) for c in archive_table.columns if c.name not in ("model_name", "template_name")]
+        query = db.query(
+            *columns,
+            LLMModel.name.label("model_name"),
+            PromptTemplate.name.label("template_name"),
+            *[getattr(model, hash_attr) for hash_attr in model.__content_fields__.values()]
+        ).outerjoin(model.model).outerjoin(model.template)
+        if model is PromptHistory:
+            # 有评估记录引用的历史记录保留在主库
+            query = query.filter(~exists().where(PromptEvaluation.history_id == PromptHistory.id))
+        query = apply_filters(query, model, DateRangeParams(created_after=None, created_before=cutoff))
+        return query.order_by(model.id).limit(self.batch_size).all()
+
+    def _archive_batch(self, table_name: str, cutoff: datetime.datetime) -> int:
+        """
+        归档一批记录：先写入归档文件，再在主库中登记索引、删除记录并释放内容引用
+
+        主库事务失败时记录仍留在主库，下次会再次归档；归档文件中已存在的ID跳过不再写入，
+        因此重新执行不会产生重复数据。主库的ID不会复用（AUTOINCREMENT），同一ID只对应一条记录
+        """
+        model, archive_table = ARCHIVE_TABLES[table_name]
+        hash_attrs = list(model.__content_fields__.values())
+        db = SessionLocal()
+        try:
+            rows = self._select_expired(db, table_name, cutoff)
+            if not rows:
+                return 0
+
+            by_month: Dict[str, List[Dict]] = defaultdict(list)
+            for row in rows:
+                values = {c.name: getattr(row, c.name) for c in archive_table.columns}
+                by_month[row.created_at.strftime("%Y_%m")].append(values)
+            for month, values in by_month.items():
+                with self._engine(month).begin() as conn:
+                    existing = set(conn.execute(
+                        select(archive_table.c.id).where(archive_table.c.id.in_([v["id"] for v in values]))
+                    ).scalars())
+                    values = [v for v in values if v["id"] not in existing]
+                    if values:
+                        conn.execute(archive_table.insert(), values)
+
+            ids = [row.id for row in rows]
+            db.add_all([
+                ArchivedRecord(
+                    table_name=table_name,
+                    record_id=row.id,
+                    user_id=row.user_id,
+                    month=row.created_at.strftime("%Y_%m"),
+                    record_created_at=row.created_at
+                )
+                for row in rows
+            ])
+            db.flush()
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            release_blobs(db.connection(), [getattr(row, attr) for row in rows for attr in hash_attrs])
+            if model in KIND_BY_MODEL:
+                search_index.remove(db.connection(), KIND_BY_MODEL[model], ids)
+            db.commit()
+            metrics.incr(f"archive.{table_name}", len(rows))
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get(self, table_name: str, record_id: int, user_id: int) -> Optional[Row]:
+        """按ID读取归档记录，只返回属于该用户的记录"""
+        db = SessionLocal()
+        try:
+            entry = db.query(ArchivedRecord.month).filter_by(
+                table_name=table_name, record_id=record_id, user_id=user_id
+            ).first()
+        finally:
+            db.close()
+        if not entry or not self._archive_path_exists(entry.month):
+            return None
+        archive_table = ARCHIVE_TABLES[table_name][1]
+        with self._engine(entry.month).connect() as conn:
+            return conn.execute(select(archive_table).where(archive_table.c.id == record_id)).first()
+
+    def iter_rows(self, table_name: str, user_id: int, dates: DateRangeParams, include_deleted: bool = True) -> Iterator[Row]:
+        """按时间顺序遍历某用户的归档记录，用于导出"""
+        db = SessionLocal()
+        try:
+            query = db.query(ArchivedRecord.month).filter(
+                ArchivedRecord.table_name == table_name, ArchivedRecord.user_id == user_id
+            )
+            if dates.created_after:
+                query = query.filter(ArchivedRecord.record_created_at >= dates.created_after)
+            if dates.created_before:
+                query = query.filter(ArchivedRecord.record_created_at < dates.created_before)
+            months = sorted(row.month for row in query.distinct())
+        finally:
+            db.close()
+
+        archive_table = ARCHIVE_TABLES[table_name][1]
+        for month in months:
+            if not self._archive_path_exists(month):
+                continue
+            query = select(archive_table).where(archive_table.c.user_id == user_id)
+            if not include_deleted:
+                query = query.where(archive_table.c.is_deleted == False)
+            if dates.created_after:
+                query = query.where(archive_table.c.created_at >= dates.created_after)
+            if dates.created_before:
+                query = query.where(archive_table.c.created_at < dates.created_before)
+            with self._engine(month).connect() as conn:
+                for row in conn.execution_options(yield_per=ARCHIVE_BATCH_SIZE).execute(query.order_by(archive_table.c.id)):
+                    yield row
+
+
+record_archive = RecordArchive()
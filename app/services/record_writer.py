@@ -0,0 +1,147 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import ArchivedRecord, TestRecord
+from app.models.content import intern_content_rows
+from app.services.search_index import search_index
+from app.services.metrics import metrics
+from app.config import (
+    TEST_RECORD_WRITE_BEHIND,
+    TEST_RECORD_BATCH_SIZE,
+    TEST_RECORD_FLUSH_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class TestRecordWriter:
+    """
+    测试记录延迟写入器：请求只把记录放入缓冲区，由后台线程按数量或时间间隔批量提交
+
+    记录ID在入队时预先分配，接口仍可立即返回record_id；记录在下一次批量提交后才能查询到
+    """
+
+    def __init__(
+        self,
+        enabled: bool = TEST_RECORD_WRITE_BEHIND,
+        batch_size: int = TEST_RECORD_BATCH_SIZE,
+        flush_interval: float = TEST_RECORD_FLUSH_INTERVAL
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[Dict] = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._id_lock = threading.Lock()
+        self._next_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def reserve_id(self, db: Session) -> int:
+        """
+        预分配记录ID
+
+        PostgreSQL直接从序列取值；其他数据库在进程内从已使用过的最大ID（包括已归档的记录）开始递增，
+        因此只适用于单个进程写入测试记录的部署
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            return db.execute(text("SELECT nextval(pg_get_serial_sequence('test_records', 'id'))")).scalar()
+        with self._id_lock:
+            if self._next_id is None:
+                self._next_id = max(
+                    db.query(func.max(TestRecord.id)).scalar() or 0,
+                    db.query(func.max(ArchivedRecord.record_id)).filter(ArchivedRecord.table_name == "test_records").scalar() or 0
+                )
+            self._next_id += 1
+            return self._next_id
+
+    def submit(self, db: Session, fields: Dict) -> int:
+        """把一条测试记录放入缓冲区，返回预分配的记录ID"""
+        record_id = self.reserve_id(db)
+        with self._cond:
+            self._ensure_started()
+            self._buffer.append(dict(fields, id=record_id))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        metrics.incr("record_writer.queued")
+        return record_id
+
+    def flush(self):
+        """立即提交缓冲区中的全部记录，返回后此前提交的记录都已写入数据库"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self._write(batch)
+
+    def stop(self):
+        """停止后台线程并写完剩余记录，在应用关闭时调用"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self):
+        """首次入队时启动后台线程，调用方需持有锁"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="test-record-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """后台线程：缓冲区达到批量大小或等待超过时间间隔时提交"""
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                self._cond.wait_for(
+                    lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                    timeout=self.flush_interval
+                )
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"批量写入测试记录出错: {str(e)}")
+
+    def _write(self, batch: List[Dict]):
+        """在一个事务中批量插入；失败时逐条重试，避免一条坏数据拖累整批"""
+        db = SessionLocal()
+        try:
+            db.execute(insert(TestRecord), intern_content_rows(db.connection(), TestRecord, batch))
+            search_index.index_rows(db.connection(), "test_record", batch)
+            db.commit()
+            metrics.incr("record_writer.flushes")
+            metrics.incr("record_writer.written", len(batch))
+            logger.debug(f"批量写入测试记录: {len(batch)}条")
+            return
+        except Exception as e:
+            db.rollback()
+            logger.error(f"批量写入测试记录失败，改为逐条写入: {str(e)}")
+        finally:
+            db.close()
+
+        for row in batch:
+            db = SessionLocal()
+            try:
+                db.execute(insert(TestRecord), intern_content_rows(db.connection(), TestRecord, [row]))
+                search_index.index_rows(db.connection(), "test_record", [row])
+                db.commit()
+                metrics.incr("record_writer.written")
+            except Exception as e:
+                db.rollback()
+                metrics.incr("record_writer.failed")
+                logger.error(f"写入测试记录失败: ID={row.get('id')}, {str(e)}")
+            finally:
+                db.close()
+
+
+record_writer = TestRecordWriter()
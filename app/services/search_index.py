@@ -0,0 +1,238 @@
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, delete, event, func, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session, attributes
+
+from app.models import Prompt, PromptTemplate, SearchDocument, TestRecord
+from app.services.metrics import metrics
+
+# 中日韩文字没有空格分词，按相邻两字（bigram）切分；每段的最后一个字再单独作为一个词，
+# 使单字查询（前缀匹配）也能命中
+CJK_RUN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+")
+WORD = re.compile(r"\w+", re.UNICODE)
+
+# 参与搜索的对象：类型 -> (模型, 标题字段, 正文字段)
+INDEXED_MODELS = {
+    "template": (PromptTemplate, ("name",), ("description", "content")),
+    "prompt": (Prompt, ("name",), ("description", "content")),
+    "test_record": (TestRecord, (), ("prompt", "response")),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _, _) in INDEXED_MODELS.items()}
+
+# 标题命中的权重高于正文
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def tokenize(text: Optional[str]) -> str:
+    """把文本转换成以空格分隔的词，写入索引"""
+    if not text:
+        return ""
+    tokens: List[str] = []
+    pos = 0
+    text = text.lower()
+    for match in CJK_RUN.finditer(text):
+        tokens.extend(WORD.findall(text[pos:match.start()]))
+        run = match.group()
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+        pos = match.end()
+    tokens.extend(WORD.findall(text[pos:]))
+    return " ".join(tokens)
+
+
+def parse_query(q: str) -> List[Tuple[List[str], bool]]:
+    """
+    把搜索词转换为短语列表，每个短语为(词列表, 是否前缀匹配)，短语之间为AND关系
+
+    连续的中文按bigram组成短语，只有一个字时按前缀匹配；最后一个英文词按前缀匹配，便于边输入边搜索
+    """
+    phrases: List[Tuple[List[str], bool]] = []
+    for term in q.split():
+        for match in re.finditer(r"(%s)|(\w+)" % CJK_RUN.pattern, term.lower()):
+            run = match.group(1)
+            if run:
+                if len(run) == 1:
+                    phrases.append(([run], True))
+                else:
+                    phrases.append(([run[i:i + 2] for i in range(len(run) - 1)], False))
+            else:
+                phrases.append(([match.group(2)], False))
+    if phrases and not CJK_RUN.match(phrases[-1][0][0]):
+        phrases[-1] = (phrases[-1][0], True)
+    return phrases
+
+
+def _fts5_query(phrases: List[Tuple[List[str], bool]]) -> str:
+    """生成FTS5 MATCH表达式"""
+    parts = []
+    for words, prefix in phrases:
+        phrase = '"%s"' % " ".join(w.replace('"', '""') for w in words)
+        parts.append(phrase + ("*" if prefix else ""))
+    return " AND ".join(parts)
+
+
+def _tsquery(phrases: List[Tuple[List[str], bool]]) -> str:
+    """生成PostgreSQL to_tsquery表达式"""
+    parts = []
+    for words, prefix in phrases:
+        words = [re.sub(r"[^\w]", "", w) for w in words]
+        if prefix:
+            words[-1] += ":*"
+        parts.append("(%s)" % " <-> ".join(words))
+    return " & ".join(parts)
+
+
+def _document(obj) -> Tuple[str, str]:
+    """取出对象的标题和正文（分词后）"""
+    _, title_fields, body_fields = INDEXED_MODELS[KIND_BY_MODEL[type(obj)]]
+    title = "\n".join(getattr(obj, f) or "" for f in title_fields)
+    body = "\n".join(getattr(obj, f) or "" for f in body_fields)
+    return tokenize(title), tokenize(body)
+
+
+class SearchIndex:
+    """
+    模板、提示词、测试记录的全文索引
+
+    通过ORM的flush事件在写入时同步；SQLite使用FTS5（保存分词后的标题和正文，
+    rowid与search_documents.id一致），PostgreSQL使用tsvector。
+    替换或删除文档时同时删除FTS5中的旧条目，避免残留条目影响bm25的统计
+    """
+
+    def upsert(self, conn: Connection, kind: str, ref_id: int, user_id: int, title: str, body: str):
+        """写入或替换一个文档"""
+        self.remove(conn, kind, [ref_id])
+        table = SearchDocument.__table__
+        values = {"kind": kind, "ref_id": ref_id, "user_id": user_id}
+        if conn.dialect.name == "postgresql":
+            values["tsv"] = func.setweight(func.to_tsvector("simple", title), "A").op("||")(
+                func.setweight(func.to_tsvector("simple", body), "D")
+            )
+        doc_id = conn.execute(insert(table).values(values)).inserted_primary_key[0]
+        if conn.dialect.name == "sqlite":
+            conn.execute(
+                text("INSERT INTO search_fts(rowid, title, body) VALUES (:id, :title, :body)"),
+                {"id": doc_id, "title": title, "body": body}
+            )
+        metrics.incr("search_index.upserts")
+
+    def remove(self, conn: Connection, kind: str, ref_ids: Sequence[int]):
+        """删除文档，SQLite下同时删除FTS5中的条目"""
+        if not ref_ids:
+            return
+        table = SearchDocument.__table__
+        condition = (table.c.kind == kind) & table.c.ref_id.in_(list(ref_ids))
+        if conn.dialect.name == "sqlite":
+            doc_ids = conn.execute(select(table.c.id).where(condition)).scalars().all()
+            if doc_ids:
+                conn.execute(
+                    text("DELETE FROM search_fts WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+                    {"ids": doc_ids}
+                )
+        conn.execute(delete(table).where(condition))
+
+    def index_rows(self, conn: Connection, kind: str, rows: Iterable[Dict]):
+        """索引批量插入的行（绕过ORM写入时使用），行中需要包含id、user_id和内容字段"""
+        _, title_fields, body_fields = INDEXED_MODELS[kind]
+        for row in rows:
+            self.upsert(
+                conn, kind, row["id"], row.get("user_id"),
+                tokenize("\n".join(row.get(f) or "" for f in title_fields)),
+                tokenize("\n".join(row.get(f) or "" for f in body_fields))
+            )
+
+    def rebuild(self, session: Session, batch_size: int = 500):
+        """重建全部索引，只读取需要的字段，按ID分批处理"""
+        conn = session.connection()
+        conn.execute(delete(SearchDocument.__table__))
+        if conn.dialect.name == "sqlite":
+            conn.execute(text("DELETE FROM search_fts"))
+        for kind, (model, title_fields, body_fields) in INDEXED_MODELS.items():
+            columns = [getattr(model, f).label(f) for f in title_fields + body_fields]
+            last_id = 0
+            while True:
+                rows = session.query(model.id, model.user_id, *columns).filter(
+                    model.is_deleted == False, model.id > last_id
+                ).order_by(model.id).limit(batch_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                self.index_rows(conn, kind, [row._asdict() for row in rows])
+
+    def search(
+        self,
+        session: Session,
+        user_id: int,
+        q: str,
+        kinds: Optional[Sequence[str]] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[Tuple[str, int, float]]:
+        """按相关度排序搜索，返回(类型, ID, 分数)列表，分数越大越相关"""
+        phrases = parse_query(q)
+        if not phrases:
+            return []
+        kinds = list(kinds or INDEXED_MODELS)
+        conn = session.connection()
+        if conn.dialect.name == "postgresql":
+            sql = text(
+                "SELECT kind, ref_id, ts_rank(tsv, to_tsquery('simple', :q)) AS score "
+                "FROM search_documents "
+                "WHERE tsv @@ to_tsquery('simple', :q) AND user_id = :user_id AND kind IN :kinds "
+                "ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+            )
+            params = {"q": _tsquery(phrases)}
+        else:
+            # bm25越小越相关，取负数使分数越大越相关
+            sql = text(
+                "SELECT d.kind, d.ref_id, -bm25(search_fts, :title_weight, :body_weight) AS score "
+                "FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+                "WHERE search_fts MATCH :q AND d.user_id = :user_id AND d.kind IN :kinds "
+                "ORDER BY score DESC, d.id DESC LIMIT :limit OFFSET :offset"
+            )
+            params = {"q": _fts5_query(phrases), "title_weight": TITLE_WEIGHT, "body_weight": BODY_WEIGHT}
+        sql = sql.bindparams(bindparam("kinds", expanding=True))
+        params.update(user_id=user_id, kinds=kinds, limit=limit, offset=offset)
+        return [(row[0], row[1], float(row[2])) for row in conn.execute(sql, params)]
+
+
+search_index = SearchIndex()
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_search_changes(session: Session, flush_context, instances):
+    """记录需要重新索引或删除的对象，flush完成（新对象有了ID）后再写入索引"""
+    pending = session.info.setdefault("search_index_pending", {})
+    for obj in list(session.new) + list(session.dirty):
+        kind = KIND_BY_MODEL.get(type(obj))
+        if not kind:
+            continue
+        _, title_fields, body_fields = INDEXED_MODELS[kind]
+        tracked = title_fields + body_fields + ("is_deleted",)
+        if obj in session.new or any(attributes.get_history(obj, f).has_changes() for f in tracked):
+            pending[id(obj)] = (kind, obj, None if obj.is_deleted else _document(obj))
+    for obj in session.deleted:
+        kind = KIND_BY_MODEL.get(type(obj))
+        if kind:
+            pending[id(obj)] = (kind, obj, None)
+
+
+@event.listens_for(Session, "after_flush")
+def _write_search_changes(session: Session, flush_context):
+    pending = session.info.pop("search_index_pending", None)
+    if not pending:
+        return
+    conn = session.connection()
+    for kind, obj, document in pending.values():
+        if document is None:
+            search_index.remove(conn, kind, [obj.id])
+        else:
+            search_index.upsert(conn, kind, obj.id, obj.user_id, *document)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_search_changes(session: Session, previous_transaction):
+    session.info.pop("search_index_pending", None)
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from app.services.metrics import metrics
+from app.config import STREAM_RUN_MAX_EVENTS, STREAM_RUN_TTL, STREAM_RUN_DISCONNECT_GRACE, STREAM_RUN_MAX_PER_USER
+
+logger = logging.getLogger(__name__)
+
+
+class TooManyRuns(Exception):
+    """用户同时进行中的运行数已达上限"""
+
+
+class StreamRun:
+    """
+    一次流式运行：在后台消费事件源并记录有界事件日志，订阅者可以从任意序号开始回放并继续接收
+    """
+
+    def __init__(
+        self,
+        run_id: str,
+        user_id: int,
+        max_events: int = STREAM_RUN_MAX_EVENTS,
+        disconnect_grace: float = STREAM_RUN_DISCONNECT_GRACE
+    ):
+        self.id = run_id
+        self.user_id = user_id
+        self.events: deque = deque(maxlen=max_events)  # (序号, 数据)
+        self.last_seq = 0
+        self.done = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancelled = False
+        self.disconnect_grace = disconnect_grace
+        self.subscribers = 0
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Condition()
+
+    async def _produce(self, source: AsyncIterator[str]):
+        """消费事件源并写入事件日志"""
+        try:
+            async for data in source:
+                async with self._changed:
+                    self.last_seq += 1
+                    self.events.append((self.last_seq, data))
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            logger.info(f"流式运行已取消: {self.id}")
+        except Exception as e:
+            logger.error(f"流式运行出错: {self.id}, {str(e)}")
+        finally:
+            async with self._changed:
+                self.done = True
+                self.finished_at = time.time()
+                self._changed.notify_all()
+
+    async def subscribe(self, after_seq: int = 0) -> AsyncGenerator[Tuple[Optional[int], str], None]:
+        """
+        从after_seq之后开始回放事件并持续接收新事件，直到运行结束
+
+        如果请求的事件已被淘汰出日志，先产出一个序号为None的replay-gap事件；订阅者接收过慢、
+        未读取的事件在接收过程中被淘汰时同样产出replay-gap事件，然后从日志中最早的事件继续
+        """
+        self._attach()
+        try:
+            cursor = after_seq
+            while True:
+                async with self._changed:
+                    pending = [event for event in self.events if event[0] > cursor]
+                    if not pending:
+                        if self.done:
+                            return
+                        await self._changed.wait()
+                        continue
+                    missed = pending[0][0] - cursor - 1
+                if missed > 0:
+                    yield None, '{"type": "replay-gap", "missed": %d}' % missed
+                for seq, data in pending:
+                    cursor = seq
+                    yield seq, data
+        finally:
+            self._detach()
+
+    def _attach(self):
+        """订阅者接入，取消等待中的断线取消"""
+        self.subscribers += 1
+        if self._cancel_handle:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+
+    def _detach(self):
+        """订阅者断开，最后一个订阅者断开且运行未结束时，等待重连宽限期后取消运行"""
+        self.subscribers -= 1
+        if self.subscribers > 0 or self.done:
+            return
+        self._schedule_cancel()
+
+    def _schedule_cancel(self):
+        """宽限期后检查是否仍没有订阅者"""
+        if self._cancel_handle:
+            self._cancel_handle.cancel()
+        loop = asyncio.get_event_loop()
+        self._cancel_handle = loop.call_later(self.disconnect_grace, self._cancel_if_abandoned)
+
+    def _cancel_if_abandoned(self):
+        """宽限期内没有客户端订阅或重连，取消运行，进行中的模型调用随之中止"""
+        self._cancel_handle = None
+        if self.subscribers > 0 or self.done or not self.task:
+            return
+        logger.info(f"客户端已断开，取消流式运行: {self.id}")
+        self.cancelled = True
+        metrics.incr("stream_runs.cancelled")
+        self.task.cancel()
+
+
+class StreamRunRegistry:
+    """
+    流式运行登记表：按ID查找运行，结束的运行在TTL内仍可回放；每个用户同时进行中的运行数不超过max_per_user
+    """
+
+    def __init__(
+        self,
+        ttl: int = STREAM_RUN_TTL,
+        disconnect_grace: float = STREAM_RUN_DISCONNECT_GRACE,
+        max_per_user: int = STREAM_RUN_MAX_PER_USER
+    ):
+        self.ttl = ttl
+        self.disconnect_grace = disconnect_grace
+        self.max_per_user = max_per_user
+        self._runs: Dict[str, StreamRun] = {}
+
+    def start(self, user_id: int, factory: Callable[[str], AsyncIterator[str]]) -> StreamRun:
+        """创建并启动一次运行，factory接收运行ID并返回事件源；进行中的运行数已达上限时抛出TooManyRuns"""
+        self._purge_expired()
+        live = sum(1 for r in self._runs.values() if r.user_id == user_id and not r.done)
+        if live >= self.max_per_user:
+            metrics.incr("stream_runs.rejected")
+            raise TooManyRuns(f"同时进行中的运行不能超过{self.max_per_user}个")
+        run = StreamRun(uuid.uuid4().hex, user_id, disconnect_grace=self.disconnect_grace)
+        run.task = asyncio.ensure_future(run._produce(factory(run.id)))
+        # 从创建时开始计时：请求方在宽限期内始终没有订阅（例如还没读取响应就断开）也会取消运行
+        run._schedule_cancel()
+        self._runs[run.id] = run
+        return run
+
+    def get(self, run_id: str, user_id: int) -> Optional[StreamRun]:
+        """获取运行，只返回属于该用户的运行"""
+        self._purge_expired()
+        run = self._runs.get(run_id)
+        if not run or run.user_id != user_id:
+            return None
+        return run
+
+    def _purge_expired(self):
+        """清理已结束且超过保留时间的运行"""
+        deadline = time.time() - self.ttl
+        for run_id in [k for k, r in self._runs.items() if r.done and r.finished_at < deadline]:
+            del self._runs[run_id]
+
+
+def parse_event_id(event_id: Optional[str]) -> Tuple[Optional[str], int]:
+    """解析SSE事件ID（格式为 运行ID:序号），无法解析时返回(None, 0)"""
+    if not event_id or ":" not in event_id:
+        return None, 0
+    run_id, _, seq = event_id.strip().rpartition(":")
+    try:
+        return run_id, int(seq)
+    except ValueError:
+        return None, 0
+
+
+stream_runs = StreamRunRegistry()
@@ -1,91 +1,203 @@
 from fastapi import WebSocket
-from typing import List
+from typing import Dict, Iterable, Optional, Set
 import logging
+import json
 import asyncio
-from datetime import datetime
+
+from app.services.metrics import metrics
+from app.config import WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 客户端处理不过来时关闭连接使用的状态码（Try Again Later），客户端重连后重新加载数据即可
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class Connection:
+    """
+    一个WebSocket连接：带有界发送队列和独立的发送任务
+
+    推送只把消息放入队列，由发送任务逐条写出，一个慢客户端不会拖慢其他连接；
+    队列满或单条消息发送超时的连接视为慢客户端，由ConnectionManager断开
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, user_id: Optional[int], topics: Iterable[str]):
+        self.manager = manager
+        self.websocket = websocket
+        self.user_id = user_id
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.sender: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.sender = asyncio.get_running_loop().create_task(self._send_loop())
+
+    def offer(self, message: str) -> bool:
+        """放入发送队列，队列已满时返回False"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _send_loop(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(message), WS_SEND_TIMEOUT)
+                metrics.incr("websocket.sent")
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket发送超时，断开慢客户端 (user_id={self.user_id})")
+            metrics.incr("websocket.dropped_slow")
+            self.manager.drop(self, SLOW_CONSUMER_CLOSE_CODE)
+        except Exception as e:
+            logger.info(f"WebSocket发送失败，移除连接: {str(e)}")
+            self.manager.drop(self)
+
+
 class ConnectionManager:
+    """
+    WebSocket连接管理与发布订阅：按用户和主题索引连接
+
+    消息只序列化一次，然后放入每个目标连接的发送队列；用户事件只推送给该用户自己的连接
+    """
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.last_cleanup = datetime.now()
-        
-    async def connect(self, websocket: WebSocket):
+        self.connections: Dict[WebSocket, Connection] = {}
+        # 按用户、按主题分组的连接
+        self.user_connections: Dict[int, Set[Connection]] = {}
+        self.topic_connections: Dict[str, Set[Connection]] = {}
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None, topics: Iterable[str] = ()) -> Optional[Connection]:
         try:
             await websocket.accept()
-            self.active_connections.append(websocket)
-            logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
-            
             # 发送连接成功消息
             await websocket.send_text("connected")
-            
         except Exception as e:
             logger.error(f"Error accepting connection: {str(e)}")
             try:
                 await websocket.close()
             except:
                 pass
+            return None
+
+        conn = Connection(self, websocket, user_id, topics)
+        self.connections[websocket] = conn
+        if user_id is not None:
+            self.user_connections.setdefault(user_id, set()).add(conn)
+        for topic in conn.topics:
+            self.topic_connections.setdefault(topic, set()).add(conn)
+        conn.start()
+        logger.info(f"Client connected. Total connections: {len(self.connections)}")
+        return conn
+
+    def subscribe(self, websocket: WebSocket, topic: str):
+        """为连接订阅主题"""
+        conn = self.connections.get(websocket)
+        if conn:
+            conn.topics.add(topic)
+            self.topic_connections.setdefault(topic, set()).add(conn)
+
+    def unsubscribe(self, websocket: WebSocket, topic: str):
+        """取消连接订阅的主题"""
+        conn = self.connections.get(websocket)
+        if conn:
+            conn.topics.discard(topic)
+            self._discard(self.topic_connections, topic, conn)
+
+    @staticmethod
+    def _discard(index: Dict, key, conn: Connection):
+        conns = index.get(key)
+        if conns is not None:
+            conns.discard(conn)
+            if not conns:
+                del index[key]
+
+    def _remove(self, conn: Connection) -> bool:
+        """从索引中移除连接，返回连接此前是否存在"""
+        if self.connections.pop(conn.websocket, None) is None:
             return False
+        if conn.user_id is not None:
+            self._discard(self.user_connections, conn.user_id, conn)
+        for topic in conn.topics:
+            self._discard(self.topic_connections, topic, conn)
         return True
 
-    async def disconnect(self, websocket: WebSocket):
-        try:
-            self.active_connections.remove(websocket)
-            logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
-        except:
-            pass
-        
+    def drop(self, conn: Connection, code: int = 1000):
+        """移除连接并在后台关闭，不等待慢客户端"""
+        if not self._remove(conn):
+            return
+        if conn.sender and conn.sender is not asyncio.current_task():
+            conn.sender.cancel()
+        asyncio.get_running_loop().create_task(self._close(conn.websocket, code))
+        logger.info(f"Client dropped. Total connections: {len(self.connections)}")
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int = 1000):
         try:
-            await websocket.close()
+            await asyncio.wait_for(websocket.close(code=code), WS_SEND_TIMEOUT)
         except:
             pass
 
+    async def disconnect(self, websocket: WebSocket):
+        conn = self.connections.get(websocket)
+        if conn and self._remove(conn):
+            if conn.sender:
+                conn.sender.cancel()
+            logger.info(f"Client disconnected. Total connections: {len(self.connections)}")
+        await self._close(websocket)
+
+    def _publish(self, message: str, targets: Iterable[Connection]) -> int:
+        """把已序列化的消息放入各连接的发送队列，队列已满的慢客户端直接断开；返回投递的连接数"""
+        delivered = 0
+        for conn in list(targets):
+            if conn.offer(message):
+                delivered += 1
+            else:
+                logger.warning(f"WebSocket发送队列已满，断开慢客户端 (user_id={conn.user_id})")
+                metrics.incr("websocket.dropped_slow")
+                self.drop(conn, SLOW_CONSUMER_CLOSE_CODE)
+        return delivered
+
+    @staticmethod
+    def _dumps(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+    def _targets(self, user_id: Optional[int], topic: Optional[str]) -> Iterable[Connection]:
+        if user_id is not None:
+            conns = self.user_connections.get(user_id, ())
+            return [c for c in conns if topic in c.topics] if topic else conns
+        if topic:
+            return self.topic_connections.get(topic, ())
+        return self.connections.values()
+
     async def broadcast(self, message: str):
         """
         广播消息给所有连接的客户端
         """
-        if not self.active_connections:
-            return
-            
-        # 记录广播消息
-        logger.info(f"Broadcasting message to {len(self.active_connections)} clients")
-        
-        # 执行广播
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error sending message to client: {str(e)}")
-                # 错误的连接会在下一次清理中移除
-                
+        self._publish(message, self.connections.values())
+
+    async def broadcast_json(self, data: dict, user_id: Optional[int] = None, topic: Optional[str] = None) -> int:
+        """
+        推送JSON消息：指定user_id时只推送给该用户的连接，指定topic时只推送给订阅了该主题的连接
+        """
+        return self._publish(self._dumps(data), self._targets(user_id, topic))
+
+    async def send_json_to_user(self, user_id: int, data: dict) -> int:
+        """
+        向指定用户的所有连接推送JSON消息
+        """
+        return await self.broadcast_json(data, user_id=user_id)
+
     async def cleanup_connections(self):
         """
-        清理失效的连接
+        发送ping检测连接，发送失败或队列已满的连接会被移除
         """
-        if not self.active_connections:
-            return
-            
-        logger.info(f"Cleaning up connections. Before: {len(self.active_connections)}")
-        
-        valid_connections = []
-        for connection in self.active_connections:
-            try:
-                # 发送ping消息测试连接
-                await connection.send_text("ping")
-                valid_connections.append(connection)
-            except Exception as e:
-                logger.info(f"Removing dead connection: {str(e)}")
-                try:
-                    await connection.close()
-                except:
-                    pass
-                    
-        self.active_connections = valid_connections
-        self.last_cleanup = datetime.now()
-        logger.info(f"Connections cleanup completed. After: {len(self.active_connections)}")
+        self._publish("ping", self.connections.values())
 
 manager = ConnectionManager()
 
@@ -94,23 +206,23 @@ async def websocket_endpoint(websocket: WebSocket):
     connected = await manager.connect(websocket)
     if not connected:
         return
-        
+
     try:
         while True:
             try:
                 # 等待客户端消息
                 data = await websocket.receive_text()
-                
+
                 # 如果是ping消息，回复pong
                 if data == "ping":
-                    await websocket.send_text("pong")
+                    connected.offer("pong")
                     continue
-                    
+
             except Exception as e:
                 logger.error(f"Error receiving message: {str(e)}")
                 break
-                
+
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
     finally:
-        await manager.disconnect(websocket) 
\ No newline at end of file
+        await manager.disconnect(websocket)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+大文本字段压缩基准测试脚本
+
+在两个临时SQLite数据库中写入相同的模拟测试记录，分别使用Text和CompressedText存储提示词和模型输出，
+对比数据库文件大小、列表查询和全表扫描的耗时。
+
+用法: python benchmark_text_compression.py [行数]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, Text, create_engine, func, select
+
+from app.models.types import CompressedText
+
+PARAGRAPHS = [
+    "作为一名资深的产品经理，请根据以下需求撰写一份详细的产品需求文档，包括背景、目标用户、核心功能和验收标准。",
+    "You are a helpful assistant. Answer the question step by step, cite the relevant facts and keep the tone professional.",
+    "首先，我们需要明确问题的边界条件；其次，分析现有方案的优缺点；最后，给出可执行的改进建议并评估风险。",
+    "The response should be formatted as Markdown with headings, bullet points and a short summary at the end.",
+    "在实际应用中，提示词的清晰度、上下文的完整性以及输出格式的约束都会显著影响模型回答的质量。",
+]
+
+
+def make_text(rng: random.Random, paragraphs: int) -> str:
+    """生成与LLM输入输出相似的文本"""
+    parts = [rng.choice(PARAGRAPHS) + f" ({rng.randint(1, 10000)})" for _ in range(paragraphs)]
+    return "\n\n".join(parts)
+
+
+def build(path: str, text_type, rows: int, seed: int = 42):
+    """建表并写入测试数据"""
+    engine = create_engine(f"sqlite:///{path}")
+    metadata = MetaData()
+    table = Table(
+        "test_records", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("user_id", Integer, index=True),
+        Column("prompt", text_type),
+        Column("response", text_type),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    metadata.create_all(engine)
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "user_id": i % 10,
+                "prompt": make_text(rng, rng.randint(2, 10)),
+                "response": make_text(rng, rng.randint(10, 60)),
+            })
+            if len(batch) == 1000:
+                conn.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(table.insert(), batch)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    return engine, table
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """返回多次执行的最短耗时（毫秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(label: str, path: str, engine, table):
+    size = os.path.getsize(path)
+
+    def list_page():
+        with engine.connect() as conn:
+            conn.execute(
+                select(table).where(table.c.user_id == 3).order_by(table.c.created_at.desc(), table.c.id.desc()).limit(50)
+            ).all()
+
+    def scan():
+        with engine.connect() as conn:
+            conn.execute(select(table.c.id, table.c.prompt, table.c.response).where(table.c.user_id == 3)).all()
+
+    print(f"{label:<16}{size / 1024 / 1024:>10.1f} MB{timed(list_page):>12.1f} ms{timed(scan, 3):>12.1f} ms")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    workdir = tempfile.mkdtemp(prefix="text_compression_")
+    print(f"行数: {rows}")
+    print(f"{'存储方式':<12}{'数据库大小':>12}{'列表50行':>12}{'读取单用户全部':>12}")
+    for label, text_type in (("Text", Text), ("CompressedText", CompressedText)):
+        path = os.path.join(workdir, f"{label}.db")
+        engine, table = build(path, text_type, rows)
+        measure(label, path, engine, table)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
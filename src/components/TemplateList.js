@@ -2,6 +2,7 @@ import React, { useState, useEffect, useCallback } from 'react';
 import { List, Card, Button, Popconfirm, message, Tooltip, Space, Spin, Alert } from 'antd';
 import { DeleteOutlined, EditOutlined, CopyOutlined, ReloadOutlined, LinkOutlined } from '@ant-design/icons';
 import { fetchTemplates, deleteTemplate } from '../services/api';
+import useAuthStore from '../stores/authStore';
 
 const TemplateList = ({ onSelect, onDelete }) => {
   const [templates, setTemplates] = useState([]);
@@ -59,7 +60,9 @@ const TemplateList = ({ onSelect, onDelete }) => {
 
     const connectWebSocket = () => {
       try {
-        ws = new WebSocket('ws://localhost:8000/ws/templates');
+        // 携带token，服务端只推送当前用户自己的模板变更
+        const { token } = useAuthStore.getState();
+        ws = new WebSocket(`ws://localhost:8000/ws/templates?token=${encodeURIComponent(token || '')}`);
         
         ws.onopen = () => {
           console.log('WebSocket connected');
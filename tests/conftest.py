@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# 必须在导入app之前设置：数据库和归档目录都放在临时目录中
+_tmpdir = tempfile.mkdtemp(prefix="prompt_lab_test_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'test.db')}"
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmpdir, "archive")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-" + "x" * 32)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.database import SessionLocal, init_db
+from app.models import User, LLMModel
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    init_db()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    """每个测试使用独立的用户，互不影响"""
+    u = User(
+        username=f"user_{uuid.uuid4().hex[:8]}",
+        password_hash=User.hash_password("secret1"),
+        display_name="tester",
+        email="tester@example.com",
+    )
+    db.add(u)
+    db.commit()
+    db.refresh(u)
+    return u
+
+
+@pytest.fixture
+def llm_model(db, user):
+    m = LLMModel(name="local", provider="local", api_key="", base_url="", user_id=user.id)
+    db.add(m)
+    db.commit()
+    db.refresh(m)
+    return m
+
+
+@pytest.fixture
+def client(user):
+    """
+    已登录的TestClient
+
+    不进入TestClient上下文，即不执行startup/shutdown事件：shutdown会关闭进程内共用的线程池，
+    后续测试无法再使用
+    """
+    c = TestClient(app)
+    r = c.post("/api/v1/auth/login", json={"username": user.username, "password": "secret1"})
+    c.headers["Authorization"] = f"Bearer {r.json()['data']['token']}"
+    return c
@@ -0,0 +1,43 @@
+import uuid
+
+from app.models import ContentBlob, Prompt, Response
+from app.models.content import content_hash
+
+
+def ref_count(db, text):
+    db.expire_all()
+    blob = db.get(ContentBlob, content_hash(text))
+    return blob.ref_count if blob else 0
+
+
+def test_response_content_is_deduplicated(db, user):
+    text = f"模型的回答 {uuid.uuid4().hex} " * 50
+    prompt = Prompt(name=f"p {uuid.uuid4().hex}", content="提示词", user_id=user.id)
+    db.add(prompt)
+    db.flush()
+    first = Response(prompt_id=prompt.id, content=text, user_id=user.id)
+    second = Response(prompt_id=prompt.id, content=text, user_id=user.id)
+    db.add_all([first, second])
+    db.commit()
+
+    assert first.content_hash == second.content_hash == content_hash(text)
+    assert ref_count(db, text) == 2
+    assert db.get(Response, first.id).content == text
+
+    # 修改内容时释放旧内容的引用
+    second.content = "新的回答"
+    db.commit()
+    assert ref_count(db, text) == 1
+
+    db.delete(first)
+    db.commit()
+    assert ref_count(db, text) == 0
+
+
+def test_response_list_returns_content(client, db, user):
+    text = f"列表中的回答 {uuid.uuid4().hex}"
+    db.add(Response(content=text, user_id=user.id))
+    db.commit()
+
+    items = client.get("/api/responses/").json()
+    assert [item["content"] for item in items] == [text]
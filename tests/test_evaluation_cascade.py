@@ -0,0 +1,97 @@
+import pytest
+
+from app.services.evaluation_cascade import EvaluationCascade, HEURISTIC_RULES
+
+
+class FakeJudge:
+    """记录调用次数的LLM评估器替身"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def evaluate_response(self, prompt, response, criteria=None):
+        self.calls += 1
+        return {"scores": {"relevance": 8}, "reasons": {}, "suggestions": ""}
+
+
+def make_cascade(**kwargs):
+    kwargs.setdefault("enabled", True)
+    kwargs.setdefault("min_chars", 5)
+    kwargs.setdefault("low_score", 0.2)
+    kwargs.setdefault("heuristic_rules", ())
+    cascade = EvaluationCascade(**kwargs)
+    cascade._judge = FakeJudge()
+    return cascade
+
+
+@pytest.mark.parametrize("prompt, response, rule", [
+    ("介绍一下Python", "", "empty"),
+    ("介绍一下Python", "   \n\t", "empty"),
+    ("介绍一下Python", None, "empty"),
+    ("介绍一下Python", "调用失败: 连接超时", "error"),
+    ("介绍一下Python", {"output": "rate limited", "error": True}, "error"),
+    ("介绍一下Python", "。。。！？…", "no_content"),
+    ("介绍一下Python", "介绍一下 Python", "echo"),
+])
+def test_hard_rules_skip_judge(prompt, response, rule):
+    cascade = make_cascade()
+    result = cascade.evaluate_response(prompt, response)
+    assert result["cascade"]["stage"] == "heuristic"
+    assert result["cascade"]["rule"] == rule
+    assert set(result["scores"].values()) == {1}
+    assert cascade._judge.calls == 0
+
+
+@pytest.mark.parametrize("response, flag", [
+    ('{"name": "Alice", "age": 30}', "low_quality"),
+    ("x = [i*i for i in range(10)]", "low_quality"),
+    ("42", "too_short"),
+    ("好的", "too_short"),
+    ("```python\nprint(1)", "truncated"),
+])
+def test_heuristic_rules_go_to_judge_by_default(response, flag):
+    """JSON、代码、数字等简短但可能正确的回答不能被启发式规则直接判为低分"""
+    cascade = make_cascade()
+    result = cascade.evaluate_response("问题", response)
+    assert cascade._judge.calls == 1
+    assert result["cascade"]["stage"] == "judge"
+    assert flag in result["cascade"]["flags"]
+    assert result["scores"] == {"relevance": 8}
+
+
+def test_normal_answer_goes_to_judge_without_flags():
+    cascade = make_cascade()
+    result = cascade.evaluate_response("介绍一下Python", "Python是一种解释型、面向对象的高级编程语言，语法简洁，生态丰富。")
+    assert cascade._judge.calls == 1
+    assert result["cascade"]["flags"] == []
+
+
+@pytest.mark.parametrize("rule, response", [
+    ("too_short", "42"),
+    ("truncated", "```python\nprint(1)"),
+    ("low_quality", '{"name": "Alice", "age": 30}'),
+])
+def test_heuristic_rules_short_circuit_when_enabled(rule, response):
+    cascade = make_cascade(heuristic_rules=[rule])
+    result = cascade.evaluate_response("问题", response)
+    assert cascade._judge.calls == 0
+    assert result["cascade"]["rule"] == rule
+
+
+def test_truncated_scores_mark_completeness_low():
+    cascade = make_cascade(heuristic_rules=HEURISTIC_RULES)
+    result = cascade.evaluate_response("写一段代码", "下面是实现代码，使用了列表推导式：\n```python\nx = [i*i for i in range(10)]")
+    assert result["cascade"]["rule"] == "truncated"
+    assert result["scores"]["completeness"] == 2
+
+
+def test_disabled_cascade_always_calls_judge():
+    cascade = make_cascade(enabled=False)
+    result = cascade.evaluate_response("问题", "")
+    assert cascade._judge.calls == 1
+    assert result["cascade"]["heuristic_score"] is None
+
+
+def test_unknown_heuristic_rule_rejected():
+    with pytest.raises(ValueError):
+        make_cascade(heuristic_rules=["empty"])
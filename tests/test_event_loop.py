@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import httpx
+
+from app.main import app
+from app.concurrency import LoopLagMonitor
+from app.services.model_adapter import ModelAdapter
+from app.config import LOOP_LAG_WARN_MS
+
+SLOW_CALL_SECONDS = 0.3
+CONCURRENCY = 6
+
+
+def slow_send_prompt(self, prompt, variables=None, **kwargs):
+    """模拟同步的模型SDK调用：阻塞当前线程"""
+    time.sleep(SLOW_CALL_SECONDS)
+    return {"output": '{"title": "标题", "description": "描述", "tags": "标签"}'}
+
+
+def _generate_parameters(client, model_id, i):
+    return client.post(
+        "/api/v1/prompt/generateprompttemplateparameters",
+        json={"prompt": f"写一首诗 {i}", "modelId": model_id, "useCache": False}
+    )
+
+
+async def _run_with_monitor(headers, model_id):
+    monitor = LoopLagMonitor(interval=0.01, warn_ms=LOOP_LAG_WARN_MS)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as client:
+        # 预热：FastAPI在路由第一次被匹配时才解析依赖签名，这一次性的开销不计入
+        await _generate_parameters(client, model_id, -1)
+        await client.get("/api/v1/auth/check-username/nobody")
+
+        monitor.start()
+        try:
+            started = time.monotonic()
+            responses = await asyncio.gather(
+                *[_generate_parameters(client, model_id, i) for i in range(CONCURRENCY)],
+                # 模型调用进行中，异步数据库接口仍能及时响应
+                *[client.get(f"/api/v1/auth/check-username/nobody{i}") for i in range(CONCURRENCY)]
+            )
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(0.05)
+            return responses, elapsed, monitor.stats()
+        finally:
+            await monitor.stop()
+
+
+def test_slow_model_calls_do_not_block_event_loop(client, llm_model, monkeypatch):
+    monkeypatch.setattr(ModelAdapter, "send_prompt", slow_send_prompt)
+
+    responses, elapsed, stats = asyncio.run(_run_with_monitor(dict(client.headers), llm_model.id))
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses]
+    assert responses[0].json()["title"] == "标题"
+    # 阻塞调用在线程池中并发执行，而不是逐个占用事件循环
+    assert elapsed < SLOW_CALL_SECONDS * CONCURRENCY
+    assert stats["max_lag_ms"] < LOOP_LAG_WARN_MS, stats
+
+
+def test_monitor_detects_blocking_call():
+    async def block_loop():
+        monitor = LoopLagMonitor(interval=0.01, warn_ms=LOOP_LAG_WARN_MS)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(LOOP_LAG_WARN_MS / 1000 * 2)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(block_loop())
+    assert stats["max_lag_ms"] >= LOOP_LAG_WARN_MS
@@ -0,0 +1,63 @@
+import uuid
+
+from sqlalchemy import event
+
+from app.database import engine
+from app.models import PromptTemplate, Response
+
+
+def captured_sql(client, url, params):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url, params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return response.json(), "\n".join(statements)
+
+
+def test_response_list_fields_and_summary(client, db, user):
+    text = "回答" * 300
+    db.add(Response(content=text, evaluation={"score": 8}, user_id=user.id))
+    db.commit()
+
+    items, sql = captured_sql(client, "/api/responses/", {"fields": "id,evaluation"})
+    assert list(items[0]) == ["id", "evaluation"]
+    # 未选择content时不读取content_blobs
+    assert "content_blobs" not in sql
+
+    items, sql = captured_sql(client, "/api/responses/", {"summary": "true", "summary_length": 10})
+    assert items[0]["content"] == text[:10]
+    # 摘要从预览中截取，不读取压缩的全文
+    assert "content_blobs.content" not in sql
+
+    items, _ = captured_sql(client, "/api/responses/", {})
+    assert items[0]["content"] == text
+
+    assert client.get("/api/responses/", params={"fields": "id,secret"}).status_code == 400
+
+
+def test_template_list_fields_and_summary(client, db, user):
+    content = "请把下面的文本翻译成英文：{text}" * 20
+    db.add(PromptTemplate(name=f"翻译 {uuid.uuid4().hex}", content=content, variables=["text"], user_id=user.id))
+    db.commit()
+
+    items, sql = captured_sql(client, "/api/templates/", {"fields": "id,name,created_at"})
+    assert list(items[0]) == ["id", "name", "created_at"]
+    assert "prompt_templates.content" not in sql
+    assert isinstance(items[0]["created_at"], str)
+
+    items, _ = captured_sql(client, "/api/templates/", {"summary": "true", "summary_length": 8})
+    assert items[0]["content"] == content[:8]
+    assert items[0]["variables"] == ["text"]
+
+    items, _ = captured_sql(client, "/api/templates/", {})
+    assert items[0]["content"] == content
+    assert items[0]["updated_at"] is None
+
+    assert client.get("/api/templates/", params={"fields": "password"}).status_code == 400
@@ -0,0 +1,49 @@
+import datetime
+
+from app.models import TestRecord as Record
+
+
+def _add_records(db, user, llm_model, days_ago):
+    """按给定顺序插入记录，created_at为days_ago天前，使插入顺序（id）与时间顺序不一致"""
+    now = datetime.datetime(2024, 6, 1, 12, 0, 0)
+    for i, days in enumerate(days_ago):
+        db.add(Record(
+            model_id=llm_model.id, user_id=user.id,
+            prompt=f"prompt {i}", response=f"response {i}",
+            created_at=now - datetime.timedelta(days=days),
+        ))
+    db.commit()
+
+
+def test_list_test_records_newest_first(client, db, user, llm_model):
+    _add_records(db, user, llm_model, [3, 1, 5, 0, 2])
+
+    items = client.get("/api/test/records").json()
+    created = [item["created_at"] for item in items]
+    assert len(items) == 5
+    assert created == sorted(created, reverse=True)
+
+
+def test_list_test_records_same_timestamp_by_id_desc(client, db, user, llm_model):
+    _add_records(db, user, llm_model, [1, 1, 1])
+
+    items = client.get("/api/test/records").json()
+    ids = [item["id"] for item in items]
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_paginated_and_legacy_order_match(client, db, user, llm_model):
+    _add_records(db, user, llm_model, [4, 2, 6, 1, 3, 5])
+
+    legacy = [item["id"] for item in client.get("/api/test/records").json()]
+    paged, cursor = [], None
+    while True:
+        params = {"limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/test/records", params=params).json()
+        paged += [item["id"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert paged == legacy
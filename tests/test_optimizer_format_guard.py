@@ -0,0 +1,95 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from app.models import LLMModel
+from app.services.model_adapter import ModelAdapter
+from app.services.prompt_optimizer import PromptOptimizer
+
+EVALUATION = json.dumps({"score": 8, "reason": "提示词结构清晰，但缺少输出格式要求"}, ensure_ascii=False)
+# 函数调用类提示词本身就是JSON，嵌套的score字段不是评估结果
+FUNCTION_PROMPT = json.dumps({
+    "name": "rate_answer",
+    "description": "给回答打分",
+    "parameters": {"type": "object", "properties": {"score": {"type": "number"}}}
+}, ensure_ascii=False)
+PLAIN_PROMPT = "你是一名资深文案，请根据用户提供的产品信息写一段100字以内的广告语。"
+
+
+@pytest.mark.parametrize("head", [
+    EVALUATION[:20],                                    # 截断的评估JSON
+    '{"score": 8,, "reason": ',                         # 无效的JSON
+    '```json\n{"评分": 3, "理由": "不够具体',            # 代码块中的评估JSON
+    '  {\n  "rating": ',
+])
+def test_guard_aborts_evaluation_json_early(head):
+    assert PromptOptimizer._evaluation_json_guard(head)
+
+
+@pytest.mark.parametrize("head", [
+    PLAIN_PROMPT,
+    FUNCTION_PROMPT,
+    FUNCTION_PROMPT[:80],
+    '{"description": "请返回\\"score\\": 分数", "name": "x"}',
+    "请按以下格式输出：{\"score\": 分数}",
+])
+def test_guard_does_not_abort_valid_output(head):
+    assert not PromptOptimizer._evaluation_json_guard(head)
+
+
+@pytest.mark.parametrize("output, expected", [
+    (EVALUATION, True),
+    ("```json\n" + EVALUATION + "\n```", True),
+    (EVALUATION[:-1], False),       # 截断的JSON不能被当作完整的评估结果
+    (FUNCTION_PROMPT, False),
+    (PLAIN_PROMPT, False),
+])
+def test_full_parse_of_final_output(output, expected):
+    assert PromptOptimizer._is_evaluation_json(output) is expected
+
+
+class ScriptedAdapter(ModelAdapter):
+    """按顺序返回预设回复，模拟流式调用：逐字符把开头交给guard检查"""
+
+    def __init__(self, outputs):
+        super().__init__("local", "")
+        self.outputs = list(outputs)
+        self.calls = []
+
+    def send_prompt(self, prompt, variables=None, guard=None, stream=False, cancel_event=None):
+        output = self.outputs.pop(0)
+        self.calls.append(prompt)
+        if stream and guard:
+            for end in range(1, min(len(output), self.GUARD_WINDOW) + 1):
+                if guard(output[:end]):
+                    return {"output": output[:end], "aborted": True}
+        return {"output": output, "aborted": False}
+
+
+def optimize(outputs):
+    optimizer = PromptOptimizer(llm_model=LLMModel(name="local", provider="local", api_key="", base_url=""))
+    optimizer.adapter = ScriptedAdapter(outputs)
+    result = asyncio.run(optimizer._optimize_prompt(
+        f"写广告语 {uuid.uuid4().hex}", "更具体", "", "local", "zh-CN", use_cache=False
+    ))
+    return result, optimizer.adapter
+
+
+def test_evaluation_output_is_aborted_and_retried():
+    result, adapter = optimize([EVALUATION, PLAIN_PROMPT])
+    assert result == PLAIN_PROMPT
+    assert len(adapter.calls) == 2
+
+
+def test_json_prompt_is_not_aborted():
+    result, adapter = optimize([FUNCTION_PROMPT])
+    assert result == FUNCTION_PROMPT
+    assert len(adapter.calls) == 1
+
+
+def test_retry_result_is_fully_validated():
+    result, adapter = optimize([EVALUATION, EVALUATION])
+    assert len(adapter.calls) == 2
+    assert result.startswith("优化过程中发生错误")
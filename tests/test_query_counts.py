@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.models import LLMModel, Prompt, PromptHistory, PromptTemplate, TestRecord as Record
+
+SMALL, LARGE = 2, 20
+
+LIST_URLS = [
+    ("GET", "/api/test/records"),
+    ("GET", "/api/test/records?limit=50"),
+    ("GET", "/api/test/records?summary=true"),
+    ("GET", "/api/history/"),
+    ("GET", "/api/history/?limit=50"),
+    ("GET", "/api/prompts/"),
+    ("GET", "/api/templates/"),
+    ("GET", "/api/templates/?summary=true"),
+    ("GET", "/api/responses/?fields=id,content&summary=true"),
+]
+
+EXPORT_URLS = [
+    ("GET", "/api/test/records/export_csv"),
+    ("GET", "/api/history/export"),
+    ("POST", "/api/prompts/export"),
+]
+
+
+@contextmanager
+def count_queries():
+    """统计执行的SQL语句数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def add_rows(db, user, start, stop):
+    """每行关联不同的模型和模板，逐行加载关联对象时语句数会随行数增长"""
+    for i in range(start, stop):
+        model = LLMModel(name=f"model {i}", provider="local", api_key="", base_url="", user_id=user.id)
+        template = PromptTemplate(name=f"template {i}", content="{x}", variables=["x"], user_id=user.id)
+        db.add_all([model, template])
+        db.flush()
+        db.add_all([
+            Record(model_id=model.id, template_id=template.id, user_id=user.id, prompt=f"prompt {i}", response=f"response {i}"),
+            PromptHistory(model_id=model.id, template_id=template.id, user_id=user.id, rendered_prompt=f"prompt {i}", response=f"response {i}"),
+            Prompt(name=f"prompt {i}", content=f"prompt {i}", model_id=model.id, template_id=template.id, user_id=user.id),
+        ])
+    db.commit()
+
+
+def query_count(client, method, url) -> int:
+    client.request(method, url)  # 预热：认证缓存等
+    with count_queries() as statements:
+        response = client.request(method, url)
+        assert response.status_code == 200, response.text
+    return len(statements)
+
+
+@pytest.mark.parametrize("method, url", LIST_URLS + EXPORT_URLS)
+def test_query_count_does_not_grow_with_rows(client, db, user, method, url):
+    add_rows(db, user, 0, SMALL)
+    small = query_count(client, method, url)
+
+    add_rows(db, user, SMALL, LARGE)
+    large = query_count(client, method, url)
+
+    assert large == small, f"{method} {url}: {small} queries for {SMALL} rows, {large} for {LARGE}"
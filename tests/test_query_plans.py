@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy import event
+
+from app.database import engine
+from app.models import Prompt, PromptHistory, Response, TestRecord as Record
+
+# 列表接口 -> (主表, 应使用的复合索引)
+LIST_QUERIES = [
+    ("/api/test/records", "test_records", "ix_test_records_user_id_is_deleted_created_at"),
+    ("/api/history/", "prompt_history", "ix_prompt_history_user_id_created_at"),
+    ("/api/prompts/", "prompts", "ix_prompts_user_id_is_deleted_created_at"),
+    ("/api/responses/", "responses", "ix_responses_user_id_is_deleted_created_at"),
+]
+
+
+def add_rows(db, user, llm_model, count=30):
+    prompt = Prompt(name="plan", content="plan", model_id=llm_model.id, user_id=user.id)
+    db.add(prompt)
+    db.flush()
+    for i in range(count):
+        db.add_all([
+            Record(model_id=llm_model.id, user_id=user.id, prompt=f"prompt {i}", response=f"response {i}"),
+            PromptHistory(model_id=llm_model.id, user_id=user.id, rendered_prompt=f"prompt {i}", response=f"response {i}"),
+            Prompt(name=f"prompt {i}", content=f"prompt {i}", model_id=llm_model.id, user_id=user.id),
+            Response(prompt_id=prompt.id, content=f"response {i}", user_id=user.id),
+        ])
+    db.commit()
+
+
+def capture_statements(client, url, params):
+    """执行请求并返回执行过的(SQL, 参数)"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(url, params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return captured, response.json()
+
+
+def query_plan(statement, parameters):
+    with engine.connect() as conn:
+        return [row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+
+
+def list_plans(client, url, table, params):
+    captured, body = capture_statements(client, url, params)
+    plans = [
+        query_plan(statement, parameters)
+        for statement, parameters in captured
+        if statement.lstrip().upper().startswith("SELECT") and f"FROM {table}" in statement
+    ]
+    assert plans, f"{url} 没有执行针对{table}的查询"
+    return plans, body
+
+
+def assert_uses_index(plan, table, index):
+    detail = "\n".join(plan)
+    assert any(f"SEARCH {table} USING" in step and index in step for step in plan), detail
+    assert not any(step.startswith(f"SCAN {table}") for step in plan), detail
+    assert not any("USE TEMP B-TREE" in step for step in plan), detail
+
+
+@pytest.mark.parametrize("url, table, index", LIST_QUERIES)
+def test_list_queries_use_composite_index(client, db, user, llm_model, url, table, index):
+    add_rows(db, user, llm_model)
+
+    # 第一页
+    plans, body = list_plans(client, url, table, {"limit": 10})
+    for plan in plans:
+        assert_uses_index(plan, table, index)
+
+    # 按游标取下一页
+    plans, _ = list_plans(client, url, table, {"limit": 10, "cursor": body["next_cursor"]})
+    for plan in plans:
+        assert_uses_index(plan, table, index)
+
+
+@pytest.mark.parametrize("url, table, index", LIST_QUERIES)
+def test_unpaginated_list_queries_use_composite_index(client, db, user, llm_model, url, table, index):
+    add_rows(db, user, llm_model, count=3)
+    plans, _ = list_plans(client, url, table, {})
+    for plan in plans:
+        assert_uses_index(plan, table, index)
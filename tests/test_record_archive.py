@@ -0,0 +1,66 @@
+import datetime
+
+from sqlalchemy import select
+
+from app.models import ArchivedRecord, TestRecord as Record
+from app.services.record_archive import RecordArchive, archived_test_records
+
+# 测试记录的创建时间早于该时间，只归档本文件创建的记录，不影响其他测试的数据
+OLD = datetime.datetime(2000, 1, 15, 12, 0, 0)
+CUTOFF = datetime.datetime(2001, 1, 1)
+
+
+def make_archive(tmp_path) -> RecordArchive:
+    after_days = (datetime.datetime.utcnow() - CUTOFF).days
+    return RecordArchive(archive_dir=str(tmp_path), after_days=after_days, batch_size=100)
+
+
+def add_record(db, user, llm_model, text, created_at=OLD) -> int:
+    record = Record(model_id=llm_model.id, user_id=user.id, prompt=text, response=text, created_at=created_at)
+    db.add(record)
+    db.commit()
+    return record.id
+
+
+def archived_ids(archive, month="2000_01"):
+    with archive._engine(month).connect() as conn:
+        return sorted(conn.execute(select(archived_test_records.c.id)).scalars())
+
+
+def test_archived_ids_are_not_reused(tmp_path, db, user, llm_model):
+    archive = make_archive(tmp_path)
+    try:
+        first = add_record(db, user, llm_model, "first")
+        assert archive.archive_expired() >= 1
+        # 归档删除了表中ID最大的记录，新记录的ID也不能复用它
+        assert db.query(Record).filter_by(id=first).first() is None
+
+        second = add_record(db, user, llm_model, "second")
+        assert second > first
+        archive.archive_expired()
+
+        assert archived_ids(archive) == [first, second]
+        assert archive.get("test_records", first, user.id).prompt == "first"
+        assert archive.get("test_records", second, user.id).prompt == "second"
+        assert db.query(ArchivedRecord).filter(ArchivedRecord.record_id.in_([first, second])).count() == 2
+    finally:
+        archive.stop()
+
+
+def test_archive_batch_is_idempotent_after_partial_failure(tmp_path, db, user, llm_model):
+    """归档文件已写入但主库事务失败时，重新归档不会重复写入也不会覆盖"""
+    archive = make_archive(tmp_path)
+    try:
+        record_id = add_record(db, user, llm_model, "partial")
+        with archive._engine("2000_01").begin() as conn:
+            conn.execute(archived_test_records.insert(), {
+                "id": record_id, "user_id": user.id, "prompt": "partial", "response": "partial", "created_at": OLD
+            })
+
+        archive.archive_expired()
+
+        assert archived_ids(archive) == [record_id]
+        assert db.query(Record).filter_by(id=record_id).first() is None
+        assert db.query(ArchivedRecord).filter_by(table_name="test_records", record_id=record_id).count() == 1
+    finally:
+        archive.stop()
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import re
+
+from app.models import LLMModel
+from app.services.model_adapter import ModelAdapter
+from app.services.prompt_optimizer import PromptOptimizer
+
+
+class BeamAdapter(ModelAdapter):
+    """优化调用依次返回“候选#N”，评分调用按候选编号返回预设分数"""
+
+    def __init__(self, scores):
+        super().__init__("local", "")
+        self.scores = scores
+        self.optimize_calls = []
+
+    def send_prompt(self, prompt, variables=None, guard=None, stream=False, cancel_event=None):
+        if "只返回JSON" in prompt:
+            number = int(re.findall(r"候选#(\d+)", prompt)[-1])
+            return {"output": json.dumps({"score": self.scores[number], "reason": "ok"})}
+        self.optimize_calls.append(prompt)
+        return {"output": f"候选#{len(self.optimize_calls)}"}
+
+
+def refine(scores, **kwargs):
+    optimizer = PromptOptimizer(llm_model=LLMModel(name="local", provider="local", api_key="", base_url=""))
+    optimizer.adapter = BeamAdapter(scores)
+
+    async def collect():
+        return [event async for event in optimizer.refine_prompt_stream(
+            "写一段广告语", "更具体", enable_deep_reasoning=False, use_cache=False, **kwargs
+        )]
+
+    return asyncio.run(collect()), optimizer.adapter
+
+
+def test_each_candidate_is_expanded_once():
+    # 第3轮的候选#3没有进入beam，beam中的#2和#1都已扩展过
+    events, adapter = refine({1: 5, 2: 6, 3: 4}, max_rounds=5, beam_width=2, patience=5, min_improvement=0)
+
+    assert len(adapter.optimize_calls) == 3
+    # 第3轮只从新进入beam的#2出发，不再重复扩展#1
+    assert "候选#2" in adapter.optimize_calls[2]
+    assert "候选#1" not in adapter.optimize_calls[2]
+
+    end = next(e for e in events if e["type"] == "refine-end")
+    assert end["reason"] == "converged"
+    assert end["rounds"] == 3
+    assert end["best"]["prompt"] == "候选#2"
+
+
+def test_new_beam_members_are_all_expanded():
+    events, adapter = refine({1: 5, 2: 6, 3: 7}, max_rounds=3, beam_width=2, patience=5, min_improvement=0)
+
+    # 第1轮1个，第2轮扩展#1，第3轮只扩展新进入beam的#2（#1已扩展过）
+    assert len(adapter.optimize_calls) == 3
+    end = next(e for e in events if e["type"] == "refine-end")
+    assert end["reason"] == "max_rounds"
+    assert end["best"]["prompt"] == "候选#3"
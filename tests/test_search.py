@@ -0,0 +1,103 @@
+import uuid
+
+from sqlalchemy import text
+
+from app.models import PromptTemplate, SearchDocument
+from app.services.search_index import search_index, tokenize
+
+
+def fts_rows(db, template):
+    """该模板在FTS5表中的条目数"""
+    return db.execute(text(
+        "SELECT count(*) FROM search_fts JOIN search_documents d ON d.id = search_fts.rowid "
+        "WHERE d.kind = 'template' AND d.ref_id = :id"
+    ), {"id": template.id}).scalar()
+
+
+def orphan_fts_rows(db):
+    """没有对应文档的FTS5条目数"""
+    return db.execute(text(
+        "SELECT count(*) FROM search_fts WHERE rowid NOT IN (SELECT id FROM search_documents)"
+    )).scalar()
+
+
+def add_template(db, user, name, content, description=None):
+    template = PromptTemplate(name=name, description=description, content=content, user_id=user.id)
+    db.add(template)
+    db.commit()
+    return template
+
+
+def search(db, user, q):
+    return [ref_id for kind, ref_id, _ in search_index.search(db, user.id, q, ["template"])]
+
+
+def test_index_follows_create_update_and_delete(db, user):
+    template = add_template(db, user, f"翻译助手 {uuid.uuid4().hex}", "把中文翻译成英文")
+    assert fts_rows(db, template) == 1
+    assert search(db, user, "翻译") == [template.id]
+
+    for i in range(5):
+        template.content = f"第{i}版：润色英文邮件"
+        db.commit()
+    # 每次修改都替换旧条目，FTS5中只保留一行
+    assert fts_rows(db, template) == 1
+    assert orphan_fts_rows(db) == 0
+    assert search(db, user, "润色") == [template.id]
+    assert search(db, user, "中文") == []
+
+    # 软删除
+    template.is_deleted = True
+    db.commit()
+    assert fts_rows(db, template) == 0
+    assert search(db, user, "润色") == []
+
+    other = add_template(db, user, f"摘要 {uuid.uuid4().hex}", "总结文章要点")
+    db.delete(other)
+    db.commit()
+    assert db.query(SearchDocument).filter_by(kind="template", ref_id=other.id).count() == 0
+    assert orphan_fts_rows(db) == 0
+
+
+def test_cjk_bigram_and_prefix_queries(db, user):
+    template = add_template(db, user, f"客服 {uuid.uuid4().hex}", "回答用户关于退款流程的问题")
+    assert tokenize("退款流程") == "退款 款流 流程 程"
+
+    assert search(db, user, "退款流程") == [template.id]
+    # 单个汉字按前缀匹配
+    assert search(db, user, "退") == [template.id]
+    # 字序不同的词不匹配
+    assert search(db, user, "流退") == []
+
+    english = add_template(db, user, f"summarizer {uuid.uuid4().hex}", "summarize long documents")
+    # 最后一个英文词按前缀匹配，便于边输入边搜索
+    assert search(db, user, "summ") == [english.id]
+    assert search(db, user, "documents summ") == [english.id]
+
+
+def test_title_match_ranks_above_body_match(db, user):
+    keyword = uuid.uuid4().hex[:10]
+    body_match = add_template(db, user, f"正文命中 {uuid.uuid4().hex}", f"内容中包含 {keyword}")
+    title_match = add_template(db, user, f"标题命中 {keyword}", "内容与搜索词无关")
+    assert search(db, user, keyword) == [title_match.id, body_match.id]
+
+
+def test_search_endpoint_paginates_with_cursor(client, db, user):
+    keyword = uuid.uuid4().hex[:10]
+    ids = {add_template(db, user, f"模板{i} {uuid.uuid4().hex}", f"分页测试 {keyword}").id for i in range(5)}
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": keyword, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/search/", params=params).json()
+        assert len(page["items"]) <= 2
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(ids)
+    assert set(seen) == ids
+
+    assert client.get("/api/search/", params={"q": keyword, "cursor": "!!"}).status_code == 400
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.model_adapter import ModelAdapter, RequestCancelled
+from app.services.stream_runs import StreamRunRegistry
+
+GRACE = 0.05
+
+
+async def slow_source(run_id):
+    for i in range(100):
+        await asyncio.sleep(0.01)
+        yield f'{{"i": {i}}}'
+
+
+def test_run_without_subscriber_is_cancelled_after_grace():
+    async def main():
+        registry = StreamRunRegistry(disconnect_grace=GRACE)
+        run = registry.start(1, slow_source)
+        await asyncio.sleep(GRACE * 3)
+        return run
+
+    run = asyncio.run(main())
+    assert run.cancelled
+    assert run.done
+
+
+def test_subscribed_run_is_cancelled_only_after_last_subscriber_leaves():
+    async def main():
+        registry = StreamRunRegistry(disconnect_grace=GRACE)
+        run = registry.start(1, slow_source)
+        received = []
+        async for seq, data in run.subscribe():
+            received.append(seq)
+            if len(received) == 10:
+                break
+        # 订阅期间超过了宽限期也不会取消
+        assert not run.cancelled
+        await asyncio.sleep(GRACE * 3)
+        return run
+
+    run = asyncio.run(main())
+    assert run.cancelled
+
+
+def test_finished_run_is_not_cancelled():
+    async def short_source(run_id):
+        yield '{"i": 0}'
+
+    async def main():
+        registry = StreamRunRegistry(disconnect_grace=GRACE)
+        run = registry.start(1, short_source)
+        await asyncio.sleep(GRACE * 3)
+        return run
+
+    run = asyncio.run(main())
+    assert run.done
+    assert not run.cancelled
+
+
+class FakeChatClient:
+    """OpenAI兼容客户端替身：流式调用每个分块之间执行一次on_chunk"""
+
+    def __init__(self, chunks, on_chunk=None):
+        self.chunks = chunks
+        self.on_chunk = on_chunk
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, **params):
+        self.calls.append(stream)
+        if not stream:
+            message = SimpleNamespace(content="".join(self.chunks))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+        return FakeStream(self)
+
+
+class FakeStream:
+    def __init__(self, client):
+        self.client = client
+        self.closed = False
+
+    def __iter__(self):
+        for i, text in enumerate(self.client.chunks):
+            if self.client.on_chunk:
+                self.client.on_chunk(i)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def adapter():
+    return ModelAdapter("local", "")
+
+
+def test_non_stream_call_by_default(adapter):
+    client = FakeChatClient(["你好", "世界"])
+    content, aborted = adapter._create_chat_completion(client, model="m", messages=[])
+    assert content == "你好世界"
+    assert not aborted
+    assert client.calls == [False]
+
+
+def test_cancel_event_aborts_only_its_own_call(adapter):
+    cancel_event = threading.Event()
+    client = FakeChatClient(["a", "b", "c", "d"], on_chunk=lambda i: i == 2 and cancel_event.set())
+    with pytest.raises(RequestCancelled):
+        adapter._create_chat_completion(client, stream=True, cancel_event=cancel_event, model="m", messages=[])
+
+    # 取消标记只属于那一次调用，同一个适配器上的后续调用不受影响
+    client = FakeChatClient(["a", "b", "c", "d"])
+    content, _ = adapter._create_chat_completion(client, stream=True, cancel_event=threading.Event(), model="m", messages=[])
+    assert content == "abcd"
+
+
+def test_send_prompt_skips_request_when_already_cancelled(adapter):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with pytest.raises(RequestCancelled):
+        adapter.send_prompt("hi", cancel_event=cancel_event)
+    assert "output" in adapter.send_prompt("hi")
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services.stream_runs import StreamRun, StreamRunRegistry, TooManyRuns
+
+GRACE = 0.05
+
+
+async def fast_source(count):
+    for i in range(count):
+        yield json.dumps({"i": i})
+        await asyncio.sleep(0)
+
+
+async def slow_source(run_id):
+    for i in range(100):
+        await asyncio.sleep(0.01)
+        yield f'{{"i": {i}}}'
+
+
+def test_slow_subscriber_receives_replay_gap():
+    async def main():
+        run = StreamRun("run", 1, max_events=5)
+        run.task = asyncio.ensure_future(run._produce(fast_source(20)))
+        received = []
+        async for seq, data in run.subscribe():
+            received.append((seq, data))
+            if len(received) == 1:
+                # 订阅者处理过慢，期间生产者写完全部事件，未读取的事件被淘汰出日志
+                await run.task
+        return received
+
+    received = asyncio.run(main())
+    gaps = [json.loads(data) for seq, data in received if seq is None]
+    seqs = [seq for seq, _ in received if seq is not None]
+    assert len(gaps) == 1
+    assert gaps[0]["type"] == "replay-gap"
+    # 收到的事件加上跳过的事件正好覆盖全部序号
+    assert seqs[-5:] == [16, 17, 18, 19, 20]
+    assert len(seqs) + gaps[0]["missed"] == 20
+
+
+def test_subscriber_from_evicted_position_receives_replay_gap():
+    async def main():
+        run = StreamRun("run", 1, max_events=5)
+        run.task = asyncio.ensure_future(run._produce(fast_source(20)))
+        await run.task
+        return [item async for item in run.subscribe(after_seq=3)]
+
+    received = asyncio.run(main())
+    assert received[0] == (None, '{"type": "replay-gap", "missed": 12}')
+    assert [seq for seq, _ in received[1:]] == [16, 17, 18, 19, 20]
+
+
+def test_live_runs_are_capped_per_user():
+    async def main():
+        registry = StreamRunRegistry(disconnect_grace=GRACE, max_per_user=2)
+        first = registry.start(1, slow_source)
+        registry.start(1, slow_source)
+        with pytest.raises(TooManyRuns):
+            registry.start(1, slow_source)
+        # 上限按用户计算
+        registry.start(2, slow_source)
+
+        # 运行结束（这里是宽限期内无人订阅被取消）后名额释放
+        await asyncio.sleep(GRACE * 3)
+        assert first.done
+        registry.start(1, slow_source)
+        await asyncio.sleep(GRACE * 3)
+
+    asyncio.run(main())